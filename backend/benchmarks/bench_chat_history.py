@@ -0,0 +1,91 @@
+"""Benchmark for chat history reads on long conversations.
+
+Usage:
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_chat_history.py --messages 2000 --requests 200
+
+Seeds one conversation of --messages entries, then simulates --requests chat
+requests. "legacy" replays the old access pattern (a new RedisChatMessageHistory
+per call, full list loaded and sliced in Python, four calls per request);
+"pooled" uses RedisChatHistoryRepository (shared pool, LRANGE of the last N,
+one pipelined write+read plus one write per request).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from constants.db import REDIS_URL
+from repositories.redis_client import close_redis
+from repositories.user_chat_history import RedisChatHistoryRepository, RetentionPolicy
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+
+async def seed(repo: RedisChatHistoryRepository, user_id: str, messages: int):
+    """Plain JSON entries, readable by both the legacy LangChain class and the repository."""
+    async with repo.redis.pipeline(transaction=False) as pipe:
+        for i in range(messages):
+            message = HumanMessage(content=f"message {i} " + "x" * 400) if i % 2 == 0 else AIMessage(content=f"answer {i}")
+            pipe.lpush(repo._key(user_id), json.dumps(message_to_dict(message)))
+        await pipe.execute()
+
+
+def legacy_requests(user_id: str, requests: int, limit: int):
+    try:
+        from langchain_community.chat_message_histories import RedisChatMessageHistory
+    except ImportError:
+        print("legacy: langchain_community not installed, skipped")
+        return
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        for _call in range(4):
+            history = RedisChatMessageHistory(session_id=user_id, url=REDIS_URL)
+            _ = history.messages[-limit:]
+    elapsed = time.perf_counter() - started
+    print(f"legacy: {requests} requests in {elapsed:.2f}s ({elapsed / requests * 1000:.1f} ms/request)")
+
+
+async def pooled_requests(repo: RedisChatHistoryRepository, user_id: str, requests: int, limit: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request(i: int):
+        async with semaphore:
+            await repo.add_message_and_get_history(user_id, f"question {i}", type="user", limit=limit)
+            await repo.set_next_chat_message(user_id, f"answer {i}", type="system")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    print(f"pooled: {requests} requests in {elapsed:.2f}s ({elapsed / requests * 1000:.1f} ms/request, concurrency {concurrency})")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--messages", type=int, default=2000)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--limit", type=int, default=10)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    # Retention large enough that the seeded conversation is not trimmed mid-run
+    repo = RedisChatHistoryRepository(policy=RetentionPolicy(max_turns=args.messages + args.requests, max_bytes=1 << 30))
+    user_id = f"bench-{uuid.uuid4()}"
+    await seed(repo, user_id, args.messages)
+    try:
+        legacy_requests(user_id, args.requests, args.limit)
+        await pooled_requests(repo, user_id, args.requests, args.limit, args.concurrency)
+    finally:
+        await repo.redis.delete(*repo._keys(user_id))
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Benchmark for the OpenF1 fetch layer against a local stub server.
+
+Usage:
+    python benchmarks/bench_openf1_fetch.py --urls 200 --throttle 0.1 --fail 0.05
+
+The stub answers every path with a small JSON list, an ETag, and optionally
+429 (with Retry-After) or 500 responses. The run is repeated cold (empty
+cache), warm (fresh cache) and stale (forced revalidation, answered with 304).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import random
+
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.openf1 import OpenF1Client
+
+
+def make_handler(throttle: float, fail: float, latency: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if random() < throttle:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                return
+            if random() < fail:
+                self.send_response(500)
+                self.end_headers()
+                return
+
+            etag = f'"{abs(hash(self.path))}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            body = json.dumps([{"path": self.path, "lap_number": i, "lap_duration": 90.0 + i} for i in range(50)]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(throttle: float, fail: float, latency: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(throttle, fail, latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(base_url: str, cache_dir: str, urls: int, rate: float, max_age: float, label: str):
+    async with OpenF1Client(
+        base_url=base_url, cache_dir=cache_dir, max_rate=rate,
+        backoff_base=0.1, backoff_max=2.0, cache_max_age=max_age,
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client.get_json(f"/laps?session_key={i}") for i in range(urls)))
+        elapsed = time.perf_counter() - start
+    print(f"{label:>6}: {urls} urls in {elapsed:.2f}s ({urls / elapsed:.1f} req/s) {client.stats}")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--base-url", default=None, help="Use an external server instead of the stub")
+    arg_parser.add_argument("--urls", type=int, default=100)
+    arg_parser.add_argument("--rate", type=float, default=50)
+    arg_parser.add_argument("--throttle", type=float, default=0.05, help="Share of 429 answers from the stub")
+    arg_parser.add_argument("--fail", type=float, default=0.02, help="Share of 500 answers from the stub")
+    arg_parser.add_argument("--latency", type=float, default=0.02, help="Stub latency in seconds")
+    args = arg_parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_stub(args.throttle, args.fail, args.latency)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        await run(base_url, cache_dir, args.urls, args.rate, 3600, "cold")
+        await run(base_url, cache_dir, args.urls, args.rate, 3600, "warm")
+        await run(base_url, cache_dir, args.urls, args.rate, 0, "stale")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
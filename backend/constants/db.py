@@ -2,4 +2,80 @@ import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 QDRANT_URL = os.getenv("QDRANT_URL")
-REDIS_URL = os.getenv("REDIS_URL")
\ No newline at end of file
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+# Key required in the X-Admin-Key header by the admin API; the admin API is closed while unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Chat history retention (per session, enforced on every write)
+HISTORY_IDLE_TTL_SECONDS = int(os.getenv("HISTORY_IDLE_TTL_SECONDS", str(7 * 24 * 3600)))
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "50"))
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(256 * 1024)))
+
+# Write-behind buffer for chat history appends
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "true").lower() == "true"
+HISTORY_WRITE_QUEUE_SIZE = int(os.getenv("HISTORY_WRITE_QUEUE_SIZE", "10000"))
+HISTORY_WRITE_BATCH_SIZE = int(os.getenv("HISTORY_WRITE_BATCH_SIZE", "200"))
+
+# "redis" or "memory" (in-process, single node / load tests)
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "redis")
+HISTORY_MEMORY_BUDGET_BYTES = int(os.getenv("HISTORY_MEMORY_BUDGET_BYTES", str(64 * 1024 * 1024)))
+
+# Prepared statements kept per connection by the asyncpg driver
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "256"))
+
+# Generated query results: streamed in chunks and capped before interpretation
+QUERY_CHUNK_ROWS = int(os.getenv("QUERY_CHUNK_ROWS", "500"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "1000"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(64 * 1024)))
+
+# Total time budget for one chat request, shared out between its stages
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+
+# Result handles returned with each answer (served by the data API)
+RESULT_HANDLE_TTL_SECONDS = int(os.getenv("RESULT_HANDLE_TTL_SECONDS", "3600"))
+DATA_PAGE_MAX_ROWS = int(os.getenv("DATA_PAGE_MAX_ROWS", "10000"))
+
+# Structured stats API: encoded responses kept per data version, version re-read every few seconds
+STATS_CACHE_ENTRIES = int(os.getenv("STATS_CACHE_ENTRIES", "2048"))
+STATS_VERSION_TTL_SECONDS = float(os.getenv("STATS_VERSION_TTL_SECONDS", "5"))
+
+# Lap analytics: sessions whose lap arrays stay loaded in each worker
+LAP_ANALYTICS_CACHE_SESSIONS = int(os.getenv("LAP_ANALYTICS_CACHE_SESSIONS", "32"))
+
+# "sql": the model writes free-form SQL; "tools": it calls pre-written query tools (SQL as fallback)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "sql")
+TOOL_CACHE_ENTRIES = int(os.getenv("TOOL_CACHE_ENTRIES", "1024"))
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "3600"))
+
+# SQL prompt schema pruning: tables kept within SCHEMA_SCORE_MARGIN of the best match, full schema below SCHEMA_MIN_SCORE
+SCHEMA_PRUNING = os.getenv("SCHEMA_PRUNING", "true").lower() == "true"
+SCHEMA_MAX_SEED_TABLES = int(os.getenv("SCHEMA_MAX_SEED_TABLES", "4"))
+# all-MiniLM-L6-v2 scores unrelated short texts up to ~0.3; retune when changing the encoder
+SCHEMA_MIN_SCORE = float(os.getenv("SCHEMA_MIN_SCORE", "0.35"))
+SCHEMA_SCORE_MARGIN = float(os.getenv("SCHEMA_SCORE_MARGIN", "0.15"))
+
+# Question → SQL reuse: question similarity needed to reuse stored SQL, and to accept a swapped entity
+SQL_REUSE_CACHE = os.getenv("SQL_REUSE_CACHE", "false").lower() == "true"
+SQL_REUSE_MIN_SCORE = float(os.getenv("SQL_REUSE_MIN_SCORE", "0.9"))
+SQL_REUSE_ENTITY_MIN_SCORE = float(os.getenv("SQL_REUSE_ENTITY_MIN_SCORE", "0.6"))
+
+# Chat API rate limits (token buckets: sustained per minute, burst) and admission control per worker
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "10"))
+RATE_LIMIT_USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "30"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "15"))
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "32"))
+CHAT_MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "64"))
+
+# LLM gateway: process wide concurrency, per model limits ("model=limit,...") and starvation guard
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv("LLM_PRIORITY_AGING_SECONDS", "5"))
+
+# Batch chat: questions per request and how many of them run at once
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "5"))
+# Overall cap for a batch; each question also gets its own CHAT_DEADLINE_SECONDS once it starts
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", "120"))
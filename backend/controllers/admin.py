@@ -0,0 +1,85 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from constants.db import ADMIN_API_KEY
+from controllers.chat import admission, db_repo, history_repo, lap_analytics, llm_gateway, query_tools, schema_selector, sql_cache
+from utils.logger import logger
+
+
+async def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Dependency that only lets requests carrying ADMIN_API_KEY reach the admin API."""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_KEY is not set)")
+    if x_admin_key is None or not hmac.compare_digest(x_admin_key.encode("utf-8"), ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+admin_router = APIRouter(dependencies=[Depends(require_admin_key)])
+
+
+@admin_router.get("/history/memory")
+async def history_memory(top: int = 50):
+    """Endpoint to report Redis memory used by chat histories, per session (hashed id) and in total."""
+    try:
+        return await history_repo.memory_report(top=top)
+    except Exception as e:
+        logger.error(f"Error building history memory report: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while building the memory report: {str(e)}"
+        )
+
+
+@admin_router.get("/db/pool")
+async def db_pool():
+    """Endpoint to report the chat database pool and connection checkout wait times."""
+    try:
+        return db_repo.pool_report()
+    except Exception as e:
+        logger.error(f"Error building database pool report: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while building the pool report: {str(e)}"
+        )
+
+
+@admin_router.get("/chat/admission")
+async def chat_admission():
+    """Endpoint to report in-flight and queued chat requests in this worker."""
+    return admission.stats()
+
+
+@admin_router.get("/llm/gateway")
+async def llm_gateway_stats():
+    """Endpoint to report LLM calls in flight, queued calls and queue wait per priority."""
+    return llm_gateway.stats()
+
+
+@admin_router.get("/lap-analytics")
+async def lap_analytics_stats():
+    """Endpoint to report the sessions loaded for lap analyses and the cache hit rate."""
+    return lap_analytics.report()
+
+
+@admin_router.get("/query-tools")
+async def query_tools_stats():
+    """Endpoint to report the query tool result cache (tools pipeline mode only)."""
+    if query_tools is None:
+        raise HTTPException(status_code=404, detail="Query tools are disabled (PIPELINE_MODE is not 'tools')")
+    return query_tools.report()
+
+
+@admin_router.get("/schema-selector")
+async def schema_selector_stats(top: int = 10):
+    """Endpoint to report SQL prompt tokens saved by schema pruning and the most used table sets."""
+    if schema_selector is None:
+        raise HTTPException(status_code=404, detail="Schema pruning is disabled (SCHEMA_PRUNING=false)")
+    return schema_selector.stats(top=top)
+
+
+@admin_router.get("/sql-cache")
+async def sql_cache_stats():
+    """Endpoint to report question → SQL reuse: lookups, hits, stored and evicted entries."""
+    if sql_cache is None:
+        raise HTTPException(status_code=404, detail="SQL reuse is disabled (SQL_REUSE_CACHE=false)")
+    return sql_cache.report()
@@ -1,18 +1,82 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from services.chat import ChatService
+from services.chat_session import ConversationSession
 from repositories.lang_chain import NLToSQLInterpreter
 from repositories.db import PostgresRepository, QueryCleaner
 from repositories.user_chat_history import UserChatHistoryRepository, RedisChatHistoryRepository
+from repositories.history_write_buffer import WriteBehindHistoryRepository
 from repositories.qdrant_service import QdrantRepository
-from schemas.chat import ChatMessageRequest, ChatResponse
-from constants.db import DATABASE_URL, QDRANT_URL
+from repositories.result_data import ResultHandleRepository, InMemoryResultHandleRepository
+from repositories.llm_gateway import LLMGateway, parse_model_limits
+from repositories.lap_analytics import LapAnalytics
+from repositories.query_tools import QueryToolCatalog
+from repositories.schema_selector import SchemaSelector
+from repositories.sql_cache import SQLReuseCache
+from repositories.stats import StatsRepository
+from repositories.rate_limiter import (
+    AdmissionController, Bucket, InMemoryRateLimiter, Overloaded, RedisRateLimiter,
+)
+from schemas.chat import ChatMessageRequest, ChatResponse, BatchChatRequest
+from constants.db import (
+    DATABASE_URL, QDRANT_URL, HISTORY_BACKEND, HISTORY_MEMORY_BUDGET_BYTES,
+    HISTORY_WRITE_BEHIND, HISTORY_WRITE_QUEUE_SIZE, HISTORY_WRITE_BATCH_SIZE, CHAT_DEADLINE_SECONDS,
+    RATE_LIMIT_USER_PER_MINUTE, RATE_LIMIT_USER_BURST, RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST,
+    CHAT_MAX_IN_FLIGHT, CHAT_MAX_QUEUED,
+    LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, LLM_PRIORITY_AGING_SECONDS, BATCH_CONCURRENCY, BATCH_DEADLINE_SECONDS,
+    LAP_ANALYTICS_CACHE_SESSIONS, PIPELINE_MODE, TOOL_CACHE_ENTRIES, TOOL_CACHE_TTL_SECONDS, STATS_VERSION_TTL_SECONDS,
+    SCHEMA_PRUNING, SCHEMA_MAX_SEED_TABLES, SCHEMA_MIN_SCORE, SCHEMA_SCORE_MARGIN,
+    SQL_REUSE_CACHE, SQL_REUSE_MIN_SCORE, SQL_REUSE_ENTITY_MIN_SCORE,
+)
+from utils.deadline import ClientDisconnected, Deadline, cancel_on_disconnect
 from utils.logger import logger
 
 # Initialize repositories and services
-db_repo = PostgresRepository(DATABASE_URL)
-history_repo = RedisChatHistoryRepository()  
+# Generated chat queries only read: route them to the read replica when configured
+db_repo = PostgresRepository(DATABASE_URL, read_only=True)
+if HISTORY_BACKEND == "memory":
+    history_repo = UserChatHistoryRepository(max_total_bytes=HISTORY_MEMORY_BUDGET_BYTES)
+else:
+    history_repo = RedisChatHistoryRepository()
+if HISTORY_WRITE_BEHIND and HISTORY_BACKEND != "memory":
+    # History appends are batched off the request path
+    history_repo = WriteBehindHistoryRepository(
+        history_repo,
+        max_pending=HISTORY_WRITE_QUEUE_SIZE,
+        batch_size=HISTORY_WRITE_BATCH_SIZE,
+    )
+# Executed SQL behind each answer, fetched later through the data API
+result_handles = InMemoryResultHandleRepository() if HISTORY_BACKEND == "memory" else ResultHandleRepository()
+llm_gateway = LLMGateway(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    model_limits=parse_model_limits(LLM_MODEL_CONCURRENCY),
+    aging_seconds=LLM_PRIORITY_AGING_SECONDS,
+)
+stats_repo = StatsRepository()
+lap_analytics = LapAnalytics(
+    max_sessions=LAP_ANALYTICS_CACHE_SESSIONS,
+    data_version=stats_repo.data_version, version_ttl=STATS_VERSION_TTL_SECONDS,
+)
+# Tool results are dropped when an import bumps the data version, not only when their ttl expires
+query_tools = QueryToolCatalog(
+    max_entries=TOOL_CACHE_ENTRIES, ttl=TOOL_CACHE_TTL_SECONDS,
+    data_version=stats_repo.data_version, version_ttl=STATS_VERSION_TTL_SECONDS,
+) if PIPELINE_MODE == "tools" else None
 query_cleaner = QueryCleaner()
 qdrant_repo = QdrantRepository(url=QDRANT_URL)
+# Same encoder as the entity lookups; table descriptions are embedded on first use in each worker
+schema_selector = SchemaSelector(
+    embed=qdrant_repo.model.encode,
+    max_seeds=SCHEMA_MAX_SEED_TABLES,
+    min_score=SCHEMA_MIN_SCORE,
+    margin=SCHEMA_SCORE_MARGIN,
+) if SCHEMA_PRUNING else None
+sql_cache = SQLReuseCache(
+    qdrant_repo, min_score=SQL_REUSE_MIN_SCORE, entity_min_score=SQL_REUSE_ENTITY_MIN_SCORE,
+) if SQL_REUSE_CACHE else None
 
 # Initialize the NLToSQLInterpreter with the repositories
 nlsql_interpreter = NLToSQLInterpreter(
@@ -20,7 +84,13 @@ nlsql_interpreter = NLToSQLInterpreter(
     history_repo=history_repo,
     query_cleaner=query_cleaner,
     qdrant_repo=qdrant_repo,
-    model_name="gemini-2.0-flash"
+    model_name="gemini-2.0-flash",
+    result_handles=result_handles,
+    llm_gateway=llm_gateway,
+    lap_analytics=lap_analytics,
+    query_tools=query_tools,
+    schema_selector=schema_selector,
+    sql_cache=sql_cache,
 )
 
 # Initialize the ChatService with the NLToSQLInterpreter
@@ -28,17 +98,146 @@ service = ChatService(
     lang_chain=nlsql_interpreter
 )
 
+# Per user and per IP token buckets (shared through Redis) and per worker admission control
+rate_limiter = InMemoryRateLimiter() if HISTORY_BACKEND == "memory" else RedisRateLimiter()
+admission = AdmissionController(max_in_flight=CHAT_MAX_IN_FLIGHT, max_queued=CHAT_MAX_QUEUED)
+
 chat_router = APIRouter()
 
-@chat_router.post("/chat/{user_id}", response_model=ChatResponse)
-async def chat_with_user(user_id: str, request: ChatMessageRequest):
+
+def too_many_requests(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, round(retry_after)))})
+
+
+def chat_buckets(user_id: str, client) -> list:
+    client_ip = client.host if client else "unknown"
+    return [
+        Bucket(f"user:{user_id}", RATE_LIMIT_USER_PER_MINUTE, RATE_LIMIT_USER_BURST),
+        Bucket(f"ip:{client_ip}", RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST),
+    ]
+
+
+async def enforce_rate_limit(user_id: str, http_request: Request):
+    """Dependency that takes one token from the user's and the client IP's buckets."""
+    allowed, retry_after = await rate_limiter.acquire(chat_buckets(user_id, http_request.client))
+    if not allowed:
+        logger.info(f"Rate limited chat for user {user_id}")
+        raise too_many_requests(retry_after, "Rate limit exceeded")
+
+
+@chat_router.post("/chat/{user_id}", response_model=ChatResponse, dependencies=[Depends(enforce_rate_limit)])
+async def chat_with_user(user_id: str, request: ChatMessageRequest, http_request: Request):
     """Endpoint to handle chat messages from users."""
     try:
-        response = await service.chat(request, user_id)
+        # Work stops as soon as the client goes away or the budget runs out
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
+        async with admission.admit():
+            response = await cancel_on_disconnect(http_request, service.chat(request, user_id, deadline=deadline))
         return response
+    except Overloaded as e:
+        logger.warning(f"Chat pipeline overloaded, rejecting user {user_id}")
+        raise too_many_requests(e.retry_after, "Server is busy, please retry later")
+    except ClientDisconnected:
+        logger.info(f"Client disconnected, chat for user {user_id} cancelled")
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         logger.error(f"Error processing chat for user {user_id}: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while processing the chat: {str(e)}"
         )
+
+
+def batch_question_admit(user_id: str, client, prepaid: int = 1):
+    """Per question slot for a batch: one rate limit token (after the `prepaid` ones) and one admission slot.
+
+    Raises Overloaded when the buckets are empty or the worker is full, so a
+    batch costs the same quota and in-flight capacity as its questions sent
+    one by one.
+    """
+    buckets = chat_buckets(user_id, client)
+    remaining_prepaid = prepaid
+
+    @asynccontextmanager
+    async def admit():
+        nonlocal remaining_prepaid
+        if remaining_prepaid:
+            remaining_prepaid -= 1
+        else:
+            allowed, retry_after = await rate_limiter.acquire(buckets)
+            if not allowed:
+                raise Overloaded(retry_after)
+        async with admission.admit():
+            yield
+
+    return admit
+
+
+@chat_router.post("/chat/{user_id}/batch", dependencies=[Depends(enforce_rate_limit)])
+async def chat_batch_with_user(user_id: str, request: BatchChatRequest, http_request: Request):
+    """Endpoint to answer a list of questions; streams one NDJSON line per answer as each finishes."""
+    try:
+        # Fail fast when this worker is already full; each question is admitted on its own below
+        admission.admit()
+    except Overloaded as e:
+        logger.warning(f"Chat pipeline overloaded, rejecting batch for user {user_id}")
+        raise too_many_requests(e.retry_after, "Server is busy, please retry later")
+
+    # The first question was charged by enforce_rate_limit; the others take their own token
+    admit = batch_question_admit(user_id, http_request.client, prepaid=1)
+
+    async def lines():
+        # Each question gets its own CHAT_DEADLINE_SECONDS budget, within an overall cap for the batch
+        deadline = Deadline(BATCH_DEADLINE_SECONDS)
+        try:
+            async for item in service.chat_batch(
+                request, user_id, deadline=deadline, concurrency=BATCH_CONCURRENCY, admit=admit
+            ):
+                yield item.model_dump_json() + "\n"
+        except Exception as e:
+            logger.error(f"Error processing chat batch for user {user_id}: {str(e)}")
+            yield json.dumps({"error": f"An error occurred while processing the batch: {str(e)}"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@chat_router.websocket("/ws/{user_id}")
+async def chat_websocket(websocket: WebSocket, user_id: str):
+    """WebSocket chat: send {"content": ..., "id": ...}; receive queued, stage, token and answer events."""
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(event: dict):
+        async with send_lock:
+            await websocket.send_json(event)
+
+    session = ConversationSession(nlsql_interpreter, user_id, send, deadline_seconds=CHAT_DEADLINE_SECONDS)
+    try:
+        await session.start()
+        counter = 0
+        while True:
+            data = await websocket.receive_json()
+            counter += 1
+            message_id = str(data.get("id") or counter)
+            content = (data.get("content") or "").strip()
+            if not content:
+                await send({"type": "error", "id": message_id, "error": "empty message"})
+                continue
+
+            allowed, retry_after = await rate_limiter.acquire(chat_buckets(user_id, websocket.client))
+            if not allowed:
+                await send({"type": "error", "id": message_id, "error": "rate_limited", "retry_after": retry_after})
+                continue
+
+            position = session.submit(message_id, content, admit=admission.admit)
+            if position is None:
+                await send({"type": "error", "id": message_id, "error": "too many pending messages"})
+                continue
+            await send({"type": "queued", "id": message_id, "position": position})
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket closed for user {user_id}")
+    except Exception as e:
+        logger.error(f"Error in chat websocket for user {user_id}: {str(e)}")
+    finally:
+        # Stops the answer in progress: nobody is left to receive it
+        await session.close()
@@ -0,0 +1,55 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from controllers.chat import db_repo, result_handles
+from repositories.result_data import column_types, to_arrow_ipc, to_columnar_json
+from constants.db import DATA_PAGE_MAX_ROWS
+from utils.logger import logger
+
+data_router = APIRouter()
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+@data_router.get("/{handle}")
+async def get_result_data(
+    handle: str,
+    output_format: Literal["json", "arrow"] = Query("json", alias="format"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=DATA_PAGE_MAX_ROWS),
+    compression: Optional[Literal["lz4", "zstd"]] = None,
+):
+    """Endpoint to fetch, page by page, the rows behind a chat answer in a columnar format."""
+    entry = await result_handles.load(handle)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired data handle")
+    query, params = entry
+
+    try:
+        description, rows, has_more = await db_repo.execute_page(query, params, offset=offset, limit=limit)
+        columns = column_types(description)
+        page_headers = {
+            "X-Offset": str(offset),
+            "X-Row-Count": str(len(rows)),
+            "X-Has-More": str(has_more).lower(),
+        }
+        if output_format == "arrow":
+            return Response(
+                content=to_arrow_ipc(columns, rows, compression=compression),
+                media_type=ARROW_STREAM_MEDIA_TYPE,
+                headers=page_headers,
+            )
+
+        body = to_columnar_json(columns, rows)
+        body.update({
+            "offset": offset,
+            "row_count": len(rows),
+            "next_offset": offset + len(rows) if has_more else None,
+        })
+        return body
+    except Exception as e:
+        logger.error(f"Error fetching data for handle {handle}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while fetching the result data: {str(e)}"
+        )
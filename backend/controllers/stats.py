@@ -0,0 +1,87 @@
+import hashlib
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from repositories.stats import StatsCache, StatsRepository, encode
+from constants.db import STATS_CACHE_ENTRIES, STATS_VERSION_TTL_SECONDS
+from utils.logger import logger
+
+stats_repo = StatsRepository()
+stats_cache = StatsCache(max_entries=STATS_CACHE_ENTRIES, version_ttl=STATS_VERSION_TTL_SECONDS)
+
+stats_router = APIRouter()
+
+
+async def cached(request: Request, loader, offset: int, limit: int) -> Response:
+    """Serves `loader(offset, limit)` from the versioned cache, with an ETag that only changes after an import."""
+    try:
+        version = await stats_cache.version(stats_repo)
+        # Explicit offset/limit so defaulted and spelled-out requests share an entry
+        params = {**request.query_params, "offset": offset, "limit": limit}
+        key = f"{request.url.path}?{urlencode(sorted(params.items()))}"
+        etag = f'"{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        body = stats_cache.get(version, key)
+        if body is None:
+            items, has_more = await loader(offset, limit)
+            body = encode({
+                "items": items,
+                "offset": offset,
+                "next_offset": offset + len(items) if has_more else None,
+                "data_version": version,
+            })
+            stats_cache.put(version, key, body)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        logger.error(f"Error serving stats for {request.url.path}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while fetching the stats: {str(e)}"
+        )
+
+
+@stats_router.get("/seasons/{year}/sessions")
+async def season_sessions(request: Request, year: int, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500)):
+    """Endpoint to list the sessions of a season, in calendar order."""
+    return await cached(request, lambda o, l: stats_repo.season_sessions(year, o, l), offset, limit)
+
+
+@stats_router.get("/seasons/{year}/standings/drivers")
+async def driver_standings(request: Request, year: int, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Endpoint to get the drivers' championship standings of a season."""
+    return await cached(request, lambda o, l: stats_repo.driver_standings(year, o, l), offset, limit)
+
+
+@stats_router.get("/sessions/{session_id}/classification")
+async def classification(request: Request, session_id: int, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Endpoint to get the classification of a session."""
+    return await cached(request, lambda o, l: stats_repo.classification(session_id, o, l), offset, limit)
+
+
+@stats_router.get("/sessions/{session_id}/fastest-laps")
+async def fastest_laps(request: Request, session_id: int, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Endpoint to get each driver's fastest lap in a session, fastest first."""
+    return await cached(request, lambda o, l: stats_repo.fastest_laps(session_id, o, l), offset, limit)
+
+
+@stats_router.get("/sessions/{session_id}/pit-stops")
+async def pit_stops(request: Request, session_id: int, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Endpoint to get the pit stop summary per driver in a session."""
+    return await cached(request, lambda o, l: stats_repo.pit_stops(session_id, o, l), offset, limit)
+
+
+@stats_router.get("/sessions/{session_id}/stints")
+async def stints(request: Request, session_id: int, offset: int = Query(0, ge=0), limit: int = Query(200, ge=1, le=1000)):
+    """Endpoint to get the tyre stints of every driver in a session."""
+    return await cached(request, lambda o, l: stats_repo.stints(session_id, o, l), offset, limit)
+
+
+@stats_router.get("/drivers/{driver_number}/results")
+async def driver_results(
+    request: Request, driver_number: int, year: int, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)
+):
+    """Endpoint to get a driver's race and sprint results in a season."""
+    return await cached(request, lambda o, l: stats_repo.driver_results(driver_number, year, o, l), offset, limit)
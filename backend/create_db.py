@@ -2,105 +2,87 @@ from dotenv import load_dotenv
 load_dotenv()
 from models.db import engine, Base
 from models.deps import get_db
-from models.models import Season, Meeting, Session, Driver, SessionDriver, Stint, Lap, PointsPerPosition, PitStop, PositionChange, SessionResult, StartGrid, PointsScored
-from httpx import AsyncClient
+from models.models import Season, Meeting, Session, Driver, SessionDriver, Stint, Lap, PitStop, SessionResult, StartGrid, PointsScored
+from repositories.openf1 import OpenF1Client
+from repositories.stats import create_stats_views, data_tables, drop_stats_views, record_import_run, refresh_stats_views
 from asyncio import gather
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from datetime import datetime, timedelta
 from dateutil import parser
-from aiolimiter import AsyncLimiter
-from random import randint
-import json
+import os
+import resource
+import sys
+import time
 from sqlalchemy.orm import selectinload
 
-YEARS = [2025, 2024, 2023]
+YEARS = [int(year) for year in os.getenv("IMPORT_YEARS", "2025,2024,2023").split(",")]
+
+# OpenF1 session names → the FastF1 codes stored by both importers (stats views and query tools match on them)
+SESSION_TYPE_CODES = {
+    "Race": "R",
+    "Qualifying": "Q",
+    "Sprint": "S",
+    "Sprint Qualifying": "SQ",
+    "Sprint Shootout": "SQ",
+}
 
 async def on_startup():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+        await drop_stats_views(conn)
+        await conn.run_sync(Base.metadata.drop_all, tables=data_tables())
         await conn.run_sync(Base.metadata.create_all)
 
+def session_type_code(session_data) -> str:
+    """FastF1 code of an OpenF1 session: the name tells a sprint from a race, the type is the fallback."""
+    return SESSION_TYPE_CODES.get(session_data["session_name"]) or SESSION_TYPE_CODES[session_data["session_type"]]
+
 def parse_offset(offset_str):
     sign = -1 if offset_str.startswith('-') else 1
     h, m, s = map(int, offset_str.lstrip('+-').split(':'))
     return sign * timedelta(hours=h, minutes=m, seconds=s)
 
 # API calls
-API_URL = "https://api.openf1.org/v1"
+API_URL = os.getenv("OPENF1_API_URL", "https://api.openf1.org/v1")
 RATE_LIMIT = 2  # requests por segundo
-TIME_BETWEEN_RETRIES = 10  # segundos entre reintentos
-RANDOM_INTERVAL = 20  # segundos aleatorios entre reintentos
 MAX_RETRIES = 20  # máximo de reintentos por solicitud
+CACHE_DIR = os.getenv("OPENF1_CACHE_DIR", "openf1_cache")  # respuestas cacheadas en disco
+CACHE_MAX_AGE = 24 * 3600  # segundos antes de revalidar una respuesta cacheada
+LAP_BATCH_SIZE = 1000  # filas de vueltas por INSERT mientras se procesa el stream
+
+
+def create_client() -> OpenF1Client:
+    return OpenF1Client(
+        base_url=API_URL,
+        cache_dir=CACHE_DIR,
+        max_rate=RATE_LIMIT,
+        max_retries=MAX_RETRIES,
+        cache_max_age=CACHE_MAX_AGE,
+    )
 
-limiter = AsyncLimiter(max_rate=RATE_LIMIT, time_period=1)
-cache = {}
-
-async def rate_limited_get(url: str, client: AsyncClient, cache_key: str = None):
-
-    async with limiter:
-        for attempt in range(MAX_RETRIES):
-            if cache_key and cache_key in cache:
-                print(f"Cache hit for {cache_key}")
-                return cache[cache_key]
-
-            if url in cache:
-                print(f"Cache hit for {url}")
-                return cache[url]
-            try:
-                print(f"GET {url} (Intento {attempt + 1})")
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
-                if cache_key:
-                    cache[cache_key] = data
-                else:
-                    cache[url] = data
-                return data
-            except Exception as e:
-                print(f"Error en {url}: {e}")
-                if attempt < MAX_RETRIES - 1:
-                    wait_time = TIME_BETWEEN_RETRIES + randint(0, RANDOM_INTERVAL)
-                    print(f"Reintentando en {wait_time} segundos...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
-            
-
-async def get_meetings(year: int, client: AsyncClient):
-    cache_key = f"meetings_{year}"
-    return await rate_limited_get(f"{API_URL}/meetings?year={year}", client, cache_key=cache_key)
-
-async def get_sessions(meeting_key: int, client: AsyncClient):
-    cache_key = f"sessions_{meeting_key}"
-    return await rate_limited_get(f"{API_URL}/sessions?meeting_key={meeting_key}",client, cache_key=cache_key)
+async def get_meetings(year: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/meetings?year={year}")
 
-async def get_drivers(session_key: int, client: AsyncClient):
-    cache_key = f"drivers_{session_key}"
-    return await rate_limited_get(f"{API_URL}/drivers?session_key={session_key}",client, cache_key=cache_key)
+async def get_sessions(meeting_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/sessions?meeting_key={meeting_key}")
 
-async def get_stints(session_key: int, client: AsyncClient):
-    cache_key = f"stints_{session_key}"
-    return await rate_limited_get(f"{API_URL}/stints?session_key={session_key}",client, cache_key=cache_key)
+async def get_drivers(session_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/drivers?session_key={session_key}")
 
-async def get_laps(session_key: int, driver_number: int, client: AsyncClient):
-    cache_key = f"laps_{session_key}_{driver_number}"
-    return await rate_limited_get(f"{API_URL}/laps?session_key={session_key}&driver_number={driver_number}", client, cache_key=cache_key)
+async def get_stints(session_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/stints?session_key={session_key}")
 
-async def get_pit_stops(session_key: int, client: AsyncClient):
-    cache_key = f"pit_stops_{session_key}"
-    return await rate_limited_get(f"{API_URL}/pit?session_key={session_key}", client, cache_key=cache_key)
+def get_session_laps(session_key: int, client: OpenF1Client):
+    """Streams every lap of a session (all drivers) as it is parsed."""
+    return client.iter_json_items(f"{API_URL}/laps?session_key={session_key}")
 
-async def get_positions_changes(session_key: int, client: AsyncClient):
-    cache_key = f"position_changes_{session_key}"
-    return await rate_limited_get(f"{API_URL}/positions?session_key={session_key}", client, cache_key=cache_key)
+async def get_pit_stops(session_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/pit?session_key={session_key}")
 
-async def get_session_results(session_key: int, client: AsyncClient):
-    cache_key = f"session_results_{session_key}"
-    return await rate_limited_get(f"{API_URL}/session_result?session_key={session_key}", client, cache_key=cache_key)
+async def get_session_results(session_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/session_result?session_key={session_key}")
 
-async def get_start_grid(session_key: int, client: AsyncClient):
-    cache_key = f"start_grid_{session_key}"
-    return await rate_limited_get(f"{API_URL}/starting_grid?session_key={session_key}", client, cache_key=cache_key)
+async def get_start_grid(session_key: int, client: OpenF1Client):
+    return await client.get_json(f"{API_URL}/starting_grid?session_key={session_key}")
 
 async def get_session_driver(pit_stop, db, session_id, driver_id):
     result = await db.execute(
@@ -138,19 +120,70 @@ async def get_session_driver(pit_stop, db, session_id, driver_id):
     await db.refresh(session_driver)  # fuerza a cargar sus atributos
     return session_driver
 
+def pick_stint(stints, lap_number):
+    """Returns the stint id whose lap range contains lap_number, falling back to the first stint."""
+    for stint_id, lap_start, lap_end in stints:
+        if (lap_start is None or lap_start <= lap_number) and (lap_end is None or lap_number <= lap_end):
+            return stint_id
+    return stints[0][0]
+
+def lap_row(lap_data, stint_id):
+    return {
+        "stint_id": stint_id,
+        "lap_number": int(lap_data["lap_number"]),
+        "duration_sector_1": float(lap_data["duration_sector_1"]) if lap_data.get("duration_sector_1") is not None else None,
+        "duration_sector_2": float(lap_data["duration_sector_2"]) if lap_data.get("duration_sector_2") is not None else None,
+        "duration_sector_3": float(lap_data["duration_sector_3"]) if lap_data.get("duration_sector_3") is not None else None,
+        "is_pit_out_lap": bool(lap_data["is_pit_out_lap"]) if lap_data.get("is_pit_out_lap") is not None else False,
+        "lap_duration": float(lap_data["lap_duration"]) if lap_data.get("lap_duration") is not None else None,
+        "speed_trap": float(lap_data["st_speed"]) if lap_data.get("st_speed") is not None else None,
+    }
+
+async def insert_session_laps(db, session_key: int, client: OpenF1Client) -> int:
+    """Streams the laps of a session into the lap table in batches of LAP_BATCH_SIZE rows."""
+    result = await db.execute(
+        select(Driver.driver_number, Stint.id, Stint.lap_start, Stint.lap_end)
+        .join(SessionDriver, SessionDriver.driver_id == Driver.id)
+        .join(Session, Session.id == SessionDriver.session_id)
+        .join(Stint, Stint.session_driver_id == SessionDriver.id)
+        .where(Session.session_key == session_key)
+        .order_by(Stint.stint_number)
+    )
+    stints_by_driver = {}
+    for driver_number, stint_id, lap_start, lap_end in result:
+        stints_by_driver.setdefault(driver_number, []).append((stint_id, lap_start, lap_end))
+    if not stints_by_driver:
+        return 0
+
+    inserted = 0
+    batch = []
+    async for lap_data in get_session_laps(session_key, client):
+        stints = stints_by_driver.get(int(lap_data["driver_number"]))
+        if not stints or lap_data.get("lap_number") is None:
+            continue
+        lap_number = int(lap_data["lap_number"])
+        batch.append(lap_row(lap_data, pick_stint(stints, lap_number)))
+        if len(batch) >= LAP_BATCH_SIZE:
+            await db.execute(insert(Lap), batch)
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        await db.execute(insert(Lap), batch)
+        inserted += len(batch)
+    return inserted
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
 async def main():
+    started = time.perf_counter()
+    started_at = datetime.utcnow()
     await on_startup()
-    client = AsyncClient()
+    client = create_client()
     async with get_db() as db:
-        with open("points_per_position.json", "r") as f:
-            points_per_position = json.load(f)
-            # Insert points_per_position into the database if needed
-            for i in points_per_position:
-                pp = PointsPerPosition(position=int(i["position"]), points=float(i["points"]))
-                db.add(pp)
-
-            await db.flush()
-
         # Add seasons and start fetching meetings
         meeting_tasks = []
         for year in YEARS:
@@ -197,7 +230,6 @@ async def main():
         stint_tasks = []
         pit_stop_tasks = []
         all_sessions = []
-        position_change_tasks = []
         session_results = []
         starting_grid_tasks = []
 
@@ -218,7 +250,7 @@ async def main():
                 session = Session(
                     meeting_id=meeting.id,
                     session_name=session_data["session_name"],
-                    session_type=session_data["session_type"],
+                    session_type=session_type_code(session_data),
                     session_key=int(session_data["session_key"])
                 )
                 db.add(session)
@@ -226,13 +258,11 @@ async def main():
                 driver_tasks.append(get_drivers(int(session_data["session_key"]), client))
                 stint_tasks.append(get_stints(int(session_data["session_key"]), client))
                 pit_stop_tasks.append(get_pit_stops(int(session_data["session_key"]), client))
-                position_change_tasks.append(get_positions_changes(int(session_data["session_key"]), client))
                 session_results.append(get_session_results(int(session_data["session_key"]), client))
 
         drivers_responses = await gather(*driver_tasks)
         stints_responses = await gather(*stint_tasks)
         pit_stops_responses = await gather(*pit_stop_tasks)
-        positions_changes_responses = await gather(*position_change_tasks)
         session_results_responses = await gather(*session_results)
         starting_grid_responses = await gather(*starting_grid_tasks)
 
@@ -267,22 +297,6 @@ async def main():
                 db.add(pit_stop_entry)
         await db.flush()
 
-        # Insert position changes into the database
-        for positions_changes in positions_changes_responses:
-            for position_change in positions_changes:
-                session_driver = await get_session_driver(position_change, db, position_change["session_key"], position_change["driver_number"])
-                if not session_driver:
-                    continue
-
-                position_change_entry = PositionChange(
-                    session_driver=session_driver,
-                    position=int(position_change["position"]) if position_change["position"] is not None else None,
-                    date_time=parser.parse(position_change["date_time"]) if position_change["date_time"] is not None else None
-                )
-                db.add(position_change_entry)
-        
-        await db.flush()
-
         # Insert session results into the database (if needed)
         for session_results in session_results_responses:
             for session_result in session_results:
@@ -295,34 +309,20 @@ async def main():
                     number_of_laps_completed=int(session_result["number_of_laps"]) if session_result["number_of_laps"] is not None else None,
                     dnf =bool(session_result["dnf"]) if session_result["dnf"] is not None else False,
                     dsq =bool(session_result["dsq"]) if session_result["dsq"] is not None else False,
-                    dns =bool(session_result["dns"]) if session_result["dns"] is not None else False
+                    dns =bool(session_result["dns"]) if session_result["dns"] is not None else False,
+                    final_position=int(session_result["position"]) if session_result.get("position") is not None else None
                 )
                 db.add(session_result_entry)
 
-                await db.flush()
-
-                session_results = await db.execute(
-                    select(SessionResult).where(
-                        SessionResult.session_driver_id == session_driver.id
-                    )
-                )
-
-                points_to_score = await db.execute(
-                    select(PointsPerPosition).where(
-                        PointsPerPosition.position == int(session_result["position"]) if session_result["position"] is not None else None
-                    )
-                )
-
-                # Check if there are points to score
-                points_to_score_result = points_to_score.scalars().first()
-                if not points_to_score_result:
-                    continue
+                # Points come with the result (the points per position table was removed)
+                if session_result.get("points"):
+                    db.add(PointsScored(
+                        session_result=session_result_entry,
+                        points_earned=float(session_result["points"]),
+                        position=session_result_entry.final_position,
+                        created_at=datetime.now()
+                    ))
 
-                points_scored = PointsScored(
-                    session_result=session_results.scalars().first(),
-                    points_per_position=points_to_score_result,
-                )
-                db.add(points_scored)
         await db.flush()
 
         # Iterating through starting grids and adding them to the database if needed
@@ -359,63 +359,29 @@ async def main():
                     tyre_age_at_start=int(stint_data["tyre_age_at_start"]) if stint_data["tyre_age_at_start"] is not None else None
                 )
                 db.add(stint)
-        lap_requests = []
-        lap_context = []
-
-        for session_list, driver_list in zip(sessions_responses, drivers_responses):
-            for session_data in session_list:
-                for driver_data in driver_list:
-                    lap_requests.append(get_laps(int(session_data["session_key"]), int(driver_data["driver_number"]), client))
-                    lap_context.append((int(session_data["session_key"]), int(driver_data["driver_number"])))
-
-        laps_responses = await gather(*lap_requests)
-
         await db.flush()
 
         print("Inserting laps...")
+        laps_started = time.perf_counter()
+        total_laps = 0
 
-        for (session_key, driver_number), laps in zip(lap_context, laps_responses):
-            result = await db.execute(select(Session).where(Session.session_key == session_key))
-            session = result.scalars().first()
-            result = await db.execute(select(Driver).where(Driver.driver_number == driver_number))
-            driver = result.scalars().first()
-
-            if not session or not driver:
-                continue
-
-            result = await db.execute(select(SessionDriver).where(
-                SessionDriver.session_id == session.id,
-                SessionDriver.driver_id == driver.id
-            ))
-            session_driver = result.scalars().first()
-            if not session_driver:
-                continue
-
-            stint = await db.execute(select(Stint).where(
-                Stint.session_driver_id == session_driver.id,
-            ))
-            stint = stint.scalars().first()
-            if not stint:
-                continue
-
-            for lap_data in laps:
-                lap = Lap(
-                    stint_id=stint.id,
-                    lap_number=int(lap_data["lap_number"]) if lap_data["lap_number"] is not None else None,
-                    duration_sector_1=float(lap_data["duration_sector_1"]) if lap_data["duration_sector_1"] is not None else None,
-                    duration_sector_2=float(lap_data["duration_sector_2"]) if lap_data["duration_sector_2"] is not None else None,
-                    duration_sector_3=float(lap_data["duration_sector_3"])  if lap_data["duration_sector_3"] is not None else None,
-                    is_pit_out_lap=bool(lap_data["is_pit_out_lap"]) if lap_data["is_pit_out_lap"] is not None else False,
-                    lap_duration=float(lap_data["lap_duration"]) if lap_data["lap_duration"] is not None else None,
-                    speed_trap=float(lap_data["st_speed"]) if lap_data["st_speed"] is not None else None
-                )
-                db.add(lap)
-
+        # One streamed request per session instead of one request per driver
+        for session_data in all_sessions:
+            total_laps += await insert_session_laps(db, int(session_data["session_key"]), client)
 
+        print(f"Inserted {total_laps} laps in {time.perf_counter() - laps_started:.1f}s")
 
         await db.commit()
 
+    # Precomputed stats and a new data version for the stats API and query tool caches
+    async with engine.begin() as conn:
+        await create_stats_views(conn)
+        await refresh_stats_views(conn)
+        await record_import_run(conn, "openf1", started_at)
+
     await client.aclose()
+    print(f"Import of {YEARS} finished in {time.perf_counter() - started:.1f}s, peak memory {peak_memory_mb():.0f} MB")
+    print(f"HTTP: {client.stats}")
 
 if __name__ == "__main__":
     import asyncio
@@ -10,15 +10,18 @@ from sqlalchemy.dialects.postgresql import insert
 from models.db import async_session
 from models.models import (
     Season, Meeting, Session, Driver, SessionDriver, SessionResult,
-    Stint, Lap, PitStop, StartGrid, PointsScored
+    Stint, Lap, PitStop, StartGrid, PointsScored, LapTelemetry
 )
 from models.db import engine, Base
+from repositories.telemetry import telemetry_to_row
+from repositories.stats import create_stats_views, data_tables, drop_stats_views, record_import_run, refresh_stats_views
 
 # Enable FastF1 cache for better performance
 fastf1.Cache.enable_cache('tmp')
 
 class F1DataImporter:
-    def __init__(self):
+    def __init__(self, load_telemetry: bool = True):
+        self.load_telemetry = load_telemetry
         self.session_type_mapping = {
             'FP1': 'Practice 1',
             'FP2': 'Practice 2', 
@@ -145,7 +148,7 @@ class F1DataImporter:
         for session_id in session_identifiers:
             try:
                 f1_session = fastf1.get_session(year, round_num, session_id)
-                f1_session.load()
+                f1_session.load(telemetry=self.load_telemetry)
                 
                 if f1_session.results.empty:
                     continue
@@ -215,6 +218,10 @@ class F1DataImporter:
         
         # Process pit stops
         await self.process_pit_stops(session, f1_session, session_driver_objects)
+
+        # Process car and position data
+        if self.load_telemetry:
+            await self.process_telemetry(session, f1_session, session_driver_objects)
     
     async def get_or_create_driver(self, session, driver_result) -> Driver:
         """Get or create driver"""
@@ -462,6 +469,36 @@ class F1DataImporter:
         except Exception as e:
             print(f"    ⚠ Could not process pit stops: {str(e)}")
     
+    async def process_telemetry(self, session, f1_session, session_driver_objects: Dict[int, SessionDriver]):
+        """Store per-lap car and position data as compressed arrays"""
+        if not hasattr(f1_session, 'laps') or f1_session.laps.empty:
+            return
+
+        for driver_num, session_driver_obj in session_driver_objects.items():
+            driver_laps = f1_session.laps[f1_session.laps['DriverNumber'] == str(driver_num)]
+            rows = []
+
+            for _, lap in driver_laps.iterlaps():
+                lap_number = int(lap['LapNumber']) if pd.notna(lap['LapNumber']) else None
+                if not lap_number:
+                    continue
+                try:
+                    # Merges car data and position data on a common time base
+                    telemetry = lap.get_telemetry()
+                except Exception:
+                    continue
+
+                row = telemetry_to_row(telemetry, session_driver_obj.id, lap_number)
+                if row:
+                    rows.append(row)
+
+            if rows:
+                # One multi-row insert per driver instead of one per lap
+                stmt = insert(LapTelemetry).values(rows).on_conflict_do_nothing(
+                    index_elements=['session_driver_id', 'lap_number']
+                )
+                await session.execute(stmt)
+
     def parse_lap_time(self, lap_time) -> Optional[float]:
         """Parse lap time to seconds"""
         if pd.isna(lap_time):
@@ -488,11 +525,13 @@ class F1DataImporter:
 
 async def on_startup():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+        await drop_stats_views(conn)
+        await conn.run_sync(Base.metadata.drop_all, tables=data_tables())
         await conn.run_sync(Base.metadata.create_all)
 
 
 async def main():
+    started_at = datetime.utcnow()
     await on_startup()
     importer = F1DataImporter()
     
@@ -505,6 +544,13 @@ async def main():
             print(f"✓ Completed season {year}")
         except Exception as e:
             print(f"✗ Failed to import season {year}: {str(e)}")
+
+    # Precomputed stats and a new data version for the stats API caches
+    async with engine.begin() as conn:
+        await create_stats_views(conn)
+        await refresh_stats_views(conn)
+        await record_import_run(conn, "fastf1", started_at)
+    print("✓ Stats views refreshed")
     
     print("Import process completed!")
 
@@ -2,9 +2,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI
-from controllers.chat import chat_router
+from controllers.chat import chat_router, history_repo
 from controllers.users import user_router
+from controllers.admin import admin_router
+from controllers.data import ARROW_STREAM_MEDIA_TYPE, data_router
+from controllers.stats import stats_router
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from repositories.redis_client import close_redis
 
 allowed_origins = [
     "http://localhost:3000",
@@ -15,6 +21,25 @@ allowed_origins = [
 app = FastAPI()
 app.include_router(chat_router, prefix="/api/v1/chat", tags=["chat"])
 app.include_router(user_router, prefix="/api/v1/users", tags=["users"])
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(data_router, prefix="/api/v1/data", tags=["data"])
+app.include_router(stats_router, prefix="/api/v1/stats", tags=["stats"])
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Flush buffered chat history before the Redis pool goes away
+    if hasattr(history_repo, "close"):
+        await history_repo.close()
+    await close_redis()
+
+# Compresses larger responses (data pages) for clients that accept gzip. Arrow
+# streams are left alone: they carry their own lz4/zstd buffer compression.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1024,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + (ARROW_STREAM_MEDIA_TYPE,),
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,4 +47,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Offset", "X-Row-Count", "X-Has-More", "ETag"],
 )
\ No newline at end of file
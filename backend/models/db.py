@@ -1,14 +1,65 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from os import getenv
+from constants.db import DB_PREPARED_STATEMENT_CACHE_SIZE
 
 DATABASE_URL = getenv("DATABASE_URL")
+# Réplica de solo lectura para las consultas del chat (opcional)
+READ_REPLICA_URL = getenv("READ_REPLICA_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_ECHO = getenv("DB_ECHO", "false").lower() == "true"
+
+
+def build_engine(url: str, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW):
+    """Crea un engine asíncrono con el pool configurado por entorno"""
+    return create_async_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        # LRU de sentencias preparadas por conexión en el driver asyncpg
+        connect_args={"prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE},
+    )
+
+
+engine = build_engine(DATABASE_URL)
+
+# Sin réplica configurada, las lecturas usan el primario
+if READ_REPLICA_URL:
+    read_engine = build_engine(
+        READ_REPLICA_URL,
+        pool_size=int(getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE))),
+        max_overflow=int(getenv("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW))),
+    )
+else:
+    read_engine = engine
 
 # Crea sesiones asincrónicas
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+read_async_session = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 Base = declarative_base()
+
+
+def pool_status(db_engine) -> dict:
+    """Estado actual del pool de conexiones de un engine"""
+    pool = db_engine.sync_engine.pool
+    return {
+        "url": db_engine.url.render_as_string(hide_password=True),
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
@@ -1,4 +1,4 @@
-from models.db import async_session
+from models.db import async_session, read_async_session
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import AsyncGenerator
 from contextlib import asynccontextmanager
@@ -7,3 +7,9 @@ from contextlib import asynccontextmanager
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
+
+@asynccontextmanager
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Sesión sobre la réplica de lectura (o el primario si no hay réplica)"""
+    async with read_async_session() as session:
+        yield session
@@ -1,5 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, Boolean, ForeignKey, Date, Interval, Text, DECIMAL, DateTime
+    Column, Integer, String, Float, Boolean, ForeignKey, Date, Interval, Text, DECIMAL, DateTime,
+    LargeBinary, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 from models.db import Base
@@ -21,7 +22,7 @@ class Meeting(Base):
     meeting_key = Column(Integer)
     meeting_official_name = Column(String(200))  # Increased for long sponsor names
     meeting_standard_name = Column(String(100))
-    seasson_id = Column(Integer, ForeignKey("season.id"))
+    seasson_id = Column(Integer, ForeignKey("season.id"), index=True)
     
     season = relationship("Season", back_populates="meetings")
     sessions = relationship("Session", back_populates="meeting")
@@ -34,7 +35,7 @@ class Meeting(Base):
 class Session(Base):
     __tablename__ = "session"
     id = Column(Integer, primary_key=True)
-    meeting_id = Column(Integer, ForeignKey("meeting.id"))
+    meeting_id = Column(Integer, ForeignKey("meeting.id"), index=True)
     session_name = Column(String(100))
     session_type = Column(String(50))
     session_key = Column(Integer)
@@ -55,8 +56,8 @@ class Driver(Base):
 class SessionDriver(Base):
     __tablename__ = "session_driver"
     id = Column(Integer, primary_key=True)
-    driver_id = Column(Integer, ForeignKey("driver.id"))
-    session_id = Column(Integer, ForeignKey("session.id"))
+    driver_id = Column(Integer, ForeignKey("driver.id"), index=True)
+    session_id = Column(Integer, ForeignKey("session.id"), index=True)
     
     driver = relationship("Driver", back_populates="session_drivers")
     session = relationship("Session", back_populates="session_drivers")
@@ -64,6 +65,7 @@ class SessionDriver(Base):
     pit_stops = relationship("PitStop", back_populates="session_driver")
     session_results = relationship("SessionResult", back_populates="session_driver")
     start_grids = relationship("StartGrid", back_populates="session_driver")
+    telemetry = relationship("LapTelemetry", back_populates="session_driver")
     
     # Unique constraint to prevent duplicate driver-session pairs
     __table_args__ = (
@@ -73,7 +75,7 @@ class SessionDriver(Base):
 class Stint(Base):
     __tablename__ = "stint"
     id = Column(Integer, primary_key=True)
-    session_driver_id = Column(Integer, ForeignKey("session_driver.id"))
+    session_driver_id = Column(Integer, ForeignKey("session_driver.id"), index=True)
     compound = Column(String(50))
     lap_start = Column(Integer, nullable=True)
     lap_end = Column(Integer, nullable=True)
@@ -86,7 +88,7 @@ class Stint(Base):
 class Lap(Base):
     __tablename__ = "lap"
     id = Column(Integer, primary_key=True)
-    stint_id = Column(Integer, ForeignKey("stint.id"))
+    stint_id = Column(Integer, ForeignKey("stint.id"), index=True)
     lap_number = Column(Integer, nullable=False)
     duration_sector_1 = Column(Float, nullable=True)
     duration_sector_2 = Column(Float, nullable=True)
@@ -100,7 +102,7 @@ class Lap(Base):
 class PitStop(Base):
     __tablename__ = "pit_stop"
     id = Column(Integer, primary_key=True)
-    session_driver_id = Column(Integer, ForeignKey("session_driver.id"))
+    session_driver_id = Column(Integer, ForeignKey("session_driver.id"), index=True)
     lap_number = Column(Integer, nullable=True)
     pit_duration = Column(Float, nullable=True)
     
@@ -109,7 +111,7 @@ class PitStop(Base):
 class SessionResult(Base):
     __tablename__ = "session_result"
     id = Column(Integer, primary_key=True)
-    session_driver_id = Column(Integer, ForeignKey("session_driver.id"))
+    session_driver_id = Column(Integer, ForeignKey("session_driver.id"), index=True)
     number_of_laps_completed = Column(Integer, nullable=True)
     dnf = Column(Boolean, nullable=True)
     dns = Column(Boolean, nullable=True)
@@ -129,7 +131,7 @@ class SessionResult(Base):
 class StartGrid(Base):
     __tablename__ = "start_grid"
     id = Column(Integer, primary_key=True)
-    session_driver_id = Column(Integer, ForeignKey("session_driver.id"))
+    session_driver_id = Column(Integer, ForeignKey("session_driver.id"), index=True)
     grid_position = Column(Integer, nullable=True)
     qualy_time = Column(Float, nullable=True)
     
@@ -139,7 +141,7 @@ class StartGrid(Base):
 class PointsScored(Base):
     __tablename__ = "points_scored"
     id = Column(Integer, primary_key=True)
-    session_result_id = Column(Integer, ForeignKey("session_result.id"))
+    session_result_id = Column(Integer, ForeignKey("session_result.id"), index=True)
     points_earned = Column(DECIMAL(4,1), nullable=False, default=0)
     position = Column(Integer, nullable=True)  # Position that earned these points
     fastest_lap_point = Column(Boolean, default=False)  # Did they get the fastest lap bonus?
@@ -147,6 +149,42 @@ class PointsScored(Base):
     
     session_result = relationship("SessionResult", back_populates="points_scored")
 
+# High resolution car/position data, one row per (session_driver, lap).
+# Every channel is a compressed array (see repositories/telemetry.py), so a
+# lap with ~700 samples is a single row instead of hundreds.
+class LapTelemetry(Base):
+    __tablename__ = "lap_telemetry"
+    id = Column(Integer, primary_key=True)
+    session_driver_id = Column(Integer, ForeignKey("session_driver.id"), nullable=False)
+    lap_number = Column(Integer, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    time = Column(LargeBinary, nullable=False)  # seconds since the start of the lap
+    distance = Column(LargeBinary, nullable=False)  # meters since the start of the lap
+    speed = Column(LargeBinary, nullable=True)
+    rpm = Column(LargeBinary, nullable=True)
+    gear = Column(LargeBinary, nullable=True)
+    throttle = Column(LargeBinary, nullable=True)
+    brake = Column(LargeBinary, nullable=True)
+    drs = Column(LargeBinary, nullable=True)
+    x = Column(LargeBinary, nullable=True)
+    y = Column(LargeBinary, nullable=True)
+
+    session_driver = relationship("SessionDriver", back_populates="telemetry")
+
+    __table_args__ = (
+        UniqueConstraint("session_driver_id", "lap_number", name="uq_lap_telemetry_session_driver_lap"),
+        {"extend_existing": True},
+    )
+
+# One row per completed data load (importer or snapshot restore). The latest
+# id is the data version behind the stats API ETags and caches.
+class ImportRun(Base):
+    __tablename__ = "import_run"
+    id = Column(Integer, primary_key=True)
+    source = Column(String(50), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=False)
+
 # REMOVED CLASSES (commented out for reference):
 # class PositionChange - ELIMINATED
 # class PointsPerPosition - ELIMINATED  
@@ -33,11 +33,9 @@ You are an expert in SQL and PostgreSQL databases.
                 Now, answer the following request strictly with SQL:
 """
 
-PROMPT_REQUEST_TO_SQL = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """
+# SQL generation prompt. The schema is kept per table so the prompt can be
+# rendered with only the tables a question needs (see repositories/schema_selector.py).
+SQL_PROMPT_HEADER = """
 You are an expert in SQL and PostgreSQL databases.  
 Respond only with valid PostgreSQL SQL statements.  
 Do not add explanations, comments, or any extra text.  
@@ -45,42 +43,99 @@ Use only characters in english alphabet, numbers, and underscores in column valu
 
 Here is the database schema (tables, columns, types, and keys):  
 
-// Driver info
-driver: id int PK, driver_number int UNIQUE NULL, full_name varchar(100) NULL, name_acronym varchar(10) NULL, headshot_url text NULL
+"""
 
-// Lap info: a higher lap_duration is worse than a lower lap_duration
-lap: id int PK, stint_id int NULL FK->stint.id, lap_number int NOT NULL, duration_sector_1 float NULL, duration_sector_2 float NULL, duration_sector_3 float NULL, is_pit_out_lap boolean NULL, lap_duration float NULL, speed_trap float NULL
+# table -> (comment, columns line)
+SCHEMA_TABLES = {
+    "driver": (
+        "// Driver info",
+        "driver: id int PK, driver_number int UNIQUE NULL, full_name varchar(100) NULL, name_acronym varchar(10) NULL, headshot_url text NULL",
+    ),
+    "lap": (
+        "// Lap info: a higher lap_duration is worse than a lower lap_duration",
+        "lap: id int PK, stint_id int NULL FK->stint.id, lap_number int NOT NULL, duration_sector_1 float NULL, duration_sector_2 float NULL, duration_sector_3 float NULL, is_pit_out_lap boolean NULL, lap_duration float NULL, speed_trap float NULL",
+    ),
+    "meeting": (
+        "// Meeting is the race info: meeting_standard_name is the grand prix name use it always for GP name queries, country_name is the country where the grand prix was held, all GP names are in English",
+        "meeting: id int PK, country_name varchar(100) NULL, country_code varchar(10) NULL, date_start date NULL, gmt_offset interval NULL, location varchar(100) NULL, meeting_key int NULL, meeting_official_name varchar(200) NULL, meeting_standard_name varchar(100) NULL, seasson_id int NULL FK->season.id",
+    ),
+    "pit_stop": (
+        "// Pit stop information",
+        "pit_stop: id int PK, session_driver_id int NULL FK->session_driver.id, lap_number int NULL, pit_duration float NULL",
+    ),
+    "points_scored": (
+        "// Points scored by drivers",
+        "points_scored: id int PK, session_result_id int NULL FK->session_result.id, points_earned decimal(4,1) NOT NULL DEFAULT 0, position int NULL, fastest_lap_point boolean DEFAULT false, created_at datetime NULL",
+    ),
+    "season": (
+        "// Season is the year of the competition",
+        "season: id int PK, year int NOT NULL UNIQUE",
+    ),
+    "session": (
+        "// Session information",
+        "session: id int PK, meeting_id int NULL FK->meeting.id, session_name varchar(100) NULL, session_type varchar(50) NULL, session_key int NULL",
+    ),
+    "session_driver": (
+        "// Driver participation in sessions",
+        "session_driver: id int PK, driver_id int NULL FK->driver.id, session_id int NULL FK->session.id",
+    ),
+    "session_result": (
+        "// Session results for drivers",
+        "session_result: id int PK, session_driver_id int NULL FK->session_driver.id, number_of_laps_completed int NULL, dnf boolean NULL, dns boolean NULL, dsq boolean NULL, final_position int NULL, fastest_lap_time float NULL, fastest_lap_number int NULL, total_race_time float NULL, gap_to_leader float NULL, status varchar(50) NULL",
+    ),
+    "start_grid": (
+        "// Starting grid positions",
+        "start_grid: id int PK, session_driver_id int NULL FK->session_driver.id, grid_position int NULL, qualy_time float NULL",
+    ),
+    "stint": (
+        "// A stint is a continuous period of time a driver spends on track with the same tyres",
+        "stint: id int PK, session_driver_id int NULL FK->session_driver.id, compound varchar(50) NULL, lap_start int NULL, lap_end int NULL, stint_number int NULL, tyre_age_at_start int NULL",
+    ),
+}
+
+SQL_PROMPT_FOOTER = """Lap analyses: for questions about race pace, tyre degradation, lap time consistency, gaps between drivers or undercut windows, do not compute them in SQL.
+Instead, write this first line, followed by a query that returns the session id as session_id and, when the question is about specific drivers, their driver_number:
+-- analysis: <pace | degradation | consistency | gaps | undercut>
+Example:
+-- analysis: degradation
+SELECT s.id AS session_id, d.driver_number FROM session s JOIN meeting m ON s.meeting_id = m.id JOIN season se ON m.seasson_id = se.id JOIN session_driver sd ON sd.session_id = s.id JOIN driver d ON sd.driver_id = d.id WHERE m.meeting_standard_name = 'Monaco Grand Prix' AND se.year = 2024 AND s.session_type = 'R' AND d.full_name = 'Charles Leclerc'
 
-// Meeting is the race info: meeting_standard_name is the grand prix name use it always for GP name queries, country_name is the country where the grand prix was held, all GP names are in English
-meeting: id int PK, country_name varchar(100) NULL, country_code varchar(10) NULL, date_start date NULL, gmt_offset interval NULL, location varchar(100) NULL, meeting_key int NULL, meeting_official_name varchar(200) NULL, meeting_standard_name varchar(100) NULL, seasson_id int NULL FK->season.id
+Now, answer the following request strictly with SQL: 
 
-// Pit stop information
-pit_stop: id int PK, session_driver_id int NULL FK->session_driver.id, lap_number int NULL, pit_duration float NULL
+                """
 
-// Points scored by drivers
-points_scored: id int PK, session_result_id int NULL FK->session_result.id, points_earned decimal(4,1) NOT NULL DEFAULT 0, position int NULL, fastest_lap_point boolean DEFAULT false, created_at datetime NULL
 
-// Season is the year of the competition
-season: id int PK, year int NOT NULL UNIQUE
+def render_schema(tables=None) -> str:
+    """Schema section for `tables` (all of them by default), in SCHEMA_TABLES order."""
+    return "".join(
+        f"{comment}\n{columns}\n\n" for name, (comment, columns) in SCHEMA_TABLES.items()
+        if tables is None or name in tables
+    )
 
-// Session information
-session: id int PK, meeting_id int NULL FK->meeting.id, session_name varchar(100) NULL, session_type varchar(50) NULL, session_key int NULL
 
-// Driver participation in sessions
-session_driver: id int PK, driver_id int NULL FK->driver.id, session_id int NULL FK->session.id
+def build_request_to_sql_prompt(tables=None) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", SQL_PROMPT_HEADER + render_schema(tables) + SQL_PROMPT_FOOTER),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ]
+    )
 
-// Session results for drivers
-session_result: id int PK, session_driver_id int NULL FK->session_driver.id, number_of_laps_completed int NULL, dnf boolean NULL, dns boolean NULL, dsq boolean NULL, final_position int NULL, fastest_lap_time float NULL, fastest_lap_number int NULL, total_race_time float NULL, gap_to_leader float NULL, status varchar(50) NULL
 
-// Starting grid positions
-start_grid: id int PK, session_driver_id int NULL FK->session_driver.id, grid_position int NULL, qualy_time float NULL
+PROMPT_REQUEST_TO_SQL = build_request_to_sql_prompt()
 
-// A stint is a continuous period of time a driver spends on track with the same tyres
-stint: id int PK, session_driver_id int NULL FK->session_driver.id, compound varchar(50) NULL, lap_start int NULL, lap_end int NULL, stint_number int NULL, tyre_age_at_start int NULL
 
-Now, answer the following request strictly with SQL: 
-
-                """
+# Function calling mode: the tools carry their own descriptions, so no schema here
+PROMPT_SELECT_TOOL = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+You answer Formula 1 questions by calling exactly one of the available tools.
+Use English names for grands prix and full names for drivers.
+If no tool can answer the question, reply with the single word NONE.
+            """
         ),
         MessagesPlaceholder(variable_name="history"),
         ("human", "{input}"),
@@ -1,9 +1,63 @@
 from abc import ABC, abstractmethod
 import re
-from typing import Tuple, List
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Tuple, List
 from schemas.db import MatchData
-from models.deps import get_db
+from models.db import engine, read_engine, pool_status
+from models.deps import get_db, get_read_db
 from sqlalchemy import text
+from constants.db import QUERY_CHUNK_ROWS, QUERY_MAX_ROWS, QUERY_MAX_BYTES, DB_PREPARED_STATEMENT_CACHE_SIZE
+
+# Strings and quoted identifiers, comments, bind names, whitespace, everything else
+_SQL_TOKEN = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<ident>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<bind>(?<!:):[A-Za-z_]\w*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^'\"\s:-]+|::|:|-)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(query: str) -> str:
+    """Forma canónica de una consulta parametrizada para reutilizar su sentencia preparada.
+
+    Minúsculas y un solo espacio fuera de las comillas; literales, identificadores
+    entre comillas y nombres de parámetros se conservan tal cual.
+    """
+    parts = []
+    for match in _SQL_TOKEN.finditer(query.strip().rstrip(";").strip()):
+        kind = match.lastgroup
+        token = match.group()
+        if kind in ("space", "comment"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind == "other":
+            parts.append(token.lower())
+        else:
+            parts.append(token)
+    return "".join(parts).strip()
+
+
+@dataclass
+class CappedResult:
+    """Filas leídas hasta el límite y si la consulta tenía más"""
+    columns: List[str] = field(default_factory=list)
+    rows: list = field(default_factory=list)
+    truncated: bool = False
+    size_bytes: int = 0
+
+    def for_prompt(self):
+        """Resultados tal como se pasan al LLM, avisando si están truncados"""
+        if not self.truncated:
+            return self.rows
+        return (
+            f"{self.rows}\n(Only the first {len(self.rows)} rows are shown; "
+            f"the query returned more rows that were not read.)"
+        )
+
 
 class DBBaseRepository(ABC):
     @abstractmethod
@@ -11,19 +65,145 @@ class DBBaseRepository(ABC):
         """Ejecuta una consulta en la base de datos"""
         pass
 
+    async def stream_query(self, query: str, params: dict = None, chunk_size: int = QUERY_CHUNK_ROWS) -> AsyncIterator[list]:
+        """Devuelve las filas por bloques; por defecto sobre execute_query"""
+        rows = await self.execute_query(query, params)
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+
+    async def execute_query_capped(
+        self, query: str, params: dict = None, max_rows: int = QUERY_MAX_ROWS, max_bytes: int = QUERY_MAX_BYTES
+    ) -> CappedResult:
+        """Lee por bloques y se detiene al llegar a max_rows filas o max_bytes de texto"""
+        result = CappedResult()
+        chunks = self.stream_query(query, params, chunk_size=min(QUERY_CHUNK_ROWS, max_rows + 1))
+        try:
+            async for chunk in chunks:
+                if not result.columns and chunk and hasattr(chunk[0], "_fields"):
+                    result.columns = list(chunk[0]._fields)
+                for row in chunk:
+                    # Tamaño medido como texto: es lo que acaba en el prompt
+                    row_bytes = len(str(tuple(row)))
+                    if len(result.rows) >= max_rows or result.size_bytes + row_bytes > max_bytes:
+                        result.truncated = True
+                        return result
+                    result.rows.append(row)
+                    result.size_bytes += row_bytes
+        finally:
+            await chunks.aclose()
+        return result
+
 class PostgresRepository(DBBaseRepository):
-    def __init__(self, connection_string: str):
+    def __init__(self, connection_string: str, read_only: bool = False):
         self.connection_string = connection_string
-        # Aquí podrías inicializar la conexión a la base de datos
+        # Con read_only las consultas van a la réplica de lectura (si existe)
+        self.read_only = read_only
+        self.engine = read_engine if read_only else engine
+        self.checkout_stats = {"checkouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+        self.statement_stats = {"hits": 0, "misses": 0}
+
+    def _session(self):
+        return get_read_db() if self.read_only else get_db()
 
     async def execute_query(self, query: str, params: dict = None):
-        async with get_db() as session:
+        # Si la tarea se cancela, asyncpg envía la cancelación de protocolo al servidor
+        async with self._session() as session:
+            cache = await self._checkout(session)
+            started = time.time()
             result = await session.execute(
-                text(query),
+                text(normalize_sql(query)),
                 params or {}
             )
+            self._record_statement(cache, result, started)
             return result.fetchall()
 
+    async def execute_page(self, query: str, params: dict = None, offset: int = 0, limit: int = 1000):
+        """Una página de la consulta: (description del cursor, filas, hay_más)"""
+        paged = f"SELECT * FROM ({normalize_sql(query)}) AS page LIMIT :_page_limit OFFSET :_page_offset"
+        page_params = {**(params or {}), "_page_limit": limit + 1, "_page_offset": offset}
+        async with self._session() as session:
+            cache = await self._checkout(session)
+            started = time.time()
+            result = await session.execute(text(paged), page_params)
+            self._record_statement(cache, result, started)
+            description = result.cursor.description
+            rows = result.fetchall()
+        return description, rows[:limit], len(rows) > limit
+
+    async def stream_query(self, query: str, params: dict = None, chunk_size: int = QUERY_CHUNK_ROWS) -> AsyncIterator[list]:
+        """Cursor del lado del servidor: solo un bloque de filas en memoria a la vez"""
+        async with self._session() as session:
+            cache = await self._checkout(session)
+            started = time.time()
+            result = await session.stream(
+                text(normalize_sql(query)).execution_options(yield_per=chunk_size),
+                params or {}
+            )
+            self._record_statement(cache, result, started)
+            try:
+                async for partition in result.partitions(chunk_size):
+                    yield partition
+            finally:
+                # Cierra el cursor aunque el consumidor pare antes del final
+                await result.close()
+
+    async def _checkout(self, session):
+        """Toma la conexión del pool midiendo cuánto tiempo se esperó por ella.
+        Devuelve la caché de sentencias preparadas del driver para esa conexión (o None).
+        """
+        started = time.perf_counter()
+        connection = await session.connection()
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.checkout_stats["checkouts"] += 1
+        self.checkout_stats["total_wait_ms"] += wait_ms
+        self.checkout_stats["max_wait_ms"] = max(self.checkout_stats["max_wait_ms"], wait_ms)
+
+        raw = await connection.get_raw_connection()
+        # LRU del adaptador asyncpg de SQLAlchemy (prepared_statement_cache_size)
+        return getattr(raw.dbapi_connection, "_prepared_statement_cache", None)
+
+    def _record_statement(self, cache, result, started: float):
+        """Anota si la sentencia se reutilizó de la caché del driver o se preparó ahora.
+
+        La caché guarda (sentencia, atributos, momento en que se preparó) con la SQL
+        enviada al driver como clave; una entrada preparada antes de `started`
+        es un acierto. Evicciones e invalidaciones tras DDL cuentan como fallos
+        porque el driver vuelve a preparar la sentencia.
+        """
+        context = getattr(getattr(result, "_real_result", result), "context", None)
+        statement = getattr(context, "statement", None)
+        if cache is None or statement is None:
+            return
+        entry = cache.get(statement)
+        if entry is None:
+            return
+        if entry[2] < started:
+            self.statement_stats["hits"] += 1
+        else:
+            self.statement_stats["misses"] += 1
+
+    def pool_report(self) -> dict:
+        """Estado del pool y tiempos de espera al tomar conexiones"""
+        checkouts = self.checkout_stats["checkouts"]
+        return {
+            "read_only": self.read_only,
+            "pool": pool_status(self.engine),
+            "checkouts": checkouts,
+            "avg_wait_ms": round(self.checkout_stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+            "max_wait_ms": round(self.checkout_stats["max_wait_ms"], 3),
+            "prepared_statements": self.statement_report(),
+        }
+
+    def statement_report(self) -> dict:
+        """Aciertos de la caché de sentencias preparadas del driver"""
+        hits, misses = self.statement_stats["hits"], self.statement_stats["misses"]
+        return {
+            "cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
 
 class QueryCleaner:
     counter = 0
@@ -0,0 +1,166 @@
+import asyncio
+from collections import Counter, deque
+from typing import Deque, Dict, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from repositories.user_chat_history import BaseRepository
+from utils.logger import logger
+
+
+class WriteBehindHistoryRepository(BaseRepository):
+    """Historial con escrituras diferidas: los mensajes se encolan y se guardan por lotes.
+
+    - Las escrituras solo esperan a que haya sitio en la cola (backpressure
+      cuando hay `max_pending` mensajes sin guardar).
+    - Un único flusher vacía la cola en lotes de hasta `batch_size` mensajes
+      de cualquier usuario con backend.append_many, conservando el orden.
+    - Las lecturas combinan el backend con los mensajes aún pendientes del
+      mismo usuario (read-your-writes). El estado de escritura se lleva por
+      usuario: una lectura solo espera o se repite si se están guardando
+      mensajes de ese mismo usuario, nunca por los lotes de otros.
+    - Un lote que falla se reintenta hasta `max_attempts` veces y después se
+      descarta; entre intentos las lecturas no esperan y van al backend.
+    - close() guarda lo pendiente antes de apagar, esperando como mucho `close_timeout`.
+    """
+
+    def __init__(
+        self,
+        backend: BaseRepository,
+        max_pending: int = 10000,
+        batch_size: int = 200,
+        retry_delay: float = 0.5,
+        max_attempts: int = 5,
+        close_timeout: float = 10.0,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.close_timeout = close_timeout
+        self.dropped_messages = 0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._pending: Dict[str, Deque[Tuple[str, str]]] = {}
+        self._flushing: Dict[str, int] = {}  # mensajes de cada usuario en el intento en curso
+        self._attempts: Dict[str, int] = {}  # intentos empezados con mensajes pendientes de cada usuario
+        self._flushed = asyncio.Event()
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
+        """Encola el mensaje; vuelve en cuanto hay sitio en la cola"""
+        self._ensure_started()
+        await self.queue.put((user_id, message, type))
+        self._pending.setdefault(user_id, deque()).append((message, type))
+
+    async def get_chat_history(self, user_id: str, limit: int = 10) -> list:
+        history, pending = await self._consistent_read(user_id, self.backend.get_chat_history, limit)
+        merged = history + [self._to_message(m, t) for (m, t) in pending]
+        return merged[-limit:] if limit > 0 else merged
+
+    async def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
+        history, pending = await self._consistent_read(user_id, self.backend.get_human_chat_history, limit)
+        merged = history + [self._to_message(m, t) for (m, t) in pending if t == "user"]
+        return merged[-limit:] if limit > 0 else merged
+
+    async def append_many(self, entries: list):
+        for user_id, message, type in entries:
+            await self.set_next_chat_message(user_id, message, type=type)
+
+    async def memory_report(self, top: int = 50) -> dict:
+        report = await self.backend.memory_report(top=top)
+        report["write_behind"] = {
+            "queued": self.queue.qsize(),
+            "max_queued": self.queue.maxsize,
+            "users_with_pending": len(self._pending),
+            "dropped_messages": self.dropped_messages,
+        }
+        return report
+
+    async def close(self):
+        """Guarda todos los mensajes pendientes y detiene el flusher"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.close_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Chat history flush timed out on shutdown, {self.queue.qsize()} queued messages not saved")
+        self._task.cancel()
+        self._task = None
+
+    async def _consistent_read(self, user_id: str, read, limit: int):
+        while True:
+            if self._flushing.get(user_id):
+                # Se están guardando mensajes de este usuario: esperar a que termine el intento
+                self._flushed.clear()
+                await self._flushed.wait()
+                continue
+            pending = list(self._pending.get(user_id, ()))
+            attempts = self._attempts.get(user_id, 0)
+            history = await read(user_id, limit)
+            if not pending:
+                return history, pending
+            # Ninguno de los pendientes leídos empezó a guardarse durante la lectura
+            current = self._pending.get(user_id)
+            if (
+                not self._flushing.get(user_id) and current and current[0] is pending[0]
+                and self._attempts.get(user_id, 0) == attempts
+            ):
+                return history, pending
+
+    @staticmethod
+    def _to_message(message: str, type: str):
+        return HumanMessage(content=message) if type == "user" else AIMessage(content=message)
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                for attempt in range(1, self.max_attempts + 1):
+                    if await self._write(batch, attempt):
+                        break
+                    if attempt < self.max_attempts:
+                        await asyncio.sleep(self.retry_delay * attempt)
+                else:
+                    self.dropped_messages += len(batch)
+                    logger.error(f"Dropping {len(batch)} chat messages after {self.max_attempts} failed flushes")
+
+                for user_id, _message, _type in batch:
+                    pending = self._pending.get(user_id)
+                    if pending:
+                        pending.popleft()
+                        if not pending:
+                            del self._pending[user_id]
+                            self._attempts.pop(user_id, None)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: list, attempt: int) -> bool:
+        """Un intento de guardar el lote; sus usuarios solo cuentan como en escritura mientras dura"""
+        users = Counter(user_id for user_id, _message, _type in batch)
+        for user_id, count in users.items():
+            self._flushing[user_id] = self._flushing.get(user_id, 0) + count
+            self._attempts[user_id] = self._attempts.get(user_id, 0) + 1
+        try:
+            await self.backend.append_many(batch)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} chat messages (attempt {attempt}/{self.max_attempts}): {str(e)}")
+            return False
+        finally:
+            for user_id, count in users.items():
+                left = self._flushing[user_id] - count
+                if left:
+                    self._flushing[user_id] = left
+                else:
+                    del self._flushing[user_id]
+            self._flushed.set()
@@ -1,16 +1,31 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
-from typing import Any
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from collections import OrderedDict
 import asyncio
-from repositories.db import DBBaseRepository, QueryCleaner
+import time
+from repositories.db import CappedResult, DBBaseRepository, MatchData, QueryCleaner, normalize_sql
 from repositories.user_chat_history import BaseRepository
 from repositories.qdrant_service import QdrantRepository
-from prompts.user_question_to_response import PROMPT_REQUEST_TO_SQL, PROMPT_INTERPRET_SQL_RESULTS
+from repositories.result_data import ResultHandleRepository
+from repositories.llm_gateway import LLMGateway, PRIORITY_SQL, PRIORITY_INTERPRETATION
+from repositories.lap_analytics import ANALYSES, LapAnalytics
+from repositories.query_tools import QueryTool, QueryToolCatalog
+from repositories.rate_limiter import Overloaded
+from repositories.schema_selector import SchemaSelector
+from repositories.sql_cache import SQLReuseCache
+from prompts.user_question_to_response import PROMPT_REQUEST_TO_SQL, PROMPT_INTERPRET_SQL_RESULTS, PROMPT_SELECT_TOOL
 from utils.logger import logger
+from utils.deadline import Deadline, DeadlineExceeded
+from constants.db import BATCH_DEADLINE_SECONDS, CHAT_DEADLINE_SECONDS
+import json
 import re
 
+TIMEOUT_ANSWER = "Sorry, answering this question took too long. Please try again or ask something more specific."
+ERROR_ANSWER = "Sorry, an error occurred while answering this question."
+BUSY_ANSWER = "Sorry, too many questions are being answered right now. Please retry this one later."
+
 def extract_sql(text: str) -> str:
     # Deletes ```sql ... ``` if exists
     match = re.search(r"```sql\s*(.*?)\s*```", text, re.DOTALL | re.IGNORECASE)
@@ -18,92 +33,445 @@ def extract_sql(text: str) -> str:
         return match.group(1).strip()
     return text.strip()
 
+ANALYSIS_DIRECTIVE = re.compile(r"^\s*--\s*analysis:\s*(\w+)\s*$", re.MULTILINE | re.IGNORECASE)
+
+def extract_analysis(sql: str) -> Tuple[Optional[str], str]:
+    """Splits a leading "-- analysis: <name>" line from the SQL that selects the session (and drivers)."""
+    match = ANALYSIS_DIRECTIVE.search(sql)
+    if not match or match.group(1).lower() not in ANALYSES:
+        return None, sql
+    return match.group(1).lower(), ANALYSIS_DIRECTIVE.sub("", sql).strip()
+
 def debug_prompt(prompt: str):
     """Debugging function to print the prompt."""
     logger.debug(f"Prompt: {prompt}")
     return prompt
 
 class NLToSQLInterpreter:
-    def __init__(self, db_repo: DBBaseRepository, history_repo: BaseRepository, query_cleaner: QueryCleaner, qdrant_repo: QdrantRepository, model_name: str = "gemini-1.5-flash"):
+    # Share of the request budget each stage may use (capped by what is left)
+    STAGE_SHARES = {"sql": 0.4, "params": 0.1, "query": 0.3, "interpretation": 1.0}
+
+    def __init__(self, db_repo: DBBaseRepository, history_repo: BaseRepository, query_cleaner: QueryCleaner, qdrant_repo: QdrantRepository, model_name: str = "gemini-1.5-flash", result_handles: Optional[ResultHandleRepository] = None, llm_gateway: Optional[LLMGateway] = None, lap_analytics: Optional[LapAnalytics] = None, query_tools: Optional[QueryToolCatalog] = None, schema_selector: Optional[SchemaSelector] = None, sql_cache: Optional[SQLReuseCache] = None):
         self.db_repo = db_repo
         self.history_repo = history_repo
-        self.llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
+        # Every LLM call goes through the gateway (shared concurrency limits and fair queuing)
+        self.llm_gateway = llm_gateway or LLMGateway()
+        self.model_name = model_name
+        self.llm = self.llm_gateway.llm(model_name)
         self.query_cleaner = query_cleaner
         self.qdrant_repo = qdrant_repo
+        # Where the executed SQL is kept so the data API can serve its rows
+        self.result_handles = result_handles
+        # Pace, degradation, gaps... computed in NumPy over the session laps instead of in SQL
+        self.lap_analytics = lap_analytics or LapAnalytics()
+        # Set in tools mode (PIPELINE_MODE=tools): function calling over pre-written queries
+        self.query_tools = query_tools
+        self._tool_llm = None
+        # Trims the schema in the SQL prompt to the tables the question needs
+        self.schema_selector = schema_selector
+        # Question → SQL shapes of earlier successful runs, reused without the generation call
+        self.sql_cache = sql_cache
 
-    def _get_history_as_messages(self, user_id: str):
-        """Convierte historial guardado en objetos HumanMessage y AIMessage"""
-        return self.history_repo.get_chat_history(user_id)
-    
-    def _get_humman_messages(self, user_id: str):
-        """Obtiene solo los mensajes de usuario del historial"""
-        return self.history_repo.get_human_chat_history(user_id)
-
-    def request_to_sql(self, user_id: str, natural_language_question: str) -> str:
-        history_messages = self._get_history_as_messages(user_id)
-        chain = PROMPT_REQUEST_TO_SQL | RunnableLambda(debug_prompt) | self.llm | StrOutputParser() | (lambda x: extract_sql(x))
-        sql_query = chain.invoke({
+    async def request_to_sql(self, history_messages: list, natural_language_question: str, user_id: str = "") -> str:
+        prompt = PROMPT_REQUEST_TO_SQL
+        if self.schema_selector is not None:
+            previous = [m.content for m in history_messages if isinstance(m, HumanMessage)]
+            prompt = await self.schema_selector.prompt_for(natural_language_question, previous)
+        chain = prompt | RunnableLambda(debug_prompt) | self.llm | StrOutputParser() | (lambda x: extract_sql(x))
+        sql_query = (await self.llm_gateway.ainvoke(chain, {
             "history": history_messages,
             "input": natural_language_question
-        }).strip()
+        }, user_id=user_id, model=self.model_name, priority=PRIORITY_SQL)).strip()
         return sql_query
 
-    def interpret_results(self, user_id: str, question: str, results: Any) -> str:
-        history_messages = self._get_history_as_messages(user_id)
+    def bind_query_tools(self):
+        """Binds the tool declarations to the model once (serve.py does it before forking)."""
+        if self._tool_llm is None:
+            self._tool_llm = self.llm.bind_tools(self.query_tools.specs())
+        return self._tool_llm
+
+    async def select_tool(self, history_messages: list, question: str, user_id: str = "") -> Optional[Tuple[QueryTool, dict]]:
+        """Asks the model for a query tool call; None when it picks none or the call is malformed."""
+        chain = PROMPT_SELECT_TOOL | self.bind_query_tools()
+        message = await self.llm_gateway.ainvoke(chain, {
+            "history": history_messages,
+            "input": question
+        }, user_id=user_id, model=self.model_name, priority=PRIORITY_SQL)
+        return self.query_tools.parse(getattr(message, "tool_calls", None))
+
+    async def interpret_results(self, history_messages: list, question: str, results: Any, user_id: str = "") -> str:
         chain = PROMPT_INTERPRET_SQL_RESULTS | self.llm
-        interpretation = chain.invoke({
+        interpretation = (await self.llm_gateway.ainvoke(chain, {
             "history": history_messages,
             "question": question,
             "results": results
-        }).content.strip()
+        }, user_id=user_id, model=self.model_name, priority=PRIORITY_INTERPRETATION)).content.strip()
         return interpretation
 
-    async def _fetch_param(self, data_item):
+    async def interpret_results_stream(
+        self, history_messages: list, question: str, results: Any, on_token: Callable[[str], Awaitable], user_id: str = ""
+    ) -> str:
+        """Same as interpret_results, passing each generated chunk to on_token as it arrives."""
+        chain = PROMPT_INTERPRET_SQL_RESULTS | self.llm | StrOutputParser()
+        parts = []
+        async for chunk in self.llm_gateway.astream(chain, {
+            "history": history_messages,
+            "question": question,
+            "results": results
+        }, user_id=user_id, model=self.model_name, priority=PRIORITY_INTERPRETATION):
+            if chunk:
+                parts.append(chunk)
+                await on_token(chunk)
+        return "".join(parts).strip()
+
+    async def _resolve_param(self, data_item):
+        """Busca en Qdrant el valor real de un item extraído; falla si no hay resultado."""
+        results = await self.qdrant_repo.similarity_search_async(
+            collection_name=data_item.type,
+            search_query=data_item.data,
+            limit=1
+        )
+        if not results:
+            raise LookupError(f"No {data_item.type} matches {data_item.data!r}")
+        payload = getattr(results[0], "payload", None) or {}
+        value = payload.get("text") or payload.get("value") or next(iter(payload.values()), None)
+        if value is None:
+            raise LookupError(f"No {data_item.type} value for {data_item.data!r}")
+        return data_item.key, value
+
+    async def _fetch_param(self, data_item, entities: Optional["SingleFlight"] = None):
         """Obtiene el parámetro real desde Qdrant para un item extraído.
         Devuelve una tupla (key, value) con fallback al valor original en caso de error o sin resultados.
+        Con `entities` solo se comparten (y cachean) las búsquedas que encontraron valor.
         """
         try:
-            results = await self.qdrant_repo.similarity_search_async(
-                collection_name=data_item.type,
-                search_query=data_item.data,
-                limit=1
-            )
-            if results:
-                top = results[0]
-                payload = getattr(top, "payload", None) or {}
-                value = payload.get("text") or payload.get("value") or next(iter(payload.values()), None)
-                return data_item.key, (value if value is not None else data_item.data)
-            return data_item.key, data_item.data
+            if entities is None:
+                return await self._resolve_param(data_item)
+            return await entities.run(("param", data_item.type, data_item.data), lambda: self._resolve_param(data_item))
         except Exception:
             return data_item.key, data_item.data
 
-    async def run_query_flow(self, user_id: str, question: str) -> str:
-        # Save user message
-        self.history_repo.set_next_chat_message(user_id, f"{question}", type="user")
+    async def run_query_flow(self, user_id: str, question: str, deadline: Optional[Deadline] = None) -> Tuple[str, Optional[str]]:
+        """Returns the answer and the data handle of the executed query (None if it did not run)."""
+        deadline = deadline or Deadline(CHAT_DEADLINE_SECONDS)
+
+        # Save user message and take one history snapshot for both prompts
+        history_messages = await self.history_repo.add_message_and_get_history(user_id, f"{question}", type="user")
 
-        # Step 1: Question → SQL
-        sql_query = self.request_to_sql(user_id, question)
+        interpretation, data_handle = await self.answer_question(user_id, question, history_messages, deadline)
 
+        # Save system response
+        await self.history_repo.set_next_chat_message(user_id, f"{interpretation}", type="system")
+        return interpretation, data_handle
+
+    async def run_batch_flow(
+        self, user_id: str, questions: List[str], deadline: Optional[Deadline] = None, concurrency: int = 5,
+        question_seconds: float = CHAT_DEADLINE_SECONDS, admit: Optional[Callable] = None,
+    ) -> AsyncIterator[Tuple[int, str, Optional[str]]]:
+        """Answers independent questions concurrently and yields (index, answer, data handle) as each one finishes.
+
+        All questions see the history as it was before the batch. Identical SQL
+        generation, entity lookups and query executions inside the batch run once.
+        Each question/answer pair is saved to the history when it completes.
+        Each question gets its own `question_seconds` budget from the moment it
+        starts, capped by what is left of the batch `deadline`. `admit()`, when
+        given, wraps each question (rate limit and admission control); a
+        question it rejects with Overloaded is answered with BUSY_ANSWER.
+        """
+        deadline = deadline or Deadline(BATCH_DEADLINE_SECONDS)
+        history_messages = await self.history_repo.get_chat_history(user_id)
+        shared = SingleFlight()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(question: str):
+            question_deadline = Deadline(min(question_seconds, deadline.remaining()))
+            return await self.answer_question(user_id, question, history_messages, question_deadline, shared=shared)
+
+        async def one(index: int, question: str):
+            try:
+                async with semaphore:
+                    if admit is not None:
+                        async with admit():
+                            interpretation, data_handle = await answer(question)
+                    else:
+                        interpretation, data_handle = await answer(question)
+                await self.history_repo.append_many([
+                    (user_id, question, "user"),
+                    (user_id, interpretation, "system"),
+                ])
+                return index, interpretation, data_handle
+            except Overloaded:
+                logger.info(f"Batch question {index} for user {user_id} rejected, pipeline busy or rate limited")
+                return index, BUSY_ANSWER, None
+            except Exception as e:
+                logger.error(f"Error processing batch question {index} for user {user_id}: {str(e)}")
+                return index, ERROR_ANSWER, None
+
+        tasks = [asyncio.create_task(one(i, q)) for i, q in enumerate(questions)]
         try:
-            # Step 2: Clean SQL query
-            cleaned_query, extracted_data = self.query_cleaner.clean_query(sql_query)
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def answer_question(
+        self, user_id: str, question: str, history_messages: list, deadline: Deadline,
+        shared: Optional["SingleFlight"] = None, entities: Optional["SingleFlight"] = None,
+        on_event: Optional[Callable[[dict], Awaitable]] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """Question → SQL → params → results → interpretation, without touching the history.
+
+        The caller reads the history and saves the question/answer pair (see
+        run_query_flow, run_batch_flow and services/chat_session.py). `shared`
+        dedupes work between concurrent questions, `entities` caches entity
+        lookups (defaults to `shared`), and `on_event` receives stage and token events.
+        """
+        shared = shared or SingleFlight()
+        entities = entities or shared
+        data_handle = None
+
+        async def emit(event: dict):
+            if on_event is not None:
+                await on_event(event)
+
+        # Tools mode: the model picks a pre-written query; free-form SQL is the fallback
+        tool_call = None
+        if self.query_tools is not None:
+            await emit({"type": "stage", "stage": "tool"})
+            try:
+                tool_call = await deadline.run(
+                    shared.run(("tool", question.strip()), lambda: self.select_tool(history_messages, question, user_id=user_id)),
+                    "sql", self.STAGE_SHARES["sql"]
+                )
+            except DeadlineExceeded:
+                return TIMEOUT_ANSWER, None
+            except Exception as e:
+                logger.error(f"Error selecting a query tool for user {user_id}: {str(e)}")
+
+        if tool_call is not None:
+            try:
+                query_results, data_handle = await self._run_tool(*tool_call, user_id, deadline, shared, entities, emit)
+                if query_results is None:
+                    # No rows usually means arguments that match nothing stored (or data not loaded): let the SQL path try
+                    logger.info(f"Query tool {tool_call[0].name} returned no rows for user {user_id}, falling back to SQL")
+                    tool_call = None
+            except DeadlineExceeded:
+                return TIMEOUT_ANSWER, None
+            except Exception as e:
+                logger.error(f"Error running query tool {tool_call[0].name} for user {user_id}, falling back to SQL: {str(e)}")
+                tool_call = None
+        if tool_call is None:
+            # Reuse the SQL of an equivalent question when there is one (entities resolved again, fresh data)
+            reuse = None
+            if self.sql_cache is not None:
+                try:
+                    reuse = await deadline.run(self.sql_cache.lookup(question), "sql", self.STAGE_SHARES["sql"])
+                except DeadlineExceeded:
+                    return TIMEOUT_ANSWER, None
+            if reuse is not None:
+                await emit({"type": "stage", "stage": "sql", "reused": True})
+                try:
+                    query_results, data_handle, _ = await self._execute_sql(
+                        reuse.sql, reuse.slots, reuse.analysis, user_id, deadline, shared, entities, emit, reuse.params
+                    )
+                except DeadlineExceeded:
+                    return TIMEOUT_ANSWER, None
+                except Exception as e:
+                    logger.info(f"Reused SQL {reuse.entry_id} failed, evicting it: {str(e)}")
+                    await self.sql_cache.evict(reuse.entry_id)
+                    reuse = None
+
+            if reuse is None:
+                # Step 1: Question → SQL
+                await emit({"type": "stage", "stage": "sql"})
+                try:
+                    sql_query = await deadline.run(
+                        shared.run(("sql", question.strip()), lambda: self.request_to_sql(history_messages, question, user_id=user_id)),
+                        "sql", self.STAGE_SHARES["sql"]
+                    )
+                except DeadlineExceeded:
+                    return TIMEOUT_ANSWER, None
 
-            # Step 3: Get real params from qdrant (concurrent)
-            params = {}
-            if extracted_data:
-                fetched = await asyncio.gather(*(self._fetch_param(d) for d in extracted_data))
-                params = {k: v for k, v in fetched}
+                try:
+                    # Step 2: Clean SQL query (for analyses it only selects the session and drivers)
+                    analysis, sql_query = extract_analysis(sql_query)
+                    cleaned_query, extracted_data = self.query_cleaner.clean_query(sql_query)
 
-            # Step 4: Execute SQL
-            query_results = await self.db_repo.execute_query(cleaned_query, params)
-        except Exception as e:
-            logger.error(f"Error executing query for user {user_id}: {str(e)}")
-            query_results = []
+                    # Steps 3 and 4: resolve entities and execute
+                    query_results, data_handle, capped = await self._execute_sql(
+                        cleaned_query, extracted_data, analysis, user_id, deadline, shared, entities, emit
+                    )
+                    if self.sql_cache is not None and capped.rows:
+                        self.sql_cache.remember(question, cleaned_query, extracted_data, analysis)
+                except DeadlineExceeded:
+                    return TIMEOUT_ANSWER, None
+                except Exception as e:
+                    logger.error(f"Error executing query for user {user_id}: {str(e)}")
+                    query_results = []
 
         # Step 5: Interpret results
-        interpretation = self.interpret_results(user_id, question, query_results)
+        await emit({"type": "stage", "stage": "interpretation"})
+        if on_event is not None:
+            interpreting = self.interpret_results_stream(
+                history_messages, question, query_results,
+                on_token=lambda text: emit({"type": "token", "text": text}), user_id=user_id
+            )
+        else:
+            interpreting = self.interpret_results(history_messages, question, query_results, user_id=user_id)
+        try:
+            interpretation = await deadline.run(
+                interpreting, "interpretation", self.STAGE_SHARES["interpretation"]
+            )
+        except DeadlineExceeded:
+            # Partial answer: the data is there, only the write-up ran out of time
+            interpretation = f"{TIMEOUT_ANSWER}\n\nQuery results: {query_results}" if query_results else TIMEOUT_ANSWER
 
-        # Save system response
-        self.history_repo.set_next_chat_message(user_id, f"{interpretation}", type="system")
+        return interpretation, data_handle
 
-        return interpretation
+
+    async def _execute_sql(
+        self, cleaned_query: str, extracted_data: List[MatchData], analysis: Optional[str], user_id: str,
+        deadline: Deadline, shared: "SingleFlight", entities: "SingleFlight", emit: Callable[[dict], Awaitable],
+        extra_params: Optional[dict] = None,
+    ) -> Tuple[Any, Optional[str], CappedResult]:
+        """Resolves the entity slots, runs the cleaned query and, for analyses, the lap analysis.
+
+        Returns the results for the prompt, the data handle and the capped rows.
+        """
+        # Step 3: Get real params from qdrant (concurrent)
+        params = dict(extra_params or {})
+        if extracted_data:
+            await emit({"type": "stage", "stage": "params"})
+            fetched = await deadline.run(
+                asyncio.gather(*(self._fetch_param(d, entities) for d in extracted_data)),
+                "params", self.STAGE_SHARES["params"]
+            )
+            params.update({k: v for k, v in fetched})
+
+        # Step 4: Execute SQL (streamed, stops at the row/byte cap)
+        await emit({"type": "stage", "stage": "query"})
+        query_key = ("query", normalize_sql(cleaned_query), tuple(sorted(params.items())))
+        capped = await deadline.run(
+            shared.run(query_key, lambda: self.db_repo.execute_query_capped(cleaned_query, params)),
+            "query", self.STAGE_SHARES["query"]
+        )
+        if analysis is not None:
+            await emit({"type": "stage", "stage": "analysis"})
+            query_results = await deadline.run(
+                self._run_analysis(analysis, capped), "query", self.STAGE_SHARES["query"]
+            )
+            return query_results, None, capped
+
+        if capped.truncated:
+            logger.info(f"Query results truncated at {len(capped.rows)} rows for user {user_id}")
+        data_handle = None
+        if self.result_handles is not None:
+            data_handle = await self.result_handles.save(cleaned_query, params)
+        return capped.for_prompt(), data_handle, capped
+
+    async def _run_tool(
+        self, tool: QueryTool, params: dict, user_id: str, deadline: Deadline,
+        shared: "SingleFlight", entities: "SingleFlight", emit: Callable[[dict], Awaitable],
+    ) -> Tuple[Any, Optional[str]]:
+        """Resolves the tool's names through Qdrant and runs its query (results cached per tool and arguments).
+
+        Returns (None, None) when the query finds no rows.
+        """
+        lookups = [
+            MatchData(type=collection, key=arg, data=params[arg])
+            for arg, collection in tool.entities.items() if params.get(arg)
+        ]
+        if lookups:
+            await emit({"type": "stage", "stage": "params"})
+            fetched = await deadline.run(
+                asyncio.gather(*(self._fetch_param(d, entities) for d in lookups)),
+                "params", self.STAGE_SHARES["params"]
+            )
+            params = {**params, **dict(fetched)}
+
+        await emit({"type": "stage", "stage": "query"})
+        capped = await deadline.run(
+            shared.run(("tool", tool.name, tuple(sorted(params.items()))), lambda: self.query_tools.execute(self.db_repo, tool, params)),
+            "query", self.STAGE_SHARES["query"]
+        )
+        if not capped.rows:
+            return None, None
+        if capped.truncated:
+            logger.info(f"Query tool {tool.name} results truncated at {len(capped.rows)} rows for user {user_id}")
+        data_handle = None
+        if self.result_handles is not None:
+            data_handle = await self.result_handles.save(tool.sql, params)
+        return capped.for_prompt(), data_handle
+
+    async def _run_analysis(self, analysis: str, selection) -> Any:
+        """Runs a lap analysis for the session (and drivers) selected by the query."""
+        columns = [c.lower() for c in selection.columns]
+        if not selection.rows or "session_id" not in columns:
+            return []
+        session_col = columns.index("session_id")
+        driver_col = columns.index("driver_number") if "driver_number" in columns else None
+        session_id = selection.rows[0][session_col]
+        drivers = sorted({
+            row[driver_col] for row in selection.rows
+            if row[session_col] == session_id and row[driver_col] is not None
+        }) if driver_col is not None else None
+        result = await self.lap_analytics.run(analysis, session_id, drivers=drivers)
+        return json.dumps(result, separators=(",", ":"))
+
+
+class SingleFlight:
+    """Runs each keyed coroutine once; concurrent and later callers with the same key share its result.
+
+    The shared call is only cancelled when every caller waiting on it was
+    cancelled, so one caller hitting its deadline does not fail the others.
+    A call that fails is forgotten once it finishes: only the callers already
+    waiting on it see the error, later ones run it again.
+
+    With `ttl` a result is reused for that many seconds after the call
+    started, and with `max_entries` only the most recently used finished
+    calls are kept.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None, clock=time.monotonic):
+        self.calls = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+
+    def _forget_failed(self, key, call):
+        task = call[0]
+        if (task.cancelled() or task.exception() is not None) and self.calls.get(key) is call:
+            del self.calls[key]
+
+    def _expired(self, call) -> bool:
+        return self.ttl is not None and call[0].done() and self.clock() - call[2] >= self.ttl
+
+    def _evict(self):
+        if self.max_entries is None or len(self.calls) <= self.max_entries:
+            return
+        finished = [key for key, call in self.calls.items() if call[0].done()]
+        for key in finished[:len(self.calls) - self.max_entries]:
+            del self.calls[key]
+
+    async def run(self, key, factory):
+        call = self.calls.get(key)
+        if call is not None and self._expired(call):
+            del self.calls[key]
+            call = None
+        if call is None:
+            call = self.calls[key] = [asyncio.ensure_future(factory()), 0, self.clock()]
+            call[0].add_done_callback(lambda _task, key=key, call=call: self._forget_failed(key, call))
+            self._evict()
+        else:
+            self.calls.move_to_end(key)
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                task.cancel()
+                if self.calls.get(key) is call:
+                    del self.calls[key]
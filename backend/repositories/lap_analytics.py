@@ -0,0 +1,436 @@
+import asyncio
+import time
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+
+from models.deps import get_read_db
+from models.models import Driver, Lap, SessionDriver, Stint
+
+# Typical lap time gained per lap as the car burns fuel (s/lap)
+FUEL_EFFECT_PER_LAP = 0.035
+# Laps slower than this factor of the driver's median (SC, VSC, traffic) are not representative
+SLOW_LAP_FACTOR = 1.07
+
+
+@dataclass
+class SessionLaps:
+    """Every lap of one session in flat, contiguous arrays.
+
+    Laps are sorted by driver and lap number; the laps of driver `i` are
+    `offsets[i]:offsets[i + 1]`. Per stint values are indexed by `stint`.
+    """
+    session_id: int
+    drivers: np.ndarray         # driver_number per driver index
+    names: List[str]            # name_acronym per driver index
+    driver: np.ndarray          # driver index per lap
+    lap: np.ndarray             # lap number
+    time: np.ndarray            # lap duration in seconds, NaN when unknown
+    pit_out: np.ndarray         # out lap (first lap after a stop)
+    in_lap: np.ndarray          # last lap before a stop
+    stint: np.ndarray           # stint index per lap
+    tyre_age: np.ndarray        # laps on the current set of tyres
+    offsets: np.ndarray
+    stint_driver: np.ndarray    # driver index per stint
+    stint_number: np.ndarray
+    stint_compound: List[Optional[str]]
+
+    @property
+    def total_laps(self) -> int:
+        return int(self.lap.max()) if len(self.lap) else 0
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.driver, self.lap, self.time, self.pit_out, self.in_lap, self.stint, self.tyre_age)
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def from_rows(cls, session_id: int, rows: Sequence[tuple]) -> "SessionLaps":
+        """rows: (driver_number, name_acronym, stint_number, compound, tyre_age_at_start, lap_number,
+        lap_duration, is_pit_out_lap), ordered by driver_number and lap_number."""
+        if not rows:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls(session_id, empty, [], empty, empty, np.zeros(0), np.zeros(0, bool), np.zeros(0, bool),
+                       empty, empty, np.zeros(1, dtype=np.int64), empty, empty, [])
+
+        numbers, acronyms, stint_numbers, compounds, age_at_start, laps, times, pit_out = zip(*rows)
+        numbers = np.array(numbers, dtype=np.int32)
+        drivers, first, driver = np.unique(numbers, return_index=True, return_inverse=True)
+        offsets = np.append(first, len(numbers)).astype(np.int64)
+
+        stint_key = driver.astype(np.int64) * 1000 + np.array([s or 0 for s in stint_numbers], dtype=np.int64)
+        stint_keys, stint_first, stint = np.unique(stint_key, return_index=True, return_inverse=True)
+        stint_driver = (stint_keys // 1000).astype(np.int32)
+
+        lap = np.array(laps, dtype=np.int32)
+        first_lap = np.full(len(stint_keys), np.iinfo(np.int32).max, dtype=np.int32)
+        last_lap = np.zeros(len(stint_keys), dtype=np.int32)
+        np.minimum.at(first_lap, stint, lap)
+        np.maximum.at(last_lap, stint, lap)
+        start_age = np.array([a or 0 for a in age_at_start], dtype=np.int32)
+        tyre_age = start_age + lap - first_lap[stint]
+
+        # In lap: last lap of a stint that is followed by another stint of the same driver
+        last_stint = np.zeros(len(drivers), dtype=np.int64)
+        np.maximum.at(last_stint, stint_driver, np.arange(len(stint_keys)))
+        has_next = np.arange(len(stint_keys)) < last_stint[stint_driver]
+        in_lap = (lap == last_lap[stint]) & has_next[stint]
+
+        return cls(
+            session_id=session_id,
+            drivers=drivers,
+            names=[acronyms[i] for i in first],
+            driver=driver.astype(np.int32),
+            lap=lap,
+            time=np.array([np.nan if t is None else t for t in times], dtype=np.float64),
+            pit_out=np.array([bool(p) for p in pit_out]),
+            in_lap=in_lap,
+            stint=stint.astype(np.int32),
+            tyre_age=tyre_age,
+            offsets=offsets,
+            stint_driver=stint_driver,
+            stint_number=(stint_keys % 1000).astype(np.int32),
+            stint_compound=[compounds[i] for i in stint_first],
+        )
+
+
+def _group_mean(values: np.ndarray, groups: np.ndarray, n: int):
+    counts = np.bincount(groups, minlength=n)
+    sums = np.bincount(groups, weights=values, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts, counts
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, n: int) -> np.ndarray:
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=n)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = np.full(n, np.nan)
+    has = counts > 0
+    low, high = starts + (counts - 1) // 2, starts + counts // 2
+    medians[has] = (sorted_values[low[has]] + sorted_values[high[has]]) / 2
+    return medians
+
+
+def _group_slope(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n: int, min_points: int = 3) -> np.ndarray:
+    """Least squares slope of y over x within each group (NaN with fewer than min_points)."""
+    mean_x, counts = _group_mean(x, groups, n)
+    mean_y, _ = _group_mean(y, groups, n)
+    dx = x - mean_x[groups]
+    sxy = np.bincount(groups, weights=dx * (y - mean_y[groups]), minlength=n)
+    sxx = np.bincount(groups, weights=dx * dx, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = sxy / sxx
+    slope[(counts < min_points) | (sxx == 0)] = np.nan
+    return slope
+
+
+def _num(value, digits: int = 3):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def clean_laps(laps: SessionLaps, slow_factor: float = SLOW_LAP_FACTOR) -> np.ndarray:
+    """Mask of representative laps: timed, not lap 1, not in/out laps, not far off the driver's median."""
+    mask = np.isfinite(laps.time) & (laps.lap > 1) & ~laps.pit_out & ~laps.in_lap
+    medians = _group_median(laps.time[mask], laps.driver[mask], len(laps.drivers))
+    return mask & (laps.time <= slow_factor * medians[laps.driver])
+
+
+def _selected(laps: SessionLaps, drivers: Optional[Sequence[int]]) -> np.ndarray:
+    if not drivers:
+        return np.ones(len(laps.drivers), dtype=bool)
+    return np.isin(laps.drivers, np.array(drivers, dtype=np.int32))
+
+
+def pace(laps: SessionLaps, drivers: Optional[Sequence[int]] = None) -> List[dict]:
+    """Median, mean and best representative lap per driver and the gap to the quickest median."""
+    n = len(laps.drivers)
+    mask = clean_laps(laps)
+    groups, times = laps.driver[mask], laps.time[mask]
+    medians = _group_median(times, groups, n)
+    means, counts = _group_mean(times, groups, n)
+    best = np.full(n, np.inf)
+    np.minimum.at(best, groups, times)
+    delta = medians - np.nanmin(medians) if np.isfinite(medians).any() else medians
+
+    order = np.argsort(np.where(np.isfinite(medians), medians, np.inf), kind="stable")
+    keep = _selected(laps, drivers)
+    return [
+        {
+            "driver_number": int(laps.drivers[i]), "driver": laps.names[i], "laps": int(counts[i]),
+            "median_lap": _num(medians[i]), "mean_lap": _num(means[i]),
+            "best_lap": _num(best[i]) if np.isfinite(best[i]) else None, "delta_to_fastest": _num(delta[i]),
+        }
+        for i in order if keep[i] and counts[i]
+    ]
+
+
+def degradation(
+    laps: SessionLaps, drivers: Optional[Sequence[int]] = None, fuel_effect: float = FUEL_EFFECT_PER_LAP
+) -> List[dict]:
+    """Per stint lap time loss per lap of tyre age, with and without the fuel burn correction.
+
+    Lighter cars are faster every lap, which hides tyre wear: the corrected time
+    adds `fuel_effect` seconds back for each lap already run.
+    """
+    n = len(laps.stint_number)
+    mask = clean_laps(laps)
+    groups = laps.stint[mask]
+    age = laps.tyre_age[mask].astype(np.float64)
+    times = laps.time[mask]
+    corrected = times + fuel_effect * (laps.lap[mask] - 1)
+    slope = _group_slope(age, corrected, groups, n)
+    raw_slope = _group_slope(age, times, groups, n)
+    means, counts = _group_mean(times, groups, n)
+
+    keep = _selected(laps, drivers)
+    return [
+        {
+            "driver_number": int(laps.drivers[laps.stint_driver[s]]), "driver": laps.names[laps.stint_driver[s]],
+            "stint": int(laps.stint_number[s]), "compound": laps.stint_compound[s], "laps": int(counts[s]),
+            "mean_lap": _num(means[s]), "degradation_per_lap": _num(slope[s], 4),
+            "raw_slope_per_lap": _num(raw_slope[s], 4),
+        }
+        for s in range(n) if keep[laps.stint_driver[s]] and counts[s]
+    ]
+
+
+def consistency(laps: SessionLaps, drivers: Optional[Sequence[int]] = None) -> List[dict]:
+    """Spread of representative laps per driver: standard deviation, coefficient of variation
+    and share of laps within 0.5% of the driver's median."""
+    n = len(laps.drivers)
+    mask = clean_laps(laps)
+    groups, times = laps.driver[mask], laps.time[mask]
+    means, counts = _group_mean(times, groups, n)
+    variance, _ = _group_mean((times - means[groups]) ** 2, groups, n)
+    std = np.sqrt(variance)
+    medians = _group_median(times, groups, n)
+    close, _ = _group_mean((np.abs(times - medians[groups]) <= 0.005 * medians[groups]).astype(np.float64), groups, n)
+
+    order = np.argsort(np.where(np.isfinite(std), std, np.inf), kind="stable")
+    keep = _selected(laps, drivers)
+    return [
+        {
+            "driver_number": int(laps.drivers[i]), "driver": laps.names[i], "laps": int(counts[i]),
+            "std_dev": _num(std[i]), "coefficient_of_variation_pct": _num(100 * std[i] / means[i]),
+            "within_half_percent_pct": _num(100 * close[i], 1),
+        }
+        for i in order if keep[i] and counts[i] > 1
+    ]
+
+
+def _race_matrices(laps: SessionLaps):
+    """(present, cumulative time) as drivers × laps matrices; untimed laps take the field median."""
+    shape = (len(laps.drivers), laps.total_laps)
+    present = np.zeros(shape, dtype=bool)
+    present[laps.driver, laps.lap - 1] = True
+    times = np.full(shape, np.nan)
+    times[laps.driver, laps.lap - 1] = laps.time
+    with warnings.catch_warnings():
+        # Laps nobody has a time for (often lap 1) have an all NaN column
+        warnings.simplefilter("ignore", RuntimeWarning)
+        field = np.nanmedian(times, axis=0) if shape[0] else np.zeros(shape[1])
+    times = np.where(present & np.isnan(times), np.nan_to_num(field)[None, :], times)
+    cumulative = np.where(present, np.nancumsum(np.where(present, times, 0.0), axis=1), np.nan)
+    return present, cumulative
+
+
+def gaps(laps: SessionLaps, drivers: Optional[Sequence[int]] = None, points: int = 15) -> List[dict]:
+    """Gap to the leader and to the car ahead, at the flag and at about `points` laps through the race."""
+    if not len(laps.lap):
+        return []
+    _, cumulative = _race_matrices(laps)
+    leader = np.fmin.reduce(cumulative, axis=0)
+    to_leader = cumulative - leader[None, :]
+    order = np.argsort(np.where(np.isnan(cumulative), np.inf, cumulative), axis=0, kind="stable")
+    ahead_time = np.full_like(cumulative, np.nan)
+    ranked = np.take_along_axis(cumulative, order, axis=0)
+    ahead_sorted = np.vstack([np.full((1, cumulative.shape[1]), np.nan), ranked[:-1]])
+    np.put_along_axis(ahead_time, order, ahead_sorted, axis=0)
+    interval = cumulative - ahead_time
+
+    step = max(1, laps.total_laps // points)
+    sampled = np.arange(step - 1, laps.total_laps, step)
+    keep = _selected(laps, drivers)
+    result = []
+    for i in np.flatnonzero(keep):
+        completed = np.flatnonzero(~np.isnan(cumulative[i]))
+        if not len(completed):
+            continue
+        last = completed[-1]
+        result.append({
+            "driver_number": int(laps.drivers[i]), "driver": laps.names[i], "laps": int(last + 1),
+            "gap_to_leader": _num(to_leader[i, last]), "interval": _num(interval[i, last]),
+            "gap_by_lap": {int(l + 1): _num(to_leader[i, l]) for l in sampled if l <= last},
+        })
+    return sorted(result, key=lambda r: (-r["laps"], r["gap_to_leader"] if r["gap_to_leader"] is not None else np.inf))
+
+
+def undercut_windows(
+    laps: SessionLaps, drivers: Optional[Sequence[int]] = None, fuel_effect: float = FUEL_EFFECT_PER_LAP,
+    limit: int = 40,
+) -> List[dict]:
+    """Laps where a driver was closer to the car ahead than the time fresh tyres would recover.
+
+    The gain of pitting at a lap is estimated as the stint's degradation per lap
+    times the current tyre age; the window is open while the interval is below it.
+    """
+    if not len(laps.lap):
+        return []
+    slope = np.array([s["degradation_per_lap"] or 0.0 for s in _stint_slopes(laps, fuel_effect)])
+    present, cumulative = _race_matrices(laps)
+    shape = cumulative.shape
+    gain = np.full(shape, np.nan)
+    gain[laps.driver, laps.lap - 1] = np.clip(slope[laps.stint], 0, None) * laps.tyre_age
+    stint_at = np.full(shape, -1, dtype=np.int64)
+    stint_at[laps.driver, laps.lap - 1] = laps.stint
+
+    order = np.argsort(np.where(np.isnan(cumulative), np.inf, cumulative), axis=0, kind="stable")
+    ranked = np.take_along_axis(cumulative, order, axis=0)
+    ahead_idx = np.full(shape, -1, dtype=np.int64)
+    ahead_time = np.full(shape, np.nan)
+    np.put_along_axis(ahead_idx, order, np.vstack([np.full((1, shape[1]), -1), order[:-1]]), axis=0)
+    np.put_along_axis(ahead_time, order, np.vstack([np.full((1, shape[1]), np.nan), ranked[:-1]]), axis=0)
+    interval = cumulative - ahead_time
+
+    with np.errstate(invalid="ignore"):
+        open_ = present & (interval > 0) & (interval < gain) & _selected(laps, drivers)[:, None]
+    # Pitted on the next lap: the stint changes
+    pitted = np.zeros(shape, dtype=bool)
+    pitted[:, :-1] = (stint_at[:, 1:] >= 0) & (stint_at[:, 1:] != stint_at[:, :-1])
+
+    rows, cols = np.nonzero(open_)
+    margin = gain[rows, cols] - interval[rows, cols]
+    best = np.argsort(-margin, kind="stable")[:limit]
+    return [
+        {
+            "lap": int(cols[k] + 1), "driver_number": int(laps.drivers[rows[k]]), "driver": laps.names[rows[k]],
+            "car_ahead": laps.names[ahead_idx[rows[k], cols[k]]], "interval": _num(interval[rows[k], cols[k]]),
+            "estimated_gain": _num(gain[rows[k], cols[k]]), "pitted_next_lap": bool(pitted[rows[k], cols[k]]),
+        }
+        for k in sorted(best, key=lambda k: (cols[k], rows[k]))
+    ]
+
+
+def _stint_slopes(laps: SessionLaps, fuel_effect: float) -> List[dict]:
+    # degradation() skips empty stints; keep one entry per stint index here
+    by_stint = {(d["driver_number"], d["stint"]): d for d in degradation(laps, fuel_effect=fuel_effect)}
+    return [
+        by_stint.get((int(laps.drivers[laps.stint_driver[s]]), int(laps.stint_number[s])), {"degradation_per_lap": None})
+        for s in range(len(laps.stint_number))
+    ]
+
+
+ANALYSES = {
+    "pace": pace,
+    "degradation": degradation,
+    "consistency": consistency,
+    "gaps": gaps,
+    "undercut": undercut_windows,
+}
+
+
+async def load_session_laps(session_id: int) -> SessionLaps:
+    stmt = (
+        select(
+            Driver.driver_number, Driver.name_acronym, Stint.stint_number, Stint.compound, Stint.tyre_age_at_start,
+            Lap.lap_number, Lap.lap_duration, Lap.is_pit_out_lap,
+        )
+        .select_from(Lap)
+        .join(Stint, Lap.stint_id == Stint.id)
+        .join(SessionDriver, Stint.session_driver_id == SessionDriver.id)
+        .join(Driver, SessionDriver.driver_id == Driver.id)
+        .where(SessionDriver.session_id == session_id, Driver.driver_number.is_not(None))
+        .order_by(Driver.driver_number, Lap.lap_number)
+    )
+    async with get_read_db() as session:
+        rows = (await session.execute(stmt)).all()
+    return SessionLaps.from_rows(session_id, rows)
+
+
+class LapAnalytics:
+    """Runs the lap analyses on per session arrays, keeping the last `max_sessions` sessions loaded.
+
+    Concurrent requests for a session that is not loaded yet share one query.
+    With a `data_version` source (the latest import run, see repositories/stats.py)
+    the loaded sessions are dropped when an import changes it: the importers
+    recreate the tables, so session ids are reused for different data.
+    """
+
+    def __init__(
+        self, max_sessions: int = 32, loader: Callable[[int], Awaitable[SessionLaps]] = load_session_laps,
+        data_version: Optional[Callable[[], Awaitable[int]]] = None, version_ttl: float = 5.0,
+    ):
+        self.max_sessions = max_sessions
+        self.loader = loader
+        self.data_version = data_version
+        self.version_ttl = version_ttl
+        self.sessions = OrderedDict()
+        self._loading = {}
+        self._version = None
+        self._version_checked = 0.0
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def version(self) -> Optional[int]:
+        if self.data_version is None:
+            return None
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_ttl:
+            version = await self.data_version()
+            if version != self._version:
+                self.sessions.clear()
+            self._version, self._version_checked = version, now
+        return self._version
+
+    async def session(self, session_id: int) -> SessionLaps:
+        version = await self.version()
+        laps = self.sessions.get(session_id)
+        if laps is not None:
+            self.sessions.move_to_end(session_id)
+            self.stats["hits"] += 1
+            return laps
+
+        key = (version, session_id)
+        task = self._loading.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = self._loading[key] = asyncio.ensure_future(self.loader(session_id))
+            task.add_done_callback(lambda t: self._loaded(key, t))
+        # Shielded: a caller running out of time does not abort the load for the others
+        return await asyncio.shield(task)
+
+    def _loaded(self, key: tuple, task: asyncio.Future):
+        self._loading.pop(key, None)
+        version, session_id = key
+        # A load started before an import must not repopulate the cleared cache
+        if task.cancelled() or task.exception() is not None or version != self._version:
+            return
+        self.sessions[session_id] = task.result()
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    async def run(self, analysis: str, session_id: int, drivers: Optional[Sequence[int]] = None) -> dict:
+        if analysis not in ANALYSES:
+            raise ValueError(f"Unknown analysis '{analysis}', expected one of {', '.join(ANALYSES)}")
+        laps = await self.session(session_id)
+        return {
+            "analysis": analysis,
+            "session_id": session_id,
+            "total_laps": laps.total_laps,
+            "results": ANALYSES[analysis](laps, drivers=drivers),
+        }
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "version": self._version,
+            "bytes": sum(laps.nbytes for laps in self.sessions.values()),
+        }
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Callable, Dict, Optional
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from utils.logger import logger
+
+# Lower value = served first under pressure
+PRIORITY_SQL = 0
+PRIORITY_INTERPRETATION = 1
+PRIORITY_NAMES = {PRIORITY_SQL: "sql", PRIORITY_INTERPRETATION: "interpretation"}
+
+
+def default_llm_factory(model_name: str):
+    return ChatGoogleGenerativeAI(model=model_name, temperature=0)
+
+
+class _Waiter:
+    __slots__ = ("user_id", "model", "priority", "enqueued", "future")
+
+    def __init__(self, user_id: str, model: str, priority: int):
+        self.user_id = user_id
+        self.model = model
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class LLMGateway:
+    """Single entry point for every LLM call in the process.
+
+    - At most `max_concurrency` calls in flight, and `model_limits[model]` per model.
+    - Waiting calls are queued per priority and, inside a priority, per user;
+      users are served round-robin so one busy session cannot take every slot.
+    - SQL generation (short prompts) goes before interpretation. A call that has
+      waited `aging_seconds` is served first regardless, so nothing starves.
+    - Queue wait per call is recorded per priority (see `stats()`).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        model_limits: Optional[Dict[str, int]] = None,
+        aging_seconds: float = 5.0,
+        llm_factory: Callable[[str], Any] = default_llm_factory,
+    ):
+        self.max_concurrency = max_concurrency
+        self.model_limits = model_limits or {}
+        self.aging_seconds = aging_seconds
+        self.llm_factory = llm_factory
+        self._llms = {}
+        self.in_flight = 0
+        self.model_in_flight = defaultdict(int)
+        self.queues = {priority: OrderedDict() for priority in sorted(PRIORITY_NAMES)}
+        self.wait_stats = {
+            name: {"calls": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0} for name in PRIORITY_NAMES.values()
+        }
+
+    def llm(self, model_name: str):
+        """Shared chat model instance for `model_name`."""
+        if model_name not in self._llms:
+            self._llms[model_name] = self.llm_factory(model_name)
+        return self._llms[model_name]
+
+    async def ainvoke(self, runnable, inputs: dict, user_id: str, model: str, priority: int = PRIORITY_SQL):
+        """Runs `runnable.ainvoke(inputs)` once a slot for `model` is granted to this call."""
+        started = time.monotonic()
+        await self._acquire(user_id, model, priority)
+        self._record_wait(priority, (time.monotonic() - started) * 1000)
+        try:
+            return await runnable.ainvoke(inputs)
+        finally:
+            self._release(model)
+
+    async def astream(self, runnable, inputs: dict, user_id: str, model: str, priority: int = PRIORITY_SQL):
+        """Like ainvoke, but yields the chunks of `runnable.astream(inputs)`; the slot is held until the stream ends."""
+        started = time.monotonic()
+        await self._acquire(user_id, model, priority)
+        self._record_wait(priority, (time.monotonic() - started) * 1000)
+        try:
+            async for chunk in runnable.astream(inputs):
+                yield chunk
+        finally:
+            self._release(model)
+
+    def queued(self) -> int:
+        return sum(len(waiters) for queue in self.queues.values() for waiters in queue.values())
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": {PRIORITY_NAMES[p]: sum(len(w) for w in q.values()) for p, q in self.queues.items()},
+            "models": {
+                model: {"in_flight": count, "limit": self.model_limits.get(model, self.max_concurrency)}
+                for model, count in self.model_in_flight.items()
+            },
+            "queue_wait": {
+                name: {
+                    "calls": s["calls"],
+                    "avg_wait_ms": round(s["total_wait_ms"] / s["calls"], 3) if s["calls"] else 0.0,
+                    "max_wait_ms": round(s["max_wait_ms"], 3),
+                }
+                for name, s in self.wait_stats.items()
+            },
+        }
+
+    def _model_free(self, model: str) -> bool:
+        return self.model_in_flight[model] < self.model_limits.get(model, self.max_concurrency)
+
+    def _take_slot(self, model: str):
+        self.in_flight += 1
+        self.model_in_flight[model] += 1
+
+    async def _acquire(self, user_id: str, model: str, priority: int):
+        # Fast path only when nobody is waiting, so queued calls keep their turn
+        if self.in_flight < self.max_concurrency and self._model_free(model) and not self.queued():
+            self._take_slot(model)
+            return
+
+        waiter = _Waiter(user_id, model, priority)
+        self.queues[priority].setdefault(user_id, deque()).append(waiter)
+        # Slots may be free for this model while other queued calls wait on theirs
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot granted just as the caller was cancelled: hand it back
+                self._release(model)
+            else:
+                self._remove(waiter)
+            raise
+
+    def _remove(self, waiter: _Waiter):
+        queue = self.queues[waiter.priority]
+        waiters = queue.get(waiter.user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del queue[waiter.user_id]
+
+    def _release(self, model: str):
+        self.in_flight -= 1
+        self.model_in_flight[model] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._take_slot(waiter.model)
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Head of the queue of the next user: aged calls first, then by priority and round-robin order."""
+        now = time.monotonic()
+        best, best_key = None, None
+        for priority, queue in self.queues.items():
+            for position, waiters in enumerate(queue.values()):
+                waiter = waiters[0]
+                if not self._model_free(waiter.model):
+                    continue
+                if now - waiter.enqueued >= self.aging_seconds:
+                    key = (0, waiter.enqueued)
+                else:
+                    key = (1 + priority, position)
+                if best_key is None or key < best_key:
+                    best, best_key = waiter, key
+
+        if best is not None:
+            queue = self.queues[best.priority]
+            waiters = queue[best.user_id]
+            waiters.popleft()
+            if waiters:
+                # Served users go to the back of the round-robin order
+                queue.move_to_end(best.user_id)
+            else:
+                del queue[best.user_id]
+        return best
+
+    def _record_wait(self, priority: int, wait_ms: float):
+        stats = self.wait_stats[PRIORITY_NAMES[priority]]
+        stats["calls"] += 1
+        stats["total_wait_ms"] += wait_ms
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_ms)
+        if wait_ms > 1000:
+            logger.info(f"LLM call ({PRIORITY_NAMES[priority]}) waited {wait_ms:.0f}ms for a slot")
+
+
+def parse_model_limits(value: str) -> Dict[str, int]:
+    """Parses LLM_MODEL_CONCURRENCY, e.g. "model-a=8,model-b=4"."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        model, _, limit = item.partition("=")
+        limits[model.strip()] = int(limit)
+    return limits
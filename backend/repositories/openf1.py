@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from random import uniform
+from typing import Any, AsyncIterator, Optional
+
+import ijson
+from httpx import AsyncClient, HTTPError, Limits, Timeout
+
+from utils.logger import logger
+
+DEFAULT_API_URL = "https://api.openf1.org/v1"
+
+
+class AdaptiveRateLimiter:
+    """Spaces requests at `rate` per second; halves the rate on 429 and recovers slowly on success.
+
+    Only the request itself takes a slot: callers sleep for retries and backoff
+    without holding the limiter, so a failing URL never blocks the others.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float = 0.25, recovery: float = 0.05):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.rate = max_rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits for the next free request slot."""
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def on_success(self):
+        """Additive increase back towards max_rate."""
+        self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease, and no new slots until Retry-After has passed."""
+        self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            self._next_slot = max(self._next_slot, time.monotonic() + retry_after)
+
+
+class DiskResponseCache:
+    """JSON response bodies on disk keyed by URL, with the validators needed to revalidate them."""
+
+    def __init__(self, directory: str, max_age: float):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return f"{base}.json", f"{base}.meta.json"
+
+    def load(self, url: str):
+        """Returns (body_path, meta) or (None, None) when the URL was never cached."""
+        body_path, meta_path = self._paths(url)
+        if not (os.path.exists(body_path) and os.path.exists(meta_path)):
+            return None, None
+        with open(meta_path, "r") as f:
+            return body_path, json.load(f)
+
+    def is_fresh(self, meta: dict) -> bool:
+        return time.time() - meta.get("fetched_at", 0) < self.max_age
+
+    def read(self, body_path: str) -> Any:
+        with open(body_path, "rb") as f:
+            return json.load(f)
+
+    def store(self, url: str, content: bytes, headers) -> str:
+        """Writes the body and its validators atomically and returns the body path."""
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        self._write(body_path, content)
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        return body_path
+
+    @contextmanager
+    def writer(self, url: str, headers):
+        """File object for a body that is written while it streams; kept only if the stream completes."""
+        body_path, meta_path = self._paths(url)
+        tmp_path = f"{body_path}.tmp"
+        f = open(tmp_path, "wb")
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+        f.close()
+        os.replace(tmp_path, body_path)
+        meta = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def touch(self, url: str, meta: dict):
+        """Marks a revalidated (304) entry as fresh again."""
+        _body_path, meta_path = self._paths(url)
+        meta["fetched_at"] = time.time()
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    @staticmethod
+    def _write(path: str, content: bytes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class OpenF1Client:
+    """Fetch layer for the OpenF1 API: pooled client, on-disk cache and adaptive rate control."""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_API_URL,
+        cache_dir: str = "openf1_cache",
+        max_rate: float = 2,
+        max_retries: int = 20,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        cache_max_age: float = 24 * 3600,
+        max_connections: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = AdaptiveRateLimiter(max_rate)
+        self.cache = DiskResponseCache(cache_dir, cache_max_age)
+        self.client = AsyncClient(
+            limits=Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=Timeout(30.0, connect=10.0),
+        )
+        self.stats = {"cache_hits": 0, "revalidated": 0, "fetched": 0, "throttled": 0, "retries": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    async def get_json(self, path: str) -> Any:
+        """Returns the decoded JSON body of `path`, from disk when it is still fresh."""
+        url = self.url(path)
+        body_path, meta = self.cache.load(url)
+        if meta and self.cache.is_fresh(meta):
+            self.stats["cache_hits"] += 1
+            return self.cache.read(body_path)
+
+        response = await self._request(url, meta)
+        if response.status_code == 304:
+            self.stats["revalidated"] += 1
+            self.cache.touch(url, meta)
+            return self.cache.read(body_path)
+
+        self.stats["fetched"] += 1
+        self.cache.store(url, response.content, response.headers)
+        return response.json()
+
+    async def iter_json_items(self, path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[Any]:
+        """Yields the elements of a top level JSON array as the body streams in.
+
+        The body is teed to the disk cache while it is parsed, so memory stays
+        bounded by the chunk size instead of the response size.
+        """
+        url = self.url(path)
+        body_path, meta = self.cache.load(url)
+        if meta and self.cache.is_fresh(meta):
+            self.stats["cache_hits"] += 1
+            async for item in _iter_file_items(body_path, chunk_size):
+                yield item
+            return
+
+        response = await self._request(url, meta, stream=True)
+        try:
+            if response.status_code == 304:
+                self.stats["revalidated"] += 1
+                self.cache.touch(url, meta)
+                async for item in _iter_file_items(body_path, chunk_size):
+                    yield item
+                return
+
+            self.stats["fetched"] += 1
+            events = ijson.sendable_list()
+            parser = ijson.items_coro(events, "item", use_float=True)
+            with self.cache.writer(url, response.headers) as out:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    out.write(chunk)
+                    parser.send(chunk)
+                    for item in events:
+                        yield item
+                    del events[:]
+                parser.close()
+                for item in events:
+                    yield item
+        finally:
+            await response.aclose()
+
+    async def _request(self, url: str, meta: Optional[dict], stream: bool = False):
+        """GET with conditional headers; retries and backoff happen outside the limiter."""
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire()
+            retry_after = None
+            try:
+                logger.info(f"GET {url} (attempt {attempt + 1})")
+                request = self.client.build_request("GET", url, headers=headers)
+                response = await self.client.send(request, stream=stream)
+                if response.status_code >= 400:
+                    await response.aclose()
+                if response.status_code == 429:
+                    self.stats["throttled"] += 1
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    self.limiter.on_throttled(retry_after)
+                elif response.status_code >= 500:
+                    logger.warning(f"Server error {response.status_code} on {url}")
+                else:
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    self.limiter.on_success()
+                    return response
+            except HTTPError as e:
+                if getattr(e, "response", None) is not None and e.response.status_code < 500:
+                    raise
+                logger.warning(f"Error on {url}: {e}")
+
+            if attempt == self.max_retries - 1:
+                break
+            self.stats["retries"] += 1
+            await asyncio.sleep(retry_after or self._backoff(attempt))
+
+        raise RuntimeError(f"Giving up on {url} after {self.max_retries} attempts")
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+async def _iter_file_items(body_path: str, chunk_size: int) -> AsyncIterator[Any]:
+    """Incrementally parses a cached JSON array from disk."""
+    events = ijson.sendable_list()
+    parser = ijson.items_coro(events, "item", use_float=True)
+    with open(body_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            parser.send(chunk)
+            for item in events:
+                yield item
+            del events[:]
+    parser.close()
+    for item in events:
+        yield item
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
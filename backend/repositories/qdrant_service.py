@@ -11,7 +11,11 @@ class QdrantRepository:
         self.model = SentenceTransformer(model_name)
 
     def similarity_search(self, collection_name: str, search_query: str, limit: int = 10):
-        """Realiza una búsqueda de similitud en Qdrant."""
+        """Realiza una búsqueda de similitud en Qdrant.
+
+        collection_name es el alias que mantiene upload_to_qdrant.py, que apunta
+        siempre a una colección versionada completa.
+        """
         query_vector = self._encode_query(search_query)
         results = self.qdrant_client.search(
             collection_name=collection_name,
@@ -0,0 +1,210 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, ValidationError
+
+from repositories.db import CappedResult, DBBaseRepository
+
+# FastF1 session codes, as both importers store them in session.session_type
+SessionType = Literal["R", "Q", "S", "SQ", "FP1", "FP2", "FP3"]
+
+# Joins from a session row to its season, shared by the session scoped tools
+SESSION_SCOPE = """
+    FROM session s
+    JOIN meeting m ON s.meeting_id = m.id
+    JOIN season se ON m.seasson_id = se.id
+    JOIN session_driver sd ON sd.session_id = s.id
+    JOIN driver d ON sd.driver_id = d.id
+"""
+SESSION_FILTER = """
+    se.year = :year AND m.meeting_standard_name = :grand_prix AND s.session_type = :session_type
+    AND (CAST(:driver AS TEXT) IS NULL OR d.full_name = CAST(:driver AS TEXT))
+"""
+
+
+class SessionArgs(BaseModel):
+    year: int = Field(description="Season year, e.g. 2024")
+    grand_prix: str = Field(description="Grand prix name in English, e.g. 'Monaco Grand Prix'")
+    session_type: SessionType = Field("R", description="R race, Q qualifying, S sprint, SQ sprint qualifying, FP1-FP3 practice")
+    driver: Optional[str] = Field(None, description="Driver full name, only when the question is about one driver")
+
+
+class DriverSessionArgs(SessionArgs):
+    driver: str = Field(description="Driver full name, e.g. 'Charles Leclerc'")
+
+
+class SeasonArgs(BaseModel):
+    year: int = Field(description="Season year, e.g. 2024")
+    driver: Optional[str] = Field(None, description="Driver full name, only when the question is about one driver")
+
+
+@dataclass
+class QueryTool:
+    """A pre-written query the LLM can call by name with typed arguments."""
+    name: str
+    description: str
+    args_model: Type[BaseModel]
+    sql: str
+    # Arguments resolved through the Qdrant vocabulary before running: arg -> collection
+    entities: Dict[str, str] = field(default_factory=dict)
+
+    def spec(self) -> dict:
+        """Function declaration passed to the model (OpenAI tool format)."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.args_model.model_json_schema(),
+            },
+        }
+
+    def params(self, args: dict) -> dict:
+        """Validated bind parameters for the query; raises ValidationError on bad arguments."""
+        return self.args_model(**args).model_dump()
+
+
+QUERY_TOOLS = [
+    QueryTool(
+        name="session_results",
+        description="Final classification of a session: positions, grid, laps, status, race time, gap and points.",
+        args_model=SessionArgs,
+        entities={"grand_prix": "meeting_standard_name", "driver": "driver_full_name"},
+        sql=f"""
+SELECT sr.final_position AS position, d.full_name, d.name_acronym, sg.grid_position,
+       sr.number_of_laps_completed AS laps, sr.status, sr.total_race_time, sr.gap_to_leader,
+       sr.fastest_lap_time, COALESCE(SUM(ps.points_earned), 0) AS points
+{SESSION_SCOPE}
+    JOIN session_result sr ON sr.session_driver_id = sd.id
+    LEFT JOIN start_grid sg ON sg.session_driver_id = sd.id
+    LEFT JOIN points_scored ps ON ps.session_result_id = sr.id
+WHERE {SESSION_FILTER}
+GROUP BY sr.id, d.id, sg.grid_position
+ORDER BY sr.final_position NULLS LAST, d.driver_number
+""",
+    ),
+    QueryTool(
+        name="driver_laps",
+        description="Every lap of one driver in a session: lap time, sectors, tyre compound, pit out laps and speed trap.",
+        args_model=DriverSessionArgs,
+        entities={"grand_prix": "meeting_standard_name", "driver": "driver_full_name"},
+        sql=f"""
+SELECT l.lap_number, l.lap_duration, l.duration_sector_1, l.duration_sector_2, l.duration_sector_3,
+       st.compound, st.stint_number, l.is_pit_out_lap, l.speed_trap
+{SESSION_SCOPE}
+    JOIN stint st ON st.session_driver_id = sd.id
+    JOIN lap l ON l.stint_id = st.id
+WHERE {SESSION_FILTER}
+ORDER BY l.lap_number
+""",
+    ),
+    QueryTool(
+        name="stints",
+        description="Tyre stints in a session: compound, first and last lap and tyre age at the start, per driver.",
+        args_model=SessionArgs,
+        entities={"grand_prix": "meeting_standard_name", "driver": "driver_full_name"},
+        sql=f"""
+SELECT d.full_name, d.name_acronym, st.stint_number, st.compound, st.lap_start, st.lap_end, st.tyre_age_at_start
+{SESSION_SCOPE}
+    JOIN stint st ON st.session_driver_id = sd.id
+WHERE {SESSION_FILTER}
+ORDER BY d.driver_number, st.stint_number
+""",
+    ),
+    QueryTool(
+        name="pit_stops",
+        description="Pit stops in a session: lap and stop duration, per driver.",
+        args_model=SessionArgs,
+        entities={"grand_prix": "meeting_standard_name", "driver": "driver_full_name"},
+        sql=f"""
+SELECT d.full_name, d.name_acronym, p.lap_number, p.pit_duration
+{SESSION_SCOPE}
+    JOIN pit_stop p ON p.session_driver_id = sd.id
+WHERE {SESSION_FILTER}
+ORDER BY p.lap_number, p.pit_duration
+""",
+    ),
+    QueryTool(
+        name="season_points",
+        description="Drivers' championship of a season: position, points, wins, podiums and races per driver.",
+        args_model=SeasonArgs,
+        entities={"driver": "driver_full_name"},
+        # Precomputed standings (see repositories/stats.py)
+        sql="""
+SELECT position, full_name, name_acronym, points, wins, podiums, races
+FROM driver_standings
+WHERE year = :year AND (CAST(:driver AS TEXT) IS NULL OR full_name = CAST(:driver AS TEXT))
+ORDER BY position, driver_id
+""",
+    ),
+]
+
+
+class QueryToolCatalog:
+    """Query tools by name, with the capped results of each (tool, arguments) kept for `ttl` seconds.
+
+    With a `data_version` source (the latest import run, see repositories/stats.py)
+    results are also keyed by the data version, re-read at most every
+    `version_ttl` seconds, so an import invalidates them before the ttl expires.
+    """
+
+    def __init__(
+        self, tools: List[QueryTool] = None, max_entries: int = 1024, ttl: float = 3600.0,
+        data_version: Optional[Callable[[], Awaitable[int]]] = None, version_ttl: float = 5.0,
+    ):
+        self.tools = {tool.name: tool for tool in (tools or QUERY_TOOLS)}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data_version = data_version
+        self.version_ttl = version_ttl
+        self.results = OrderedDict()
+        self._version = None
+        self._version_checked = 0.0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def specs(self) -> List[dict]:
+        return [tool.spec() for tool in self.tools.values()]
+
+    def parse(self, tool_calls: list) -> Optional[Tuple[QueryTool, dict]]:
+        """First well formed call to a known tool, as (tool, params); None if there is none."""
+        for call in tool_calls or []:
+            tool = self.tools.get(call.get("name"))
+            if tool is None:
+                continue
+            try:
+                return tool, tool.params(call.get("args") or {})
+            except ValidationError:
+                continue
+        return None
+
+    async def version(self) -> Optional[int]:
+        if self.data_version is None:
+            return None
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_ttl:
+            version = await self.data_version()
+            if version != self._version:
+                self.results.clear()
+            self._version, self._version_checked = version, now
+        return self._version
+
+    async def execute(self, db_repo: DBBaseRepository, tool: QueryTool, params: dict) -> CappedResult:
+        key = (await self.version(), tool.name, tuple(sorted(params.items())))
+        entry = self.results.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.results.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        result = await db_repo.execute_query_capped(tool.sql, params)
+        self.results[key] = (time.monotonic(), result)
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+        return result
+
+    def report(self) -> dict:
+        return {**self.stats, "entries": len(self.results), "max_entries": self.max_entries, "version": self._version, "tools": list(self.tools)}
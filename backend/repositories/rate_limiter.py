@@ -0,0 +1,184 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from redis.asyncio import Redis
+
+from repositories.redis_client import get_redis
+from utils.logger import logger
+
+
+@dataclass
+class Bucket:
+    """Token bucket: `capacity` requests at once, refilled at `per_minute` requests per minute."""
+    key: str
+    per_minute: float
+    capacity: int
+
+    @property
+    def rate_per_ms(self) -> float:
+        return self.per_minute / 60000.0
+
+
+# Takes one token from every bucket, or from none if any of them is empty.
+# KEYS: bucket hashes
+# ARGV: rate (tokens per ms) and capacity for each key, in order
+# Returns 0 when allowed, otherwise the milliseconds until a token is available.
+TAKE_TOKENS = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local capacity = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - ts) * rate)
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) / rate))
+    end
+    tokens[i] = available
+end
+if wait > 0 then return wait end
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local capacity = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+return 0
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets en Redis, compartidos por todos los workers.
+
+    Todos los buckets de una petición (usuario e IP) se comprueban y descuentan
+    en un solo script, con el reloj de Redis para que los workers no dependan
+    del suyo. Si Redis falla se deja pasar la petición.
+    """
+
+    key_prefix = "rate_limit:"
+
+    def __init__(self, redis: Redis = None):
+        self.redis = redis or get_redis()
+        self._take = self.redis.register_script(TAKE_TOKENS)
+
+    async def acquire(self, buckets: List[Bucket]) -> Tuple[bool, float]:
+        """(allowed, retry_after_seconds)"""
+        args = []
+        for bucket in buckets:
+            args.extend([bucket.rate_per_ms, bucket.capacity])
+        try:
+            wait_ms = await self._take(keys=[self.key_prefix + b.key for b in buckets], args=args)
+        except Exception as e:
+            logger.error(f"Rate limiter unavailable, allowing request: {str(e)}")
+            return True, 0.0
+        wait_ms = int(wait_ms)
+        return wait_ms == 0, wait_ms / 1000.0
+
+
+class InMemoryRateLimiter:
+    """Los mismos token buckets en memoria del proceso (HISTORY_BACKEND=memory, un solo nodo)."""
+
+    def __init__(self, max_keys: int = 100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets = {}
+
+    async def acquire(self, buckets: List[Bucket]) -> Tuple[bool, float]:
+        now = self.clock() * 1000
+        wait_ms = 0.0
+        tokens = []
+        for bucket in buckets:
+            available, ts = self.buckets.get(bucket.key, (bucket.capacity, now))
+            available = min(bucket.capacity, available + max(0.0, now - ts) * bucket.rate_per_ms)
+            if available < 1:
+                wait_ms = max(wait_ms, math.ceil((1 - available) / bucket.rate_per_ms))
+            tokens.append(available)
+        if wait_ms > 0:
+            return False, wait_ms / 1000.0
+
+        if len(self.buckets) >= self.max_keys:
+            self.buckets.clear()
+        for bucket, available in zip(buckets, tokens):
+            self.buckets[bucket.key] = (available - 1, now)
+        return True, 0.0
+
+
+class Overloaded(Exception):
+    """Raised when the pipeline is full; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Chat pipeline overloaded")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limits chat requests in flight in this worker, with a bounded wait queue.
+
+    Up to `max_in_flight` requests run at once and up to `max_queued` more wait
+    for a slot; anything beyond that is rejected straight away, so latency stays
+    bounded under overload. Retry-After is estimated from the queue depth and a
+    moving average of request durations.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, smoothing: float = 0.1):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.avg_duration = 1.0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def retry_after(self) -> float:
+        backlog = self.queued + self.in_flight
+        return max(1.0, backlog * self.avg_duration / self.max_in_flight)
+
+    def admit(self):
+        """Async context manager around one request; raises Overloaded when full."""
+        if self.in_flight >= self.max_in_flight and self.queued >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        return _Admission(self)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+            "avg_duration_s": round(self.avg_duration, 3),
+        }
+
+
+class _Admission:
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self.started = None
+
+    async def __aenter__(self):
+        controller = self.controller
+        controller.queued += 1
+        try:
+            await controller._slots.acquire()
+        finally:
+            controller.queued -= 1
+        controller.in_flight += 1
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc):
+        controller = self.controller
+        controller.in_flight -= 1
+        controller._slots.release()
+        duration = time.monotonic() - self.started
+        controller.avg_duration += controller.smoothing * (duration - controller.avg_duration)
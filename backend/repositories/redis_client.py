@@ -0,0 +1,20 @@
+from redis.asyncio import ConnectionPool, Redis
+from constants.db import REDIS_URL, REDIS_MAX_CONNECTIONS
+
+_pool = None
+
+
+def get_redis() -> Redis:
+    """Devuelve un cliente Redis asíncrono sobre un pool de conexiones compartido por el proceso."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+    return Redis(connection_pool=_pool)
+
+
+async def close_redis():
+    """Cierra las conexiones del pool compartido."""
+    global _pool
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
@@ -0,0 +1,135 @@
+import json
+import secrets
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+import pyarrow as pa
+
+from constants.db import RESULT_HANDLE_TTL_SECONDS
+from repositories.redis_client import get_redis
+
+# Postgres type OIDs (from the cursor description) → (type name, Arrow type)
+PG_TYPES = {
+    16: ("bool", pa.bool_()),
+    20: ("int64", pa.int64()),
+    21: ("int16", pa.int16()),
+    23: ("int32", pa.int32()),
+    700: ("float32", pa.float32()),
+    701: ("float64", pa.float64()),
+    1700: ("float64", pa.float64()),  # numeric: charts want plain floats
+    25: ("string", pa.string()),
+    1042: ("string", pa.string()),
+    1043: ("string", pa.string()),
+    1082: ("date", pa.date32()),
+    1114: ("timestamp", pa.timestamp("us")),
+    1184: ("timestamp", pa.timestamp("us", tz="UTC")),
+    1186: ("duration", pa.duration("us")),
+}
+DEFAULT_TYPE = ("string", pa.string())
+
+
+class ResultHandleRepository:
+    """Guarda la SQL ejecutada y sus parámetros bajo un handle opaco con TTL.
+
+    Los datos no se copian: el endpoint de datos vuelve a ejecutar la consulta
+    paginada, así que el handle solo ocupa lo que ocupa la SQL.
+    """
+
+    PREFIX = "result_handle:"
+
+    def __init__(self, ttl_seconds: int = RESULT_HANDLE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.redis = get_redis()
+
+    @staticmethod
+    def new_handle() -> str:
+        return secrets.token_urlsafe(16)
+
+    async def save(self, query: str, params: dict) -> str:
+        handle = self.new_handle()
+        await self.redis.set(self.PREFIX + handle, json.dumps({"sql": query, "params": params}), ex=self.ttl_seconds)
+        return handle
+
+    async def load(self, handle: str) -> Optional[Tuple[str, dict]]:
+        raw = await self.redis.get(self.PREFIX + handle)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["sql"], entry["params"]
+
+
+class InMemoryResultHandleRepository(ResultHandleRepository):
+    """Handles en memoria del proceso, para HISTORY_BACKEND=memory (sin Redis)."""
+
+    def __init__(self, ttl_seconds: int = RESULT_HANDLE_TTL_SECONDS, max_handles: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_handles = max_handles
+        self.handles = {}
+
+    async def save(self, query: str, params: dict) -> str:
+        now = time.monotonic()
+        if len(self.handles) >= self.max_handles:
+            self.handles = {h: e for h, e in self.handles.items() if e[2] > now}
+            while len(self.handles) >= self.max_handles:
+                self.handles.pop(next(iter(self.handles)))
+        handle = self.new_handle()
+        self.handles[handle] = (query, params, now + self.ttl_seconds)
+        return handle
+
+    async def load(self, handle: str) -> Optional[Tuple[str, dict]]:
+        entry = self.handles.get(handle)
+        if entry is None or entry[2] <= time.monotonic():
+            self.handles.pop(handle, None)
+            return None
+        return entry[0], entry[1]
+
+
+def column_types(description) -> List[Tuple[str, str, pa.DataType]]:
+    """(name, type name, Arrow type) per column, from the DB-API cursor description."""
+    return [(d[0], *PG_TYPES.get(d[1], DEFAULT_TYPE)) for d in description]
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return None
+    return value
+
+
+def to_columnar_json(columns, rows: list) -> dict:
+    """Column-oriented JSON: names and types once, then one array per column."""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        "columns": [{"name": name, "type": type_name} for name, type_name, _ in columns],
+        "data": [[_json_value(v) for v in column] for column in values],
+    }
+
+
+def _arrow_value(value, arrow_type: pa.DataType):
+    if isinstance(value, Decimal):
+        return float(value)
+    if pa.types.is_string(arrow_type) and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def to_arrow_ipc(columns, rows: list, compression: Optional[str] = None) -> bytes:
+    """Arrow IPC stream with one record batch; buffers optionally lz4/zstd compressed."""
+    schema = pa.schema([pa.field(name, arrow_type) for name, _, arrow_type in columns])
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    batch = pa.record_batch(
+        [pa.array([_arrow_value(v, field.type) for v in column], type=field.type) for column, field in zip(values, schema)],
+        schema=schema,
+    )
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_stream(sink, schema, options=options) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
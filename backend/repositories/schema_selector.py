@@ -0,0 +1,208 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+
+import models.models  # noqa: F401  registers every table on Base.metadata
+from models.db import Base
+from prompts.user_question_to_response import (
+    SCHEMA_TABLES, SQL_PROMPT_FOOTER, SQL_PROMPT_HEADER, build_request_to_sql_prompt, render_schema,
+)
+from utils.logger import logger
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough BPE ratio for English text and SQL identifiers
+    return max(1, len(text) // 4)
+
+
+def join_graph(tables: Iterable[str]) -> Dict[str, Set[str]]:
+    """Undirected foreign key graph between `tables`, read from the ORM models."""
+    tables = set(tables)
+    graph = {name: set() for name in tables}
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for fk in table.foreign_keys:
+            target = fk.column.table.name
+            if target in tables and target != table.name:
+                graph[table.name].add(target)
+                graph[target].add(table.name)
+    return graph
+
+
+def connect(seeds: List[str], graph: Dict[str, Set[str]]) -> Set[str]:
+    """Small connected set of tables containing every seed.
+
+    Greedy Steiner tree: starting from the first seed, repeatedly add the
+    shortest join path from the tables chosen so far to the nearest seed left.
+    """
+    if not seeds:
+        return set()
+    chosen = {seeds[0]}
+    remaining = set(seeds[1:]) - chosen
+    while remaining:
+        # Multi-source BFS from the current tree
+        parent = {table: None for table in chosen}
+        queue = deque(chosen)
+        found = None
+        while queue:
+            table = queue.popleft()
+            if table in remaining:
+                found = table
+                break
+            for neighbour in sorted(graph.get(table, ())):
+                if neighbour not in parent:
+                    parent[neighbour] = table
+                    queue.append(neighbour)
+        if found is None:
+            # Not reachable through foreign keys: include it on its own
+            chosen |= remaining
+            break
+        while found is not None and found not in chosen:
+            chosen.add(found)
+            found = parent[found]
+        remaining -= chosen
+    return chosen
+
+
+class SchemaSelector:
+    """Picks the tables a question needs and renders a SQL prompt with only those.
+
+    Tables are scored by cosine similarity between the question and the
+    descriptions of each table and of its columns (best of both). Tables close
+    to the best score are kept and joined into a connected set through the
+    foreign key graph. The SQL prompt carries the history, so the last
+    `context_turns` user questions are scored too and their tables added: a
+    follow-up like "and for Verstappen?" keeps the tables of the question it
+    follows. When nothing scores above `min_score` the full prompt is used.
+
+    Rendered prompts are cached per table set; `stats()` reports the prompt
+    tokens saved against the full schema.
+
+    The descriptions are only embedded on the first selection, inside the
+    worker thread that runs it: encoding at import would start the encoder's
+    thread pools in the pre-fork master (see serve.py).
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], np.ndarray],
+        max_seeds: int = 4,
+        min_score: float = 0.35,
+        margin: float = 0.15,
+        max_prompts: int = 256,
+        context_turns: int = 2,
+    ):
+        self.embed = embed
+        self.context_turns = context_turns
+        self.max_seeds = max_seeds
+        self.min_score = min_score
+        self.margin = margin
+        self.max_prompts = max_prompts
+        self.tables = list(SCHEMA_TABLES)
+        self.graph = join_graph(self.tables)
+        self.prompts = OrderedDict()
+        self.full_prompt = build_request_to_sql_prompt()
+        self.full_tokens = estimate_tokens(SQL_PROMPT_HEADER + render_schema() + SQL_PROMPT_FOOTER)
+        self.metrics = {"requests": 0, "full_schema": 0, "tables_selected": 0, "prompt_tokens": 0, "tokens_saved": 0}
+        self.table_sets = {}
+
+        # One row per description; owner[i] is the table index of row i
+        texts, owner = [], []
+        for index, (name, (comment, columns)) in enumerate(SCHEMA_TABLES.items()):
+            texts.append(f"{name.replace('_', ' ')}: {comment.lstrip('/ ')}")
+            owner.append(index)
+            for column in columns.split(":", 1)[1].split(","):
+                texts.append(f"{name.replace('_', ' ')} {column.strip().replace('_', ' ')}")
+                owner.append(index)
+        self.texts = texts
+        self.owner = np.array(owner)
+        self.vectors = None
+        self._vectors_lock = threading.Lock()
+
+    def _description_vectors(self) -> np.ndarray:
+        if self.vectors is None:
+            with self._vectors_lock:
+                if self.vectors is None:
+                    self.vectors = self._normalize(np.asarray(self.embed(self.texts), dtype=np.float32))
+        return self.vectors
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def scores(self, question: str, context: Sequence[str] = ()) -> np.ndarray:
+        """Best similarity per table (SCHEMA_TABLES order), one row for the question and each context turn."""
+        queries = self._normalize(np.asarray(self.embed([question, *context]), dtype=np.float32))
+        similarity = queries @ self._description_vectors().T
+        best = np.full((len(queries), len(self.tables)), -1.0, dtype=np.float32)
+        for row, values in zip(best, similarity):
+            np.maximum.at(row, self.owner, values)
+        return best
+
+    def select(self, question: str, context: Sequence[str] = ()) -> Optional[FrozenSet[str]]:
+        """Connected table set for the question and its context turns, or None to use the full schema."""
+        seeds = []
+        for scores in self.scores(question, context):
+            top = float(scores.max())
+            if top < self.min_score:
+                continue
+            ranked = np.argsort(-scores, kind="stable")[:self.max_seeds]
+            seeds.extend(self.tables[i] for i in ranked if scores[i] >= top - self.margin and self.tables[i] not in seeds)
+        if not seeds:
+            return None
+        return frozenset(connect(seeds, self.graph))
+
+    async def prompt_for(self, question: str, history: Sequence[str] = ()) -> ChatPromptTemplate:
+        """Trimmed SQL prompt for the question and the user's previous questions; the embedding runs in a thread."""
+        context = list(history)[-self.context_turns:] if self.context_turns else []
+        try:
+            tables = await asyncio.to_thread(self.select, question, context)
+        except Exception as e:
+            logger.error(f"Schema selection failed, using the full schema: {str(e)}")
+            tables = None
+        return self.prompt(tables)
+
+    def prompt(self, tables: Optional[FrozenSet[str]]) -> ChatPromptTemplate:
+        self.metrics["requests"] += 1
+        if tables is None or len(tables) == len(self.tables):
+            self.metrics["full_schema"] += 1
+            self.metrics["prompt_tokens"] += self.full_tokens
+            return self.full_prompt
+
+        entry = self.prompts.get(tables)
+        if entry is None:
+            prompt = build_request_to_sql_prompt(tables)
+            entry = (prompt, estimate_tokens(SQL_PROMPT_HEADER + render_schema(tables) + SQL_PROMPT_FOOTER))
+            self.prompts[tables] = entry
+            if len(self.prompts) > self.max_prompts:
+                self.prompts.popitem(last=False)
+        else:
+            self.prompts.move_to_end(tables)
+
+        prompt, tokens = entry
+        self.metrics["tables_selected"] += len(tables)
+        self.metrics["prompt_tokens"] += tokens
+        self.metrics["tokens_saved"] += self.full_tokens - tokens
+        key = ",".join(sorted(tables))
+        if key in self.table_sets or len(self.table_sets) < self.max_prompts:
+            self.table_sets[key] = self.table_sets.get(key, 0) + 1
+        return prompt
+
+    def stats(self, top: int = 10) -> dict:
+        requests = self.metrics["requests"]
+        pruned = requests - self.metrics["full_schema"]
+        return {
+            **self.metrics,
+            "full_prompt_tokens": self.full_tokens,
+            "avg_prompt_tokens": round(self.metrics["prompt_tokens"] / requests, 1) if requests else 0.0,
+            "avg_tables": round(self.metrics["tables_selected"] / pruned, 2) if pruned else 0.0,
+            "saved_pct": round(100 * self.metrics["tokens_saved"] / (self.full_tokens * requests), 1) if requests else 0.0,
+            "cached_prompts": len(self.prompts),
+            "top_table_sets": dict(sorted(self.table_sets.items(), key=lambda kv: -kv[1])[:top]),
+        }
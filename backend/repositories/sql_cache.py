@@ -0,0 +1,238 @@
+import asyncio
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from qdrant_client import models as qmodels
+
+from repositories.qdrant_service import QdrantRepository
+from schemas.db import MatchData
+from utils.logger import logger
+
+# Integers in the SQL outside string literals and identifiers (years, LIMITs, positions)
+SQL_NUMBER = re.compile(r"('(?:[^']|'')*')|(?<![\w.:])(\d+)(?![\w.])")
+QUESTION_NUMBER = re.compile(r"(?<![\w.])(\d+)(?![\w.])")
+WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+# Tokens with digits glued to letters or decimals ("P2", "22nd", "1.5"): kept as they are, never parametrized
+TOKEN = re.compile(r"\w+(?:\.\w+)*", re.UNICODE)
+# Words that do not change what a question asks for
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "for", "to", "by", "and", "or", "is", "was", "were", "did", "does",
+    "do", "what", "who", "which", "how", "many", "much", "s", "gp", "grand", "prix", "race", "season", "year",
+    "el", "la", "los", "las", "de", "del", "en", "que", "quien", "cual", "cuantos", "cuantas", "y", "por", "gran", "premio",
+}
+
+# Slots holding codes ('R', 'SOFT'...) rather than names the user would type
+CODE_SLOTS = {"session_type", "tyre_compound"}
+
+
+def question_words(question: str) -> Set[str]:
+    return {w for w in WORD.findall(question.lower()) if w not in STOPWORDS}
+
+
+def question_numbers(question: str) -> List[int]:
+    return [int(n) for n in QUESTION_NUMBER.findall(question)]
+
+
+def fixed_tokens(question: str) -> List[str]:
+    """Digit-bearing tokens that are not plain integers; two questions only share SQL when these are identical."""
+    return [t for t in TOKEN.findall(question.lower()) if any(c.isdigit() for c in t) and not t.isdigit()]
+
+
+def number_roles(question: str) -> List[str]:
+    """What each number of the question stands for, in order: "year", else the closest word before it.
+
+    Two questions can only share SQL when their numbers play the same roles in
+    the same order; "top 3 drivers in 2023" and "in 2024 the top 5 drivers" bind
+    :num_0 and :num_1 the other way round.
+    """
+    roles = []
+    for match in QUESTION_NUMBER.finditer(question):
+        if 1950 <= int(match.group(1)) <= 2100:
+            roles.append("year")
+            continue
+        before = [w for w in WORD.findall(question[:match.start()].lower()) if w not in STOPWORDS]
+        roles.append(before[-1] if before else "number")
+    return roles
+
+
+def parametrize_numbers(sql: str, numbers: List[int]) -> str:
+    """Replaces the SQL integers that come from the question with :num_<i> (i = position in the question)."""
+    def replace(match):
+        if match.group(1) is not None or int(match.group(2)) not in numbers:
+            return match.group(0)
+        return f":num_{numbers.index(int(match.group(2)))}"
+    return SQL_NUMBER.sub(replace, sql)
+
+
+@dataclass
+class SQLReuse:
+    """A stored SQL shape adapted to a new question: entity slots to resolve and number params."""
+    entry_id: str
+    sql: str
+    analysis: Optional[str]
+    slots: List[MatchData]
+    params: Dict[str, int] = field(default_factory=dict)
+    score: float = 0.0
+
+
+class SQLReuseCache:
+    """Question → cleaned SQL shapes kept in a Qdrant collection, shared by every worker.
+
+    After a generated query runs and returns rows, the question embedding is
+    stored with the cleaned SQL (entities already replaced by bind slots, and
+    integers taken from the question replaced by :num_<i>). A later question
+    close enough to a stored one reuses that SQL without the generation call;
+    the entity slots are resolved again and the query runs on current data.
+
+    Reuse is only attempted when the two questions differ by at most one
+    entity: every other differing word means a different question, and the
+    numbers must play the same roles in the same order (see `number_roles`);
+    numbers written into other tokens ("P2", "2nd") must be identical.
+    Entries whose SQL fails at execution are deleted.
+    """
+
+    collection = "sql_cache"
+
+    def __init__(self, qdrant_repo: QdrantRepository, min_score: float = 0.9, entity_min_score: float = 0.6):
+        self.qdrant_repo = qdrant_repo
+        self.min_score = min_score
+        self.entity_min_score = entity_min_score
+        self._collection_ready = False
+        self._pending = set()
+        self.stats = {"lookups": 0, "hits": 0, "no_match": 0, "mismatch": 0, "stored": 0, "evicted": 0}
+
+    @property
+    def client(self):
+        return self.qdrant_repo.qdrant_client
+
+    async def lookup(self, question: str) -> Optional[SQLReuse]:
+        self.stats["lookups"] += 1
+        try:
+            points = await self.qdrant_repo.similarity_search_async(self.collection, question, limit=3)
+        except Exception as e:
+            # Missing collection (nothing stored yet) or Qdrant down: generate as usual
+            logger.debug(f"SQL reuse lookup failed: {str(e)}")
+            points = []
+
+        candidates = [p for p in points if p.score >= self.min_score]
+        if not candidates:
+            self.stats["no_match"] += 1
+            return None
+        for point in candidates:
+            reuse = await self._adapt(point, question)
+            if reuse is not None:
+                self.stats["hits"] += 1
+                return reuse
+        self.stats["mismatch"] += 1
+        return None
+
+    async def _adapt(self, point, question: str) -> Optional[SQLReuse]:
+        payload = point.payload or {}
+        numbers = question_numbers(question)
+        # Numbers are bound by position: they must mean the same thing in the same order
+        if number_roles(question) != payload.get("number_roles"):
+            return None
+        # "P2" and "P3" (or "2nd" and "22nd") share their words and plain numbers but not their SQL
+        if fixed_tokens(question) != payload.get("fixed_tokens"):
+            return None
+
+        slots = [MatchData(**slot) for slot in payload.get("slots", [])]
+        new_words = question_words(question)
+        old_words = set(payload.get("words", []))
+        added, removed = new_words - old_words, old_words - new_words
+
+        if added or removed:
+            # Only an entity swap is allowed: the removed words belong to exactly one slot
+            changed = [s for s in slots if removed and removed <= question_words(s.data)]
+            if len(changed) != 1 or not added:
+                return None
+            slot = changed[0]
+            mention = " ".join(w for w in WORD.findall(question.lower()) if w in added)
+            try:
+                matches = await self.qdrant_repo.similarity_search_async(slot.type, mention, limit=1)
+            except Exception:
+                return None
+            if not matches or matches[0].score < self.entity_min_score:
+                return None
+            top = matches[0].payload or {}
+            value = top.get("text") or top.get("value") or next(iter(top.values()), None)
+            if value is None:
+                return None
+            slots = [MatchData(type=s.type, key=s.key, data=value) if s is slot else s for s in slots]
+
+        return SQLReuse(
+            entry_id=str(point.id),
+            sql=payload["sql"],
+            analysis=payload.get("analysis"),
+            slots=slots,
+            params={f"num_{i}": n for i, n in enumerate(numbers)},
+            score=point.score,
+        )
+
+    def remember(self, question: str, sql: str, slots: List[MatchData], analysis: Optional[str] = None):
+        """Stores the SQL shape in the background; the answer does not wait for it.
+
+        Questions that do not name every entity of their SQL (follow-ups that
+        lean on the history, like "and in 2023?") are not stored.
+        """
+        words = question_words(question)
+        if any(slot.type not in CODE_SLOTS and not (question_words(slot.data) & words) for slot in slots):
+            return
+        task = asyncio.create_task(self._store(question, sql, slots, analysis))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _store(self, question: str, sql: str, slots: List[MatchData], analysis: Optional[str]):
+        numbers = question_numbers(question)
+        payload = {
+            "question": question,
+            "words": sorted(question_words(question)),
+            "number_roles": number_roles(question),
+            "fixed_tokens": fixed_tokens(question),
+            "sql": parametrize_numbers(sql, numbers),
+            "analysis": analysis,
+            "slots": [slot.model_dump() for slot in slots],
+            "created_at": time.time(),
+        }
+        try:
+            vector = await asyncio.to_thread(self.qdrant_repo._encode_query, question)
+            await asyncio.to_thread(self._ensure_collection, len(vector))
+            point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, question.strip().lower()))
+            await asyncio.to_thread(
+                self.client.upsert, collection_name=self.collection,
+                points=[qmodels.PointStruct(id=point_id, vector=vector, payload=payload)],
+            )
+            self.stats["stored"] += 1
+        except Exception as e:
+            logger.error(f"Error storing SQL for reuse: {str(e)}")
+
+    def _ensure_collection(self, size: int):
+        if self._collection_ready:
+            return
+        if not self.client.collection_exists(self.collection):
+            self.client.create_collection(
+                collection_name=self.collection,
+                vectors_config=qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE),
+            )
+        self._collection_ready = True
+
+    async def evict(self, entry_id: str):
+        try:
+            await asyncio.to_thread(
+                self.client.delete, collection_name=self.collection,
+                points_selector=qmodels.PointIdsList(points=[entry_id]),
+            )
+            self.stats["evicted"] += 1
+        except Exception as e:
+            logger.error(f"Error evicting reused SQL {entry_id}: {str(e)}")
+
+    def report(self) -> dict:
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "min_score": self.min_score,
+        }
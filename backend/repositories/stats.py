@@ -0,0 +1,288 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from sqlalchemy import (
+    Column, Integer, MetaData, Numeric, String, Table, and_, case, distinct, func, select, text,
+)
+from sqlalchemy.dialects import postgresql
+
+from models.db import Base
+from models.deps import get_read_db
+from models.models import (
+    Driver, ImportRun, Lap, Meeting, PitStop, PointsScored, Season, Session, SessionDriver, SessionResult,
+    StartGrid, Stint,
+)
+
+# Session types are stored as FastF1 codes by both importers (R, S, Q, SQ, FP1-FP3)
+RACE = "R"
+
+# Materialized views live outside Base.metadata: create_all and snapshots only handle tables
+views_metadata = MetaData()
+
+driver_standings = Table(
+    "driver_standings", views_metadata,
+    Column("year", Integer),
+    Column("position", Integer),
+    Column("driver_id", Integer),
+    Column("driver_number", Integer),
+    Column("full_name", String),
+    Column("name_acronym", String),
+    Column("points", Numeric),
+    Column("wins", Integer),
+    Column("podiums", Integer),
+    Column("races", Integer),
+)
+
+
+def driver_standings_select():
+    """Season points, wins and podiums per driver, ranked within each season."""
+    is_race = Session.session_type == RACE
+    points = func.coalesce(func.sum(PointsScored.points_earned), 0)
+    wins = func.count(distinct(case((and_(is_race, SessionResult.final_position == 1), SessionResult.id))))
+    return (
+        select(
+            Season.year.label("year"),
+            func.rank().over(partition_by=Season.year, order_by=(points.desc(), wins.desc())).label("position"),
+            Driver.id.label("driver_id"),
+            Driver.driver_number.label("driver_number"),
+            Driver.full_name.label("full_name"),
+            Driver.name_acronym.label("name_acronym"),
+            points.label("points"),
+            wins.label("wins"),
+            func.count(distinct(case((and_(is_race, SessionResult.final_position <= 3), SessionResult.id)))).label("podiums"),
+            func.count(distinct(case((is_race, Session.id)))).label("races"),
+        )
+        .select_from(SessionResult)
+        .join(SessionDriver, SessionResult.session_driver_id == SessionDriver.id)
+        .join(Driver, SessionDriver.driver_id == Driver.id)
+        .join(Session, SessionDriver.session_id == Session.id)
+        .join(Meeting, Session.meeting_id == Meeting.id)
+        .join(Season, Meeting.seasson_id == Season.id)
+        .outerjoin(PointsScored, PointsScored.session_result_id == SessionResult.id)
+        .group_by(Season.year, Driver.id, Driver.driver_number, Driver.full_name, Driver.name_acronym)
+    )
+
+
+def data_tables() -> list:
+    """Every table but import_run: the load history, and so the data version, survives a reload."""
+    return [table for table in Base.metadata.sorted_tables if table is not ImportRun.__table__]
+
+
+async def create_stats_views(conn):
+    """Creates the precomputed stats views (and their indexes) if they do not exist yet."""
+    ddl = driver_standings_select().compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    await conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS driver_standings AS {ddl}"))
+    # Unique index: needed for REFRESH ... CONCURRENTLY and serves the per season lookups
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_driver_standings_year_driver ON driver_standings (year, driver_id)"
+    ))
+
+
+async def drop_stats_views(conn):
+    """Drops the stats views; they depend on the tables, so this goes before drop_all."""
+    await conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS driver_standings"))
+
+
+async def refresh_stats_views(conn):
+    """Recomputes the stats views without blocking readers."""
+    await conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY driver_standings"))
+
+
+async def record_import_run(conn, source: str, started_at: Optional[datetime] = None):
+    """Marks a completed load; bumps the data version seen by the stats API."""
+    await conn.execute(ImportRun.__table__.insert().values(
+        source=source, started_at=started_at, finished_at=datetime.utcnow()
+    ))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def encode(body) -> bytes:
+    return json.dumps(body, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+class StatsCache:
+    """Encoded responses keyed by (data version, request key).
+
+    The data version (latest ImportRun id) is re-read at most every
+    `version_ttl` seconds, so a hit costs no database round trip and entries
+    from older versions simply stop matching.
+    """
+
+    def __init__(self, max_entries: int = 2048, version_ttl: float = 5.0):
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self.entries = OrderedDict()
+        self._version = None
+        self._version_checked = 0.0
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def version(self, repo: "StatsRepository") -> int:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_ttl:
+            version = await repo.data_version()
+            if version != self._version:
+                self.entries.clear()
+            self._version, self._version_checked = version, now
+        return self._version
+
+    def get(self, version: int, key: str) -> Optional[bytes]:
+        body = self.entries.get((version, key))
+        if body is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end((version, key))
+        self.stats["hits"] += 1
+        return body
+
+    def put(self, version: int, key: str, body: bytes):
+        self.entries[(version, key)] = body
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class StatsRepository:
+    """Structured F1 lookups on the ORM models and the precomputed views; reads go to the replica."""
+
+    async def data_version(self) -> int:
+        async with get_read_db() as session:
+            return (await session.execute(select(func.coalesce(func.max(ImportRun.id), 0)))).scalar_one()
+
+    async def _page(self, stmt, offset: int, limit: int) -> Tuple[list, bool]:
+        async with get_read_db() as session:
+            result = await session.execute(stmt.offset(offset).limit(limit + 1))
+            rows = [dict(row) for row in result.mappings()]
+        return rows[:limit], len(rows) > limit
+
+    async def season_sessions(self, year: int, offset: int, limit: int):
+        stmt = (
+            select(
+                Session.id.label("session_id"), Session.session_name, Session.session_type,
+                Meeting.id.label("meeting_id"), Meeting.meeting_standard_name, Meeting.location, Meeting.date_start,
+            )
+            .join(Meeting, Session.meeting_id == Meeting.id)
+            .join(Season, Meeting.seasson_id == Season.id)
+            .where(Season.year == year)
+            .order_by(Meeting.date_start, Session.id)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def driver_standings(self, year: int, offset: int, limit: int):
+        stmt = (
+            select(driver_standings)
+            .where(driver_standings.c.year == year)
+            .order_by(driver_standings.c.position, driver_standings.c.driver_id)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def classification(self, session_id: int, offset: int, limit: int):
+        stmt = (
+            select(
+                SessionResult.final_position.label("position"),
+                Driver.driver_number, Driver.full_name, Driver.name_acronym,
+                StartGrid.grid_position,
+                SessionResult.number_of_laps_completed.label("laps"),
+                SessionResult.total_race_time, SessionResult.gap_to_leader, SessionResult.status,
+                SessionResult.dnf, SessionResult.dns, SessionResult.dsq,
+                func.coalesce(func.sum(PointsScored.points_earned), 0).label("points"),
+            )
+            .select_from(SessionResult)
+            .join(SessionDriver, SessionResult.session_driver_id == SessionDriver.id)
+            .join(Driver, SessionDriver.driver_id == Driver.id)
+            .outerjoin(StartGrid, StartGrid.session_driver_id == SessionDriver.id)
+            .outerjoin(PointsScored, PointsScored.session_result_id == SessionResult.id)
+            .where(SessionDriver.session_id == session_id)
+            .group_by(SessionResult.id, Driver.id, StartGrid.id)
+            .order_by(SessionResult.final_position.asc().nulls_last(), Driver.driver_number)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def fastest_laps(self, session_id: int, offset: int, limit: int):
+        # Best lap per driver, fastest first
+        best = (
+            select(
+                Lap.lap_number, Lap.lap_duration, Lap.duration_sector_1, Lap.duration_sector_2, Lap.duration_sector_3,
+                Stint.compound, SessionDriver.driver_id,
+                func.row_number().over(partition_by=SessionDriver.id, order_by=Lap.lap_duration).label("rank"),
+            )
+            .join(Stint, Lap.stint_id == Stint.id)
+            .join(SessionDriver, Stint.session_driver_id == SessionDriver.id)
+            .where(SessionDriver.session_id == session_id, Lap.lap_duration.is_not(None))
+            .subquery()
+        )
+        stmt = (
+            select(
+                Driver.driver_number, Driver.full_name, Driver.name_acronym,
+                best.c.lap_number, best.c.lap_duration, best.c.duration_sector_1, best.c.duration_sector_2,
+                best.c.duration_sector_3, best.c.compound,
+            )
+            .join(Driver, Driver.id == best.c.driver_id)
+            .where(best.c.rank == 1)
+            .order_by(best.c.lap_duration)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def pit_stops(self, session_id: int, offset: int, limit: int):
+        stmt = (
+            select(
+                Driver.driver_number, Driver.full_name, Driver.name_acronym,
+                func.count(PitStop.id).label("stops"),
+                func.sum(PitStop.pit_duration).label("total_duration"),
+                func.min(PitStop.pit_duration).label("fastest_duration"),
+                func.array_agg(PitStop.lap_number).label("laps"),
+            )
+            .select_from(PitStop)
+            .join(SessionDriver, PitStop.session_driver_id == SessionDriver.id)
+            .join(Driver, SessionDriver.driver_id == Driver.id)
+            .where(SessionDriver.session_id == session_id)
+            .group_by(Driver.id)
+            .order_by(func.min(PitStop.pit_duration).asc().nulls_last(), Driver.driver_number)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def stints(self, session_id: int, offset: int, limit: int):
+        stmt = (
+            select(
+                Driver.driver_number, Driver.full_name, Driver.name_acronym,
+                Stint.stint_number, Stint.compound, Stint.lap_start, Stint.lap_end, Stint.tyre_age_at_start,
+            )
+            .select_from(Stint)
+            .join(SessionDriver, Stint.session_driver_id == SessionDriver.id)
+            .join(Driver, SessionDriver.driver_id == Driver.id)
+            .where(SessionDriver.session_id == session_id)
+            .order_by(Driver.driver_number, Stint.stint_number)
+        )
+        return await self._page(stmt, offset, limit)
+
+    async def driver_results(self, driver_number: int, year: int, offset: int, limit: int):
+        stmt = (
+            select(
+                Meeting.meeting_standard_name, Meeting.date_start, Session.id.label("session_id"), Session.session_name,
+                StartGrid.grid_position, SessionResult.final_position.label("position"), SessionResult.status,
+                func.coalesce(func.sum(PointsScored.points_earned), 0).label("points"),
+            )
+            .select_from(SessionResult)
+            .join(SessionDriver, SessionResult.session_driver_id == SessionDriver.id)
+            .join(Driver, SessionDriver.driver_id == Driver.id)
+            .join(Session, SessionDriver.session_id == Session.id)
+            .join(Meeting, Session.meeting_id == Meeting.id)
+            .join(Season, Meeting.seasson_id == Season.id)
+            .outerjoin(StartGrid, StartGrid.session_driver_id == SessionDriver.id)
+            .outerjoin(PointsScored, PointsScored.session_result_id == SessionResult.id)
+            .where(Driver.driver_number == driver_number, Season.year == year, Session.session_type.in_([RACE, "S"]))
+            .group_by(SessionResult.id, Meeting.id, Session.id, StartGrid.id)
+            .order_by(Meeting.date_start, Session.id)
+        )
+        return await self._page(stmt, offset, limit)
@@ -0,0 +1,210 @@
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from models.deps import get_db
+from models.models import Driver, LapTelemetry, SessionDriver
+
+# Channel name -> (FastF1 telemetry column, storage dtype)
+TELEMETRY_CHANNELS: Dict[str, tuple] = {
+    "time": ("Time", np.float32),
+    "distance": ("Distance", np.float32),
+    "speed": ("Speed", np.float32),
+    "rpm": ("RPM", np.float32),
+    "gear": ("nGear", np.uint8),
+    "throttle": ("Throttle", np.float32),
+    "brake": ("Brake", np.uint8),
+    "drs": ("DRS", np.uint8),
+    "x": ("X", np.float32),
+    "y": ("Y", np.float32),
+}
+
+# Discrete channels are resampled with nearest-sample lookup instead of interpolation
+DISCRETE_CHANNELS = {"gear", "brake", "drs"}
+
+DEFAULT_MAX_POINTS = 400
+
+
+def encode_channel(name: str, values) -> bytes:
+    """Encodes a channel as a zlib compressed little-endian array."""
+    dtype = np.dtype(TELEMETRY_CHANNELS[name][1]).newbyteorder("<")
+    array = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0).astype(dtype)
+    return zlib.compress(array.tobytes(), 6)
+
+
+def decode_channel(name: str, blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """Decodes a channel stored with encode_channel."""
+    if blob is None:
+        return None
+    dtype = np.dtype(TELEMETRY_CHANNELS[name][1]).newbyteorder("<")
+    return np.frombuffer(zlib.decompress(blob), dtype=dtype)
+
+
+def telemetry_to_row(telemetry, session_driver_id: int, lap_number: int) -> Optional[dict]:
+    """Converts a FastF1 lap telemetry DataFrame into a lap_telemetry row."""
+    if telemetry is None or telemetry.empty:
+        return None
+
+    row = {
+        "session_driver_id": session_driver_id,
+        "lap_number": lap_number,
+        "sample_count": len(telemetry),
+    }
+    for name, (column, _dtype) in TELEMETRY_CHANNELS.items():
+        if column not in telemetry:
+            row[name] = None
+            continue
+        values = telemetry[column]
+        if name == "time":
+            values = values.dt.total_seconds()
+        elif name == "brake":
+            values = values.astype(float)
+        row[name] = encode_channel(name, values.to_numpy())
+
+    if row["time"] is None or row["distance"] is None:
+        return None
+    return row
+
+
+def downsample(channels: Dict[str, np.ndarray], max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, np.ndarray]:
+    """Resamples every channel onto an evenly spaced distance grid of at most max_points."""
+    distance = channels["distance"].astype(np.float64)
+    if len(distance) <= max_points:
+        return channels
+
+    # Distance must be increasing for interpolation; FastF1 can repeat samples
+    distance = np.maximum.accumulate(distance)
+    grid = np.linspace(distance[0], distance[-1], max_points)
+    nearest = np.clip(np.searchsorted(distance, grid), 0, len(distance) - 1)
+
+    resampled = {"distance": grid.astype(np.float32)}
+    for name, values in channels.items():
+        if name == "distance":
+            continue
+        if name in DISCRETE_CHANNELS:
+            resampled[name] = values[nearest]
+        else:
+            resampled[name] = np.interp(grid, distance, values.astype(np.float64)).astype(np.float32)
+    return resampled
+
+
+def lap_delta(reference: Dict[str, np.ndarray], other: Dict[str, np.ndarray], max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, np.ndarray]:
+    """Time gap of `other` against `reference` along the lap distance (positive = other is slower)."""
+    ref_distance = np.maximum.accumulate(reference["distance"].astype(np.float64))
+    other_distance = np.maximum.accumulate(other["distance"].astype(np.float64))
+    end = min(ref_distance[-1], other_distance[-1])
+    grid = np.linspace(0.0, end, max_points)
+    ref_time = np.interp(grid, ref_distance, reference["time"].astype(np.float64))
+    other_time = np.interp(grid, other_distance, other["time"].astype(np.float64))
+    return {"distance": grid.astype(np.float32), "delta": (other_time - ref_time).astype(np.float32)}
+
+
+def summarize(channels: Dict[str, np.ndarray]) -> dict:
+    """Compact per-lap figures that are cheap to hand to the interpreter."""
+    summary = {}
+    if "speed" in channels:
+        summary["max_speed"] = float(np.max(channels["speed"]))
+        summary["min_speed"] = float(np.min(channels["speed"]))
+    if "throttle" in channels:
+        summary["full_throttle_pct"] = float(np.mean(channels["throttle"] >= 98) * 100)
+    if "brake" in channels:
+        summary["braking_pct"] = float(np.mean(channels["brake"] > 0) * 100)
+    if "drs" in channels:
+        # FastF1 reports DRS open as 10, 12 or 14
+        summary["drs_open_pct"] = float(np.mean(channels["drs"] >= 10) * 100)
+    return summary
+
+
+class TelemetryRepository:
+    """Reads compressed lap telemetry and returns downsampled slices."""
+
+    async def get_lap_trace(
+        self,
+        session_id: int,
+        driver_number: int,
+        lap_number: int,
+        channels: Optional[Iterable[str]] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Optional[Dict[str, List[float]]]:
+        """Returns the requested channels of one lap resampled to max_points along distance."""
+        traces = await self.get_lap_traces(session_id, driver_number, [lap_number], channels, max_points)
+        return traces.get(lap_number)
+
+    async def get_lap_traces(
+        self,
+        session_id: int,
+        driver_number: int,
+        lap_numbers: Iterable[int],
+        channels: Optional[Iterable[str]] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Dict[int, Dict[str, List[float]]]:
+        """Returns several laps of a driver keyed by lap number."""
+        decoded = await self._load_channels(session_id, driver_number, lap_numbers, channels)
+        return {
+            lap: {name: values.tolist() for name, values in downsample(data, max_points).items()}
+            for lap, data in decoded.items()
+        }
+
+    async def get_lap_summary(self, session_id: int, driver_number: int, lap_number: int) -> Optional[dict]:
+        """Returns speed, throttle, brake and DRS figures for a lap."""
+        decoded = await self._load_channels(
+            session_id, driver_number, [lap_number], ["speed", "throttle", "brake", "drs"]
+        )
+        if lap_number not in decoded:
+            return None
+        return summarize(decoded[lap_number])
+
+    async def compare_laps(
+        self,
+        session_id: int,
+        reference: tuple,
+        other: tuple,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Optional[Dict[str, List[float]]]:
+        """Gap over a lap between two (driver_number, lap_number) pairs of the same session."""
+        ref = await self._load_channels(session_id, reference[0], [reference[1]], [])
+        oth = await self._load_channels(session_id, other[0], [other[1]], [])
+        if reference[1] not in ref or other[1] not in oth:
+            return None
+        delta = lap_delta(ref[reference[1]], oth[other[1]], max_points)
+        return {name: values.tolist() for name, values in delta.items()}
+
+    async def _load_channels(
+        self,
+        session_id: int,
+        driver_number: int,
+        lap_numbers: Iterable[int],
+        channels: Optional[Iterable[str]],
+    ) -> Dict[int, Dict[str, np.ndarray]]:
+        """Fetches only the requested channel columns and decodes them."""
+        names = list(TELEMETRY_CHANNELS) if channels is None else list(channels)
+        unknown = set(names) - set(TELEMETRY_CHANNELS)
+        if unknown:
+            raise ValueError(f"Unknown telemetry channels: {sorted(unknown)}")
+        # time and distance are always needed to resample
+        names = ["time", "distance"] + [n for n in names if n not in ("time", "distance")]
+
+        stmt = (
+            select(LapTelemetry.lap_number, *(getattr(LapTelemetry, n) for n in names))
+            .join(SessionDriver, SessionDriver.id == LapTelemetry.session_driver_id)
+            .join(Driver, Driver.id == SessionDriver.driver_id)
+            .where(
+                SessionDriver.session_id == session_id,
+                Driver.driver_number == driver_number,
+                LapTelemetry.lap_number.in_(list(lap_numbers)),
+            )
+        )
+        async with get_db() as session:
+            rows = (await session.execute(stmt)).all()
+
+        decoded = {}
+        for row in rows:
+            data = {}
+            for name in names:
+                values = decode_channel(name, getattr(row, name))
+                if values is not None:
+                    data[name] = values
+            decoded[row.lap_number] = data
+        return decoded
@@ -1,68 +1,356 @@
 from abc import ABC, abstractmethod
-from constants.db import REDIS_URL
-from langchain_community.chat_message_histories import RedisChatMessageHistory
+from collections import OrderedDict, deque
+from dataclasses import dataclass, asdict
+from itertools import islice
+import hashlib
+import json
+import time
+import zlib
+from redis.asyncio import Redis
+from repositories.redis_client import get_redis
+from constants.db import HISTORY_IDLE_TTL_SECONDS, HISTORY_MAX_TURNS, HISTORY_MAX_BYTES
 from utils.logger import logger
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage, message_to_dict, messages_from_dict
+
+def session_hash(user_id: str) -> str:
+    """Identificador opaco de una sesión para los informes (no expone el user_id)"""
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:16]
+
 
 class BaseRepository(ABC):
     @abstractmethod
-    def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
+    async def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
         """Establece el siguiente mensaje de chat para un usuario"""
         pass
 
     @abstractmethod
-    def get_chat_history(self, user_id: str, limit: int = 10) -> list:
+    async def get_chat_history(self, user_id: str, limit: int = 10) -> list:
         """Obtiene el historial de chat de un usuario"""
         pass
 
     @abstractmethod
-    def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
+    async def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
         """Obtiene solo los mensajes de usuario del historial"""
         pass
 
-class UserChatHistoryRepository:
-    history = dict()
+    async def add_message_and_get_history(self, user_id: str, message: str, type: str = "user", limit: int = 10) -> list:
+        """Guarda un mensaje y devuelve el historial previo a él (snapshot para toda la petición)"""
+        history = await self.get_chat_history(user_id, limit)
+        await self.set_next_chat_message(user_id, message, type=type)
+        return history
+
+    async def append_many(self, entries: list):
+        """Guarda varios mensajes (user_id, message, type) en orden"""
+        for user_id, message, type in entries:
+            await self.set_next_chat_message(user_id, message, type=type)
+
+@dataclass
+class RetentionPolicy:
+    """Límites de un historial: inactividad, turnos (pregunta + respuesta) y bytes almacenados."""
+    idle_ttl_seconds: int = HISTORY_IDLE_TTL_SECONDS
+    max_turns: int = HISTORY_MAX_TURNS
+    max_bytes: int = HISTORY_MAX_BYTES
+
+    @property
+    def max_messages(self) -> int:
+        return max(1, self.max_turns * 2)
+
+
+class _UserHistory:
+    """Mensajes de un usuario; los más recientes al final."""
+    __slots__ = ("messages", "human", "bytes", "last_access")
 
-    def set_next_chat_message(self, user_id: str, message: str):
+    def __init__(self, now: float):
+        self.messages = deque()
+        self.human = deque()
+        self.bytes = 0
+        self.last_access = now
+
+
+class UserChatHistoryRepository(BaseRepository):
+    """Historial en memoria del proceso, para despliegues de un solo nodo y pruebas de carga.
+
+    - Cada usuario guarda como máximo policy.max_turns turnos y policy.max_bytes bytes.
+    - El total del proceso no supera max_total_bytes: se expulsa primero al
+      usuario usado hace más tiempo (LRU), y también a los inactivos más de
+      policy.idle_ttl_seconds.
+    - Leer los últimos N mensajes recorre solo esos N desde el final.
+    """
+
+    # Coste aproximado de cada mensaje además de su texto
+    MESSAGE_OVERHEAD = 64
+
+    def __init__(self, max_total_bytes: int = 64 * 1024 * 1024, policy: RetentionPolicy = None, clock=time.monotonic):
+        self.max_total_bytes = max_total_bytes
+        self.policy = policy or RetentionPolicy()
+        self.clock = clock
+        self.history: "OrderedDict[str, _UserHistory]" = OrderedDict()
+        self.total_bytes = 0
+        self.evicted_users = 0
+
+    async def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
         """Establece el siguiente mensaje de chat para un usuario"""
-        if user_id not in self.history:
-            self.history[user_id] = []
-        self.history[user_id].append(message)
+        self._append(user_id, message, type)
 
-    def get_chat_history(self, user_id: str) -> list:
-        """Obtiene el historial de chat de un usuario"""
-        return self.history.get(user_id, [])
-    
-    def get_human_chat_history(self, user_id: str) -> list:
-        """Obtiene solo los mensajes de usuario del historial"""
-        return [msg for msg in self.history.get(user_id, []) if isinstance(msg, HumanMessage)]
-    
-class RedisChatHistoryRepository(BaseRepository):
-    def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
-        """Establece el siguiente mensaje de chat para un usuario en Redis"""
-        history = RedisChatMessageHistory(
-            session_id=user_id,
-            url=REDIS_URL 
+    async def append_many(self, entries: list):
+        for user_id, message, type in entries:
+            self._append(user_id, message, type)
+
+    async def get_chat_history(self, user_id: str, limit: int = 10) -> list:
+        """Obtiene los últimos `limit` mensajes de un usuario"""
+        user = self._touch(user_id)
+        if user is None:
+            return []
+        return [self._to_message(t, m) for (t, m, _size) in self._last(user.messages, limit)]
+
+    async def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
+        """Obtiene solo los últimos `limit` mensajes de usuario"""
+        user = self._touch(user_id)
+        if user is None:
+            return []
+        return [HumanMessage(content=m) for m in self._last(user.human, limit)]
+
+    async def memory_report(self, top: int = 50) -> dict:
+        sessions = sorted(
+            ({"session": session_hash(uid), "memory_bytes": u.bytes, "messages": len(u.messages)} for uid, u in self.history.items()),
+            key=lambda s: s["memory_bytes"],
+            reverse=True,
         )
+        return {
+            "sessions": len(self.history),
+            "history_memory_bytes": self.total_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "evicted_users": self.evicted_users,
+            "policy": asdict(self.policy),
+            "top_sessions": sessions[:top],
+        }
+
+    @staticmethod
+    def _last(items: deque, limit: int) -> list:
+        if limit <= 0 or limit >= len(items):
+            return list(items)
+        return list(islice(reversed(items), limit))[::-1]
+
+    @staticmethod
+    def _to_message(type: str, message: str):
+        return HumanMessage(content=message) if type == "user" else AIMessage(content=message)
+
+    def _touch(self, user_id: str):
+        user = self.history.get(user_id)
+        if user is not None:
+            user.last_access = self.clock()
+            self.history.move_to_end(user_id)
+        return user
+
+    def _append(self, user_id: str, message: str, type: str):
+        now = self.clock()
+        user = self._touch(user_id)
+        if user is None:
+            user = self.history[user_id] = _UserHistory(now)
+
+        size = len(message.encode("utf-8")) + self.MESSAGE_OVERHEAD
+        user.messages.append((type, message, size))
+        user.bytes += size
+        self.total_bytes += size
         if type == "user":
-            history.add_user_message(message)
-        else:
-            history.add_ai_message(message)
-
-    def get_chat_history(self, user_id: str, limit: int = 10) -> list:
-        """Obtiene el historial de chat de un usuario desde Redis"""
-        history = RedisChatMessageHistory(
-            session_id=user_id,
-            url=REDIS_URL 
-        )
-        return history.messages[-limit:] if limit > 0 else history.messages
-    
-    def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
-        """Obtiene solo los mensajes de usuario del historial en Redis"""
-        history = RedisChatMessageHistory(
-            session_id=user_id,
-            url=REDIS_URL 
+            user.human.append(message)
+            if len(user.human) > max(1, self.policy.max_messages // 2):
+                user.human.popleft()
+
+        # Límites del usuario: siempre se conserva el mensaje recién añadido
+        while len(user.messages) > 1 and (len(user.messages) > self.policy.max_messages or user.bytes > self.policy.max_bytes):
+            _t, _m, old_size = user.messages.popleft()
+            user.bytes -= old_size
+            self.total_bytes -= old_size
+
+        self._evict(now, keep=user_id)
+
+    def _evict(self, now: float, keep: str):
+        """Expulsa usuarios inactivos y, si hace falta, los menos usados hasta volver al presupuesto."""
+        for user_id, user in list(self.history.items()):
+            over_budget = self.total_bytes > self.max_total_bytes
+            idle = now - user.last_access > self.policy.idle_ttl_seconds
+            if user_id == keep or not (over_budget or idle):
+                break
+            self.total_bytes -= user.bytes
+            del self.history[user_id]
+            self.evicted_users += 1
+
+# Appends one message and enforces the session policy atomically.
+# KEYS: messages, human messages, byte counter, policy overrides
+# ARGV: payload, is_user, max_messages, max_bytes, idle_ttl
+APPEND_WITH_RETENTION = """
+local max_messages = tonumber(ARGV[3])
+local max_bytes = tonumber(ARGV[4])
+local ttl = tonumber(ARGV[5])
+local override = redis.call('HMGET', KEYS[4], 'max_messages', 'max_bytes', 'idle_ttl_seconds')
+if override[1] then max_messages = tonumber(override[1]) end
+if override[2] then max_bytes = tonumber(override[2]) end
+if override[3] then ttl = tonumber(override[3]) end
+
+redis.call('LPUSH', KEYS[1], ARGV[1])
+local total = redis.call('INCRBY', KEYS[3], string.len(ARGV[1]))
+if ARGV[2] == '1' then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    redis.call('LTRIM', KEYS[2], 0, math.ceil(max_messages / 2) - 1)
+end
+
+local length = redis.call('LLEN', KEYS[1])
+while length > 1 and (length > max_messages or total > max_bytes) do
+    local oldest = redis.call('RPOP', KEYS[1])
+    total = redis.call('DECRBY', KEYS[3], string.len(oldest))
+    length = length - 1
+end
+
+for i = 1, 4 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then redis.call('EXPIRE', KEYS[i], ttl) end
+end
+return total
+"""
+
+COMPRESSED_MARKER = b"z"
+COMPRESS_MIN_BYTES = 128
+
+
+class RedisChatHistoryRepository(BaseRepository):
+    """Historial en Redis sobre un pool compartido.
+
+    Los mensajes se guardan con LPUSH en message_store:<session> (el más
+    reciente en la posición 0), así los últimos N se leen con LRANGE. Los
+    mensajes de usuario se duplican en human_store:<session> para leerlos
+    también acotados en el servidor.
+
+    Cada escritura aplica la RetentionPolicy de la sesión en un script Lua:
+    expira las claves tras idle_ttl_seconds sin actividad y descarta los
+    mensajes más antiguos que superen max_turns o max_bytes. Los mensajes
+    largos se guardan comprimidos con zlib (prefijo b"z"); los JSON sin
+    comprimir de versiones anteriores se siguen leyendo.
+    """
+
+    key_prefix = "message_store:"
+    human_key_prefix = "human_store:"
+    bytes_key_prefix = "history_bytes:"
+    policy_key_prefix = "history_policy:"
+
+    def __init__(self, redis: Redis = None, policy: RetentionPolicy = None):
+        self.redis = redis or get_redis()
+        self.policy = policy or RetentionPolicy()
+        self._append = self.redis.register_script(APPEND_WITH_RETENTION)
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    def _human_key(self, user_id: str) -> str:
+        return f"{self.human_key_prefix}{user_id}"
+
+    def _keys(self, user_id: str) -> list:
+        return [
+            self._key(user_id),
+            self._human_key(user_id),
+            f"{self.bytes_key_prefix}{user_id}",
+            f"{self.policy_key_prefix}{user_id}",
+        ]
+
+    @staticmethod
+    def _serialize(message: str, type: str) -> bytes:
+        msg = HumanMessage(content=message) if type == "user" else AIMessage(content=message)
+        raw = json.dumps(message_to_dict(msg), separators=(",", ":")).encode("utf-8")
+        if len(raw) < COMPRESS_MIN_BYTES:
+            return raw
+        return COMPRESSED_MARKER + zlib.compress(raw, 6)
+
+    @staticmethod
+    def _deserialize(items: list) -> list:
+        decoded = []
+        # LPUSH guarda del más nuevo al más antiguo
+        for item in reversed(items):
+            if item[:1] == COMPRESSED_MARKER:
+                item = zlib.decompress(item[1:])
+            decoded.append(json.loads(item))
+        return messages_from_dict(decoded)
+
+    async def _queue_write(self, pipe, user_id: str, message: str, type: str):
+        # Con un pipeline como cliente el script solo se encola (EVALSHA)
+        await self._append(
+            keys=self._keys(user_id),
+            args=[
+                self._serialize(message, type),
+                "1" if type == "user" else "0",
+                self.policy.max_messages,
+                self.policy.max_bytes,
+                self.policy.idle_ttl_seconds,
+            ],
+            client=pipe,
         )
-        user_messages = [msg for msg in history.messages if isinstance(msg, HumanMessage)]
-        return user_messages[-limit:] if limit > 0 else user_messages
-        
\ No newline at end of file
+
+    async def set_next_chat_message(self, user_id: str, message: str, type: str = "user"):
+        """Establece el siguiente mensaje de chat para un usuario en Redis"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await self._queue_write(pipe, user_id, message, type)
+            await pipe.execute()
+
+    async def get_chat_history(self, user_id: str, limit: int = 10) -> list:
+        """Obtiene los últimos `limit` mensajes de un usuario desde Redis"""
+        items = await self.redis.lrange(self._key(user_id), 0, limit - 1 if limit > 0 else -1)
+        return self._deserialize(items)
+
+    async def get_human_chat_history(self, user_id: str, limit: int = 10) -> list:
+        """Obtiene solo los últimos `limit` mensajes de usuario desde Redis"""
+        items = await self.redis.lrange(self._human_key(user_id), 0, limit - 1 if limit > 0 else -1)
+        return self._deserialize(items)
+
+    async def add_message_and_get_history(self, user_id: str, message: str, type: str = "user", limit: int = 10) -> list:
+        """Lee el historial y guarda el mensaje en una sola ida y vuelta a Redis"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(self._key(user_id), 0, limit - 1 if limit > 0 else -1)
+            await self._queue_write(pipe, user_id, message, type)
+            results = await pipe.execute()
+        return self._deserialize(results[0])
+
+    async def append_many(self, entries: list):
+        """Guarda mensajes de varios usuarios en un único pipeline"""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, message, type in entries:
+                await self._queue_write(pipe, user_id, message, type)
+            await pipe.execute()
+
+    async def set_retention_policy(self, user_id: str, policy: RetentionPolicy):
+        """Sobrescribe la política por defecto para una sesión concreta"""
+        key = self._keys(user_id)[3]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "max_messages": policy.max_messages,
+                "max_bytes": policy.max_bytes,
+                "idle_ttl_seconds": policy.idle_ttl_seconds,
+            })
+            pipe.expire(key, policy.idle_ttl_seconds)
+            await pipe.execute()
+
+    async def memory_report(self, top: int = 50) -> dict:
+        """Uso de memoria de los historiales: por sesión (las `top` mayores) y total"""
+        sessions = []
+        async for key in self.redis.scan_iter(match=f"{self.key_prefix}*", count=500):
+            user_id = key.decode("utf-8")[len(self.key_prefix):]
+            keys = self._keys(user_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for k in keys:
+                    pipe.memory_usage(k)
+                pipe.llen(keys[0])
+                pipe.ttl(keys[0])
+                usage = await pipe.execute()
+            sessions.append({
+                "session": session_hash(user_id),
+                "memory_bytes": sum(u or 0 for u in usage[:4]),
+                "messages": usage[4],
+                "ttl_seconds": usage[5],
+            })
+
+        info = await self.redis.info("memory")
+        sessions.sort(key=lambda s: s["memory_bytes"], reverse=True)
+        return {
+            "sessions": len(sessions),
+            "history_memory_bytes": sum(s["memory_bytes"] for s in sessions),
+            "redis_used_memory_bytes": info.get("used_memory"),
+            "policy": asdict(self.policy),
+            "top_sessions": sessions[:top],
+        }
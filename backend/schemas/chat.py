@@ -1,11 +1,24 @@
-from pydantic import BaseModel
-from typing import Literal, List
+from pydantic import BaseModel, Field
+from constants.db import BATCH_MAX_QUESTIONS
+from typing import Literal, List, Optional
 
 class ChatMessageRequest(BaseModel):
     content: str
 
 class ChatResponse(BaseModel):
     response: str
+    # Handle for GET /api/v1/data/{handle}: the rows behind the answer
+    data_handle: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    questions: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUESTIONS)
+
+class BatchChatItem(BaseModel):
+    """One NDJSON line of the batch response, sent as soon as that question is answered."""
+    index: int
+    question: str
+    response: str
+    data_handle: Optional[str] = None
 
 class LLMResponse(BaseModel):
     query: str
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Pre-fork production entrypoint.
+
+    python serve.py --workers 8 --max-requests 5000
+
+The master imports the app once, which loads the sentence-transformers encoder
+and torch runtime, preloads the static vocabularies (see `preload`), freezes
+everything allocated so far out of the garbage collector, and then forks the
+workers. The workers share those pages copy-on-write instead of each loading
+their own copy of the model. The master restarts workers that exit (including
+the ones recycled after --max-requests) and periodically logs how much of each
+worker's RSS is shared with it.
+"""
+import os
+
+# Fork safety: no tokenizer thread pools created in the master
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import argparse
+import gc
+import random
+import signal
+import socket
+import time
+
+# No collections while the shared heap is built: a collection touches every
+# object header and would unshare the pages before the workers even start
+gc.disable()
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import uvicorn
+
+from main import app
+from models.db import engine, read_engine
+from utils.logger import logger
+
+
+def read_memory(pid: int) -> dict:
+    """Rss/Pss/Shared/Private in MB from /proc/<pid>/smaps_rollup (Linux only)."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def report_memory(master_pid: int, workers: dict):
+    master = read_memory(master_pid)
+    if not master:
+        return
+    saved = 0.0
+    for pid in workers:
+        usage = read_memory(pid)
+        if not usage:
+            continue
+        # Shared pages are the RSS each worker would otherwise hold privately
+        saved += usage["shared"]
+        logger.info(
+            f"worker {pid}: rss {usage['rss']:.0f}MB, private {usage['private']:.0f}MB, "
+            f"shared {usage['shared']:.0f}MB, pss {usage['pss']:.0f}MB"
+        )
+    if workers:
+        logger.info(
+            f"master {master_pid}: rss {master['rss']:.0f}MB; "
+            f"~{saved / len(workers):.0f}MB saved per worker by sharing ({saved:.0f}MB total)"
+        )
+
+
+def preload() -> dict:
+    """Builds the static vocabularies in the master so the workers share them.
+
+    Only inference-free state is built here: the schema and column descriptions
+    used to prune the SQL prompt, and the query tool declarations bound to the
+    model. Their embeddings are computed on first use in each worker, because
+    running the encoder here would start torch's thread pools before fork().
+    The entity vocabularies (drivers, meetings...) are not held in process;
+    they are Qdrant collections searched per request.
+    """
+    from controllers import chat
+
+    loaded = {"encoder": chat.qdrant_repo.model.__class__.__name__}
+    if chat.schema_selector is not None:
+        loaded["schema_descriptions"] = len(chat.schema_selector.texts)
+    if chat.query_tools is not None:
+        chat.nlsql_interpreter.bind_query_tools()
+        loaded["query_tools"] = len(chat.query_tools.tools)
+    return loaded
+
+
+def run_worker(sock: socket.socket, max_requests: int):
+    """Child process: serves on the inherited socket until it is recycled or stopped."""
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    # Connections must never be shared across processes: drop the parent's pool references
+    engine.sync_engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.sync_engine.dispose(close=False)
+    gc.enable()
+
+    config = uvicorn.Config(app, limit_max_requests=max_requests or None, log_level="info")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, max_requests: int, jitter: int) -> int:
+    # Jitter spreads recycling so the workers do not restart together
+    limit = max_requests + random.randint(0, jitter) if max_requests else 0
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, limit)
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {pid}" + (f" (recycled after {limit} requests)" if limit else ""))
+    return pid
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    arg_parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    arg_parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    arg_parser.add_argument("--max-requests", type=int, default=int(os.getenv("WORKER_MAX_REQUESTS", "0")),
+                            help="Recycle a worker after this many requests (0 = never)")
+    arg_parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "0")))
+    arg_parser.add_argument("--report-interval", type=float, default=float(os.getenv("RSS_REPORT_INTERVAL", "300")),
+                            help="Seconds between memory reports (0 = only once after startup)")
+    args = arg_parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    logger.info(f"Preloaded before fork: {preload()}")
+
+    # Everything imported so far moves to the permanent generation and is never scanned again
+    gc.collect()
+    gc.freeze()
+
+    stopping = False
+    workers = {}
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    # Installed before the first fork: a signal during startup must still reach the workers
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        if stopping:
+            break
+        pid = spawn(sock, args.max_requests, args.max_requests_jitter)
+        workers[pid] = time.monotonic()
+        if stopping:
+            # The signal arrived while this worker was being forked
+            os.kill(pid, signal.SIGTERM)
+    logger.info(f"Master {os.getpid()} serving on {args.host}:{args.port} with {args.workers} workers")
+
+    next_report = time.monotonic() + min(30.0, args.report_interval or 30.0)
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.pop(pid, None)
+            if not stopping:
+                logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+                workers[spawn(sock, args.max_requests, args.max_requests_jitter)] = time.monotonic()
+            continue
+
+        if time.monotonic() >= next_report and not stopping:
+            report_memory(os.getpid(), workers)
+            next_report = time.monotonic() + args.report_interval if args.report_interval else float("inf")
+        time.sleep(0.5)
+
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
-from schemas.chat import ChatMessageRequest, ChatResponse
+from schemas.chat import ChatMessageRequest, ChatResponse, BatchChatRequest, BatchChatItem
 from repositories.lang_chain import NLToSQLInterpreter
+from utils.deadline import Deadline
+from typing import AsyncIterator, Callable, Optional
 class ChatService:
     def __init__(self, lang_chain: NLToSQLInterpreter):
         self.lang_chain = lang_chain
 
-    async def chat(self, message: ChatMessageRequest, user_id: str) -> ChatResponse:
+    async def chat(self, message: ChatMessageRequest, user_id: str, deadline: Optional[Deadline] = None) -> ChatResponse:
         """Process a chat message and return a response."""
         # Convert the natural language question to SQL
-        response = await self.lang_chain.run_query_flow(user_id, message.content)
-        return ChatResponse(response=response)
+        response, data_handle = await self.lang_chain.run_query_flow(user_id, message.content, deadline=deadline)
+        return ChatResponse(response=response, data_handle=data_handle)
+
+
+    async def chat_batch(
+        self, request: BatchChatRequest, user_id: str, deadline: Optional[Deadline] = None, concurrency: int = 5,
+        admit: Optional[Callable] = None,
+    ) -> AsyncIterator[BatchChatItem]:
+        """Answer several questions concurrently, yielding each answer as soon as it is ready."""
+        async for index, response, data_handle in self.lang_chain.run_batch_flow(
+            user_id, request.questions, deadline=deadline, concurrency=concurrency, admit=admit
+        ):
+            yield BatchChatItem(index=index, question=request.questions[index], response=response, data_handle=data_handle)
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from repositories.lang_chain import NLToSQLInterpreter, SingleFlight, ERROR_ANSWER
+from repositories.rate_limiter import Overloaded
+from utils.deadline import Deadline
+from utils.logger import logger
+
+
+class ConversationSession:
+    """State of one WebSocket chat connection.
+
+    Messages are answered one at a time in arrival order, so a follow-up always
+    sees the previous answer. The history snapshot is read once when the
+    connection opens and then kept up to date in memory (and persisted after
+    each answer). Successful entity lookups are cached for `entity_ttl` seconds,
+    at most `max_entities` of them; failed lookups are not cached.
+    """
+
+    def __init__(
+        self,
+        lang_chain: NLToSQLInterpreter,
+        user_id: str,
+        send: Callable[[dict], Awaitable],
+        deadline_seconds: float,
+        history_limit: int = 10,
+        max_pending: int = 20,
+        max_entities: int = 256,
+        entity_ttl: float = 600.0,
+    ):
+        self.lang_chain = lang_chain
+        self.user_id = user_id
+        self.send = send
+        self.deadline_seconds = deadline_seconds
+        self.history_limit = history_limit
+        self.history = []
+        self.entities = SingleFlight(max_entries=max_entities, ttl=entity_ttl)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker = None
+
+    async def start(self):
+        self.history = await self.lang_chain.history_repo.get_chat_history(self.user_id, limit=self.history_limit)
+        self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stops the worker; cancels the answer in progress, if any."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def submit(self, message_id: str, content: str, admit: Callable = None) -> Optional[int]:
+        """Queues a message; returns its position, or None if too many are pending."""
+        try:
+            self.queue.put_nowait((message_id, content, admit))
+        except asyncio.QueueFull:
+            return None
+        return self.queue.qsize()
+
+    async def _run(self):
+        while True:
+            message_id, content, admit = await self.queue.get()
+            try:
+                if admit is not None:
+                    async with admit():
+                        await self._answer(message_id, content)
+                else:
+                    await self._answer(message_id, content)
+            except asyncio.CancelledError:
+                raise
+            except Overloaded as e:
+                await self._send_error({"type": "error", "id": message_id, "error": "overloaded", "retry_after": e.retry_after})
+            except Exception as e:
+                logger.error(f"Error processing websocket message for user {self.user_id}: {str(e)}")
+                await self._send_error({"type": "error", "id": message_id, "error": str(e)})
+
+    async def _send_error(self, event: dict):
+        """Reports an error to the client; a closed socket must not stop the worker."""
+        try:
+            await self.send(event)
+        except Exception as e:
+            logger.info(f"Could not send websocket error to user {self.user_id}: {str(e)}")
+
+    async def _answer(self, message_id: str, content: str):
+        async def on_event(event: dict):
+            await self.send({**event, "id": message_id})
+
+        deadline = Deadline(self.deadline_seconds)
+        try:
+            interpretation, data_handle = await self.lang_chain.answer_question(
+                self.user_id, content, self.history, deadline,
+                entities=self.entities, on_event=on_event,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error answering websocket message for user {self.user_id}: {str(e)}")
+            interpretation, data_handle = ERROR_ANSWER, None
+
+        self.history = (self.history + [HumanMessage(content=content), AIMessage(content=interpretation)])[-self.history_limit:]
+        await self.lang_chain.history_repo.append_many([
+            (self.user_id, content, "user"),
+            (self.user_id, interpretation, "system"),
+        ])
+        await self.send({"type": "answer", "id": message_id, "response": interpretation, "data_handle": data_handle})
@@ -0,0 +1,213 @@
+"""Parquet snapshots of the F1 database.
+
+    python snapshot.py export snapshots/2025-r12
+    python snapshot.py restore snapshots/2025-r12 [--drop]
+
+An export writes one Parquet file per table in models/models.py with an
+explicit Arrow schema, plus a manifest.json with row counts, checksums and a
+hash of the table definitions, so a snapshot can be pinned as a versioned
+benchmark artifact. A restore creates the bare tables, bulk loads them with
+COPY, and only then builds indexes, resets sequences and refreshes derived
+objects.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    BigInteger, Boolean, Date, DateTime, Float, Integer, Interval, LargeBinary, Numeric, String, Text,
+    select, text,
+)
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import models.models  # noqa: F401  registers every table on Base.metadata
+from models.db import Base, engine
+from repositories.stats import create_stats_views, drop_stats_views, record_import_run
+
+SNAPSHOT_FORMAT = 1
+BATCH_SIZE = 50_000
+
+
+def arrow_type(column_type) -> pa.DataType:
+    """Maps a SQLAlchemy column type to the Arrow type stored in the snapshot."""
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, BigInteger):
+        return pa.int64()
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, Numeric) and not isinstance(column_type, Float):
+        return pa.decimal128(column_type.precision or 38, column_type.scale or 0)
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, (String, Text)):
+        return pa.string()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Interval):
+        return pa.duration("us")
+    if isinstance(column_type, LargeBinary):
+        return pa.large_binary()
+    raise TypeError(f"No Arrow mapping for column type {column_type!r}")
+
+
+def table_schema(table) -> pa.Schema:
+    return pa.schema([pa.field(c.name, arrow_type(c.type), nullable=c.nullable) for c in table.columns])
+
+
+def metadata_hash() -> str:
+    """Hash of the table definitions; a snapshot only restores into the same schema."""
+    ddl = "\n".join(str(CreateTable(t).compile(engine)) for t in Base.metadata.sorted_tables)
+    return hashlib.sha256(ddl.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def export_snapshot(out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "schema_hash": metadata_hash(),
+        "tables": {},
+    }
+
+    async with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            started = time.perf_counter()
+            schema = table_schema(table)
+            path = os.path.join(out_dir, f"{table.name}.parquet")
+            rows = 0
+
+            with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+                # Server side cursor: the table never has to fit in memory
+                result = await conn.stream(select(table).order_by(*table.primary_key.columns))
+                async for partition in result.partitions(BATCH_SIZE):
+                    columns = list(zip(*partition))
+                    batch = pa.record_batch(
+                        [pa.array(list(values), type=field.type) for values, field in zip(columns, schema)],
+                        schema=schema,
+                    )
+                    writer.write_batch(batch)
+                    rows += len(partition)
+
+            manifest["tables"][table.name] = {
+                "file": os.path.basename(path),
+                "rows": rows,
+                "sha256": file_sha256(path),
+                "schema": schema.to_string(),
+            }
+            print(f"✓ {table.name}: {rows} rows in {time.perf_counter() - started:.1f}s")
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifest(snapshot_dir: str) -> dict:
+    with open(os.path.join(snapshot_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+
+    if manifest["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest['format']}")
+    if manifest["schema_hash"] != metadata_hash():
+        raise ValueError("Snapshot was taken with different table definitions than models/models.py")
+    for name, entry in manifest["tables"].items():
+        if file_sha256(os.path.join(snapshot_dir, entry["file"])) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {entry['file']}")
+    return manifest
+
+
+async def rebuild_derived_objects(conn):
+    """Indexes, sequences, stats views and statistics, built once the data is in place."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            await conn.execute(CreateIndex(index))
+
+        for column in table.primary_key.columns:
+            if isinstance(column.type, Integer) and column.autoincrement in (True, "auto"):
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                    f"COALESCE(MAX({column.name}), 1), MAX({column.name}) IS NOT NULL) FROM {table.name}"
+                ))
+
+    await create_stats_views(conn)
+    await record_import_run(conn, "snapshot")
+    await conn.execute(text("ANALYZE"))
+
+
+async def restore_snapshot(snapshot_dir: str, drop: bool = False):
+    manifest = load_manifest(snapshot_dir)
+    tables = [t for t in Base.metadata.sorted_tables if t.name in manifest["tables"]]
+
+    async with engine.begin() as conn:
+        if drop:
+            await drop_stats_views(conn)
+            await conn.run_sync(Base.metadata.drop_all)
+
+        # Bare tables only; secondary indexes are cheaper to build after the load
+        for table in tables:
+            await conn.execute(CreateTable(table))
+
+        raw = await conn.get_raw_connection()
+        driver_connection = raw.driver_connection
+
+        for table in tables:
+            started = time.perf_counter()
+            entry = manifest["tables"][table.name]
+            parquet = pq.ParquetFile(os.path.join(snapshot_dir, entry["file"]))
+            columns = [c.name for c in table.columns]
+
+            for batch in parquet.iter_batches(batch_size=BATCH_SIZE, columns=columns):
+                data = batch.to_pydict()
+                await driver_connection.copy_records_to_table(
+                    table.name,
+                    records=zip(*(data[c] for c in columns)),
+                    columns=columns,
+                )
+            print(f"✓ {table.name}: {entry['rows']} rows in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        await rebuild_derived_objects(conn)
+        print(f"✓ Indexes, sequences and statistics in {time.perf_counter() - started:.1f}s")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Dump every table to Parquet")
+    export_cmd.add_argument("out_dir")
+
+    restore_cmd = commands.add_parser("restore", help="Bulk load a snapshot into an empty database")
+    restore_cmd.add_argument("snapshot_dir")
+    restore_cmd.add_argument("--drop", action="store_true", help="Drop the existing tables first")
+
+    args = arg_parser.parse_args()
+    started = time.perf_counter()
+    if args.command == "export":
+        await export_snapshot(args.out_dir)
+    else:
+        await restore_snapshot(args.snapshot_dir, drop=args.drop)
+    print(f"{args.command.capitalize()} completed in {time.perf_counter() - started:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
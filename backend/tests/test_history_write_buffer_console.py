@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.history_write_buffer import WriteBehindHistoryRepository
+from repositories.user_chat_history import UserChatHistoryRepository
+
+# Simple console-based tests for the write-behind history buffer without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+class FlakyBackend(UserChatHistoryRepository):
+    """In-memory backend whose first `failures` batch writes raise."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    async def append_many(self, entries: list):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("backend down")
+        await super().append_many(entries)
+
+
+class SlowBackend(UserChatHistoryRepository):
+    """In-memory backend whose writes and reads take a while, so flushes overlap the reads."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def append_many(self, entries: list):
+        await asyncio.sleep(0.01)
+        await super().append_many(entries)
+
+    async def get_chat_history(self, user_id: str, limit: int = 10) -> list:
+        self.reads += 1
+        await asyncio.sleep(0.005)
+        return await super().get_chat_history(user_id, limit)
+
+
+async def run_async_tests():
+    all_ok = True
+
+    # 1) A transient failure is retried and the batch is saved
+    backend = FlakyBackend(failures=2)
+    repo = WriteBehindHistoryRepository(backend, retry_delay=0.01, max_attempts=5)
+    await repo.set_next_chat_message("u1", "q0")
+    await repo.close()
+    saved = [m.content for m in await backend.get_chat_history("u1")]
+    all_ok &= assert_equal(saved, ["q0"], "saved after retries")
+    all_ok &= assert_equal(backend.attempts, 3, "attempts until success")
+
+    # 2) Reads do not wait for a failing batch, and still see its messages
+    backend = FlakyBackend(failures=100)
+    repo = WriteBehindHistoryRepository(backend, retry_delay=0.05, max_attempts=3)
+    await repo.set_next_chat_message("u1", "q0")
+    await asyncio.sleep(0.02)
+    history = await asyncio.wait_for(repo.get_chat_history("u1"), timeout=0.5)
+    all_ok &= assert_equal([m.content for m in history], ["q0"], "read-your-writes while the backend fails")
+
+    # 3) The batch is dropped after max_attempts and the queue drains
+    await asyncio.wait_for(repo.queue.join(), timeout=2)
+    all_ok &= assert_equal(backend.attempts, 3, "bounded attempts")
+    all_ok &= assert_equal(repo.dropped_messages, 1, "dropped messages counted")
+    all_ok &= assert_equal(repo._pending, {}, "dropped messages no longer pending")
+
+    # 4) close() gives up after close_timeout
+    backend = FlakyBackend(failures=100)
+    repo = WriteBehindHistoryRepository(backend, retry_delay=10, max_attempts=3, close_timeout=0.1)
+    await repo.set_next_chat_message("u1", "q0")
+    await asyncio.wait_for(repo.close(), timeout=1)
+    all_ok &= assert_equal(repo._task, None, "flusher stopped on close timeout")
+
+    # 5) Reads are not held back by other users' flushes, even when they never stop
+    backend = SlowBackend()
+    repo = WriteBehindHistoryRepository(backend, batch_size=1)
+    await repo.set_next_chat_message("reader", "q0")
+    await repo.queue.join()
+    stop = asyncio.Event()
+
+    async def busy_writer():
+        i = 0
+        while not stop.is_set():
+            await repo.set_next_chat_message("busy", f"m{i}")
+            i += 1
+            await asyncio.sleep(0.001)
+
+    writer = asyncio.create_task(busy_writer())
+    await asyncio.sleep(0.02)
+    await repo.set_next_chat_message("reader", "q1")
+    backend.reads = 0
+    histories = []
+    for _ in range(10):
+        history = await asyncio.wait_for(repo.get_chat_history("reader"), timeout=0.5)
+        histories.append([m.content for m in history])
+    all_ok &= assert_equal(histories, [["q0", "q1"]] * 10, "reads see each message once while others flush")
+    all_ok &= assert_equal(backend.reads <= 12, True, f"reads not retried for other users' flushes ({backend.reads})")
+    stop.set()
+    await writer
+    await repo.close()
+
+    return all_ok
+
+
+def run_tests():
+    if asyncio.run(run_async_tests()):
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.lap_analytics import (
+    FUEL_EFFECT_PER_LAP, LapAnalytics, SessionLaps, consistency, degradation, gaps, pace, undercut_windows,
+)
+
+# Simple console-based tests for the lap analyses on a synthetic race without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+NAMES = {1: "VER", 16: "LEC", 44: "HAM"}
+BASE = {1: 90.0, 16: 90.3, 44: 90.6}
+DEGRADATION = {1: 0.05, 16: 0.08, 44: 0.03}
+
+
+def synthetic_rows(total_laps: int = 30, pit_lap: int = 16):
+    """Two stints per driver; lap 1 untimed, a slow out lap and a safety car lap for LEC."""
+    rows = []
+    for number in (1, 16, 44):
+        for lap in range(1, total_laps + 1):
+            stint = 1 if lap < pit_lap else 2
+            age = lap - 1 if stint == 1 else lap - pit_lap
+            time = BASE[number] + DEGRADATION[number] * age - FUEL_EFFECT_PER_LAP * (lap - 1)
+            if lap == pit_lap:
+                time += 20
+            if number == 16 and lap == 8:
+                time += 30
+            rows.append((
+                number, NAMES[number], stint, "MEDIUM" if stint == 1 else "HARD", 0,
+                lap, None if lap == 1 else time, lap == pit_lap,
+            ))
+    return rows
+
+
+def run_sync_tests(laps: SessionLaps) -> bool:
+    all_ok = True
+    all_ok &= assert_equal(list(laps.drivers), [1, 16, 44], "drivers sorted by number")
+    all_ok &= assert_equal(list(laps.offsets), [0, 30, 60, 90], "driver offsets")
+    all_ok &= assert_equal(int(laps.in_lap.sum()), 3, "one in lap per driver")
+
+    slopes = {(d["driver_number"], d["stint"]): d["degradation_per_lap"] for d in degradation(laps)}
+    for number, expected in DEGRADATION.items():
+        all_ok &= assert_equal(slopes[(number, 1)], expected, f"fuel corrected degradation for {number}")
+        all_ok &= assert_equal(slopes[(number, 2)], expected, f"degradation on second stint for {number}")
+
+    ranking = [p["driver_number"] for p in pace(laps)]
+    all_ok &= assert_equal(ranking[0], 1, "fastest median pace")
+    leclerc = pace(laps, drivers=[16])
+    all_ok &= assert_equal([p["driver"] for p in leclerc], ["LEC"], "pace filtered by driver")
+    all_ok &= assert_equal(leclerc[0]["laps"], 26, "safety car lap excluded from pace")
+
+    spread = consistency(laps)
+    all_ok &= assert_equal(spread[0]["driver"], "HAM", "lowest degradation is the most consistent")
+
+    race = gaps(laps)
+    all_ok &= assert_equal([g["driver"] for g in race], ["VER", "HAM", "LEC"], "finishing order")
+    all_ok &= assert_equal(race[0]["gap_to_leader"], 0.0, "leader gap")
+    all_ok &= assert_equal(race[2]["interval"], round(race[2]["gap_to_leader"] - race[1]["gap_to_leader"], 3), "interval to car ahead")
+
+    for window in undercut_windows(laps):
+        all_ok &= assert_equal(window["interval"] < window["estimated_gain"], True, f"window open on lap {window['lap']}")
+    return all_ok
+
+
+async def run_async_tests(laps: SessionLaps) -> bool:
+    all_ok = True
+    loads = []
+
+    async def loader(session_id):
+        loads.append(session_id)
+        await asyncio.sleep(0)
+        return laps
+
+    analytics = LapAnalytics(max_sessions=1, loader=loader)
+    results = await asyncio.gather(*(analytics.run("pace", 9) for _ in range(5)))
+    all_ok &= assert_equal(loads, [9], "concurrent requests share one load")
+    all_ok &= assert_equal(results[0]["total_laps"], 30, "total laps")
+
+    await analytics.run("gaps", 9)
+    all_ok &= assert_equal(analytics.stats["hits"], 1, "loaded session served from cache")
+
+    await analytics.run("pace", 10)
+    all_ok &= assert_equal(list(analytics.sessions), [10], "least recently used session evicted")
+
+    # A new import drops the loaded sessions: ids are reused for different data
+    version = [1]
+
+    async def data_version():
+        return version[0]
+
+    analytics = LapAnalytics(loader=loader, data_version=data_version, version_ttl=0.0)
+    await analytics.run("pace", 9)
+    await analytics.run("pace", 9)
+    version[0] = 2
+    await analytics.run("pace", 9)
+    all_ok &= assert_equal(loads[-3:], [10, 9, 9], "session reloaded after a new import")
+    all_ok &= assert_equal(analytics.report()["version"], 2, "version reported")
+
+    try:
+        await analytics.run("overtakes", 10)
+        all_ok &= assert_equal(True, False, "unknown analysis rejected")
+    except ValueError:
+        pass
+    return all_ok
+
+
+def run_tests():
+    laps = SessionLaps.from_rows(9, synthetic_rows())
+    all_ok = run_sync_tests(laps)
+    all_ok &= asyncio.run(run_async_tests(laps))
+    if all_ok:
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.llm_gateway import LLMGateway, PRIORITY_SQL, PRIORITY_INTERPRETATION, parse_model_limits
+
+# Simple console-based tests for LLMGateway scheduling without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+class FakeChain:
+    """Records the order in which calls start; each call blocks until released."""
+
+    def __init__(self, started: list):
+        self.started = started
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, inputs):
+        self.started.append(inputs["name"])
+        await self.release.wait()
+        return inputs["name"]
+
+
+def make_gateway(**kwargs) -> LLMGateway:
+    return LLMGateway(llm_factory=lambda model: None, **kwargs)
+
+
+async def run_async_tests():
+    all_ok = True
+
+    # 1) Round-robin across users: a heavy user does not go before a light one
+    gateway = make_gateway(max_concurrency=1)
+    started = []
+    chain = FakeChain(started)
+    blocker = FakeChain(started)
+    first = asyncio.create_task(gateway.ainvoke(blocker, {"name": "blocker"}, user_id="x", model="m"))
+    await asyncio.sleep(0)
+    calls = [("heavy", "h1"), ("heavy", "h2"), ("heavy", "h3"), ("light", "l1")]
+    tasks = [asyncio.create_task(gateway.ainvoke(chain, {"name": n}, user_id=u, model="m")) for u, n in calls]
+    await asyncio.sleep(0)
+    chain.release.set()
+    blocker.release.set()
+    await asyncio.gather(first, *tasks)
+    all_ok &= assert_equal(started, ["blocker", "h1", "l1", "h2", "h3"], "round-robin across users")
+
+    # 2) SQL generation goes before interpretation when both are waiting
+    gateway = make_gateway(max_concurrency=1)
+    started = []
+    chain = FakeChain(started)
+    blocker = FakeChain(started)
+    first = asyncio.create_task(gateway.ainvoke(blocker, {"name": "blocker"}, user_id="x", model="m"))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(gateway.ainvoke(chain, {"name": "interp"}, user_id="a", model="m", priority=PRIORITY_INTERPRETATION)),
+        asyncio.create_task(gateway.ainvoke(chain, {"name": "sql"}, user_id="b", model="m", priority=PRIORITY_SQL)),
+    ]
+    await asyncio.sleep(0)
+    chain.release.set()
+    blocker.release.set()
+    await asyncio.gather(first, *tasks)
+    all_ok &= assert_equal(started, ["blocker", "sql", "interp"], "sql before interpretation")
+
+    # 3) Per model limit: a second call to a saturated model waits, other models still run
+    gateway = make_gateway(max_concurrency=4, model_limits=parse_model_limits("slow=1"))
+    started = []
+    chain = FakeChain(started)
+    tasks = [
+        asyncio.create_task(gateway.ainvoke(chain, {"name": "slow-1"}, user_id="a", model="slow")),
+        asyncio.create_task(gateway.ainvoke(chain, {"name": "slow-2"}, user_id="b", model="slow")),
+        asyncio.create_task(gateway.ainvoke(chain, {"name": "fast-1"}, user_id="c", model="fast")),
+    ]
+    await asyncio.sleep(0.01)
+    all_ok &= assert_equal(sorted(started), ["fast-1", "slow-1"], "per model limit")
+    chain.release.set()
+    await asyncio.gather(*tasks)
+    all_ok &= assert_equal(gateway.stats()["queue_wait"]["sql"]["calls"], 3, "queue wait recorded")
+
+    # 4) A cancelled waiter leaves the queue and does not leak a slot
+    gateway = make_gateway(max_concurrency=1)
+    started = []
+    chain = FakeChain(started)
+    first = asyncio.create_task(gateway.ainvoke(chain, {"name": "first"}, user_id="a", model="m"))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(gateway.ainvoke(chain, {"name": "cancelled"}, user_id="b", model="m"))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.sleep(0)
+    chain.release.set()
+    await first
+    all_ok &= assert_equal((gateway.in_flight, gateway.queued()), (0, 0), "cancelled waiter removed")
+
+    return all_ok
+
+
+def run_tests():
+    if asyncio.run(run_async_tests()):
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.user_chat_history import UserChatHistoryRepository, RetentionPolicy
+
+# Simple console-based tests for the in-memory history backend without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def run_async_tests():
+    all_ok = True
+
+    # 1) Last N messages in order, and human-only view
+    repo = UserChatHistoryRepository(policy=RetentionPolicy(max_turns=10))
+    for i in range(3):
+        await repo.set_next_chat_message("u1", f"q{i}", type="user")
+        await repo.set_next_chat_message("u1", f"a{i}", type="system")
+    history = [m.content for m in await repo.get_chat_history("u1", limit=3)]
+    all_ok &= assert_equal(history, ["a1", "q2", "a2"], "last 3 messages")
+    human = [m.content for m in await repo.get_human_chat_history("u1", limit=2)]
+    all_ok &= assert_equal(human, ["q1", "q2"], "last 2 user messages")
+    all_ok &= assert_equal(await repo.get_chat_history("unknown"), [], "unknown user")
+
+    # 2) Per-user turn cap drops the oldest messages
+    repo = UserChatHistoryRepository(policy=RetentionPolicy(max_turns=2))
+    for i in range(5):
+        await repo.set_next_chat_message("u1", f"q{i}", type="user")
+        await repo.set_next_chat_message("u1", f"a{i}", type="system")
+    history = [m.content for m in await repo.get_chat_history("u1", limit=0)]
+    all_ok &= assert_equal(history, ["q3", "a3", "q4", "a4"], "turn cap")
+
+    # 3) Global budget evicts the least recently used user and keeps byte accounting exact
+    message = "x" * 100
+    size = len(message) + UserChatHistoryRepository.MESSAGE_OVERHEAD
+    repo = UserChatHistoryRepository(max_total_bytes=size * 2)
+    await repo.set_next_chat_message("u1", message)
+    await repo.set_next_chat_message("u2", message)
+    await repo.get_chat_history("u1")  # u1 is now the most recently used
+    await repo.set_next_chat_message("u3", message)
+    all_ok &= assert_equal(list(repo.history), ["u1", "u3"], "LRU eviction")
+    all_ok &= assert_equal(repo.total_bytes, size * 2, "byte accounting")
+
+    # 4) Idle users are evicted on the next write
+    clock = FakeClock()
+    repo = UserChatHistoryRepository(policy=RetentionPolicy(idle_ttl_seconds=60), clock=clock)
+    await repo.set_next_chat_message("u1", "hello")
+    clock.now = 120
+    await repo.set_next_chat_message("u2", "hello")
+    all_ok &= assert_equal(list(repo.history), ["u2"], "idle eviction")
+
+    return all_ok
+
+
+def run_tests():
+    if asyncio.run(run_async_tests()):
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
@@ -7,7 +7,7 @@ BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if BACKEND_ROOT not in sys.path:
     sys.path.insert(0, BACKEND_ROOT)
 
-from repositories.db import QueryCleaner
+from repositories.db import QueryCleaner, normalize_sql
 
 # Simple console-based tests for QueryCleaner without external frameworks
 # Prints PASS/FAIL and exits with status code accordingly
@@ -107,6 +107,16 @@ def run_tests():
     }
     all_ok &= assert_equal(type_counts, expected_counts, "mixed extracted counts")
 
+    # 6) Normalized SQL: same shape, same text; literals and bind names untouched
+    first, _ = qc.clean_query("SELECT  *\nFROM drivers WHERE full_name = 'Max Verstappen';")
+    second, _ = qc.clean_query("select * from DRIVERS where full_name='Lewis Hamilton'")
+    all_ok &= assert_equal(normalize_sql(first), normalize_sql(second), "normalized shapes match")
+    all_ok &= assert_equal(
+        normalize_sql("SELECT Lap_Duration FROM lap -- fastest\nWHERE compound = 'Soft  Tyre' AND x::INT = :Key_1"),
+        "select lap_duration from lap where compound = 'Soft  Tyre' and x::int = :Key_1",
+        "normalization keeps literals and bind names",
+    )
+
     if all_ok:
         print("ALL TESTS PASSED")
         return 0
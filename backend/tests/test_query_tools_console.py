@@ -0,0 +1,128 @@
+import asyncio
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from pydantic import ValidationError
+
+from repositories.db import CappedResult
+from repositories.query_tools import QueryToolCatalog
+
+# Simple console-based tests for the query tool catalog without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+class FakeDB:
+    """Counts the queries run and returns one row per call."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def execute_query_capped(self, query: str, params: dict = None) -> CappedResult:
+        self.calls += 1
+        return CappedResult(columns=["call"], rows=[(self.calls,)])
+
+
+class FakeVersion:
+    def __init__(self):
+        self.value = 1
+
+    async def __call__(self) -> int:
+        return self.value
+
+
+def run_sync_tests():
+    all_ok = True
+    catalog = QueryToolCatalog()
+    tool = catalog.tools["session_results"]
+
+    # 1) params validates the arguments and fills in the defaults
+    params = tool.params({"year": "2024", "grand_prix": "Monaco Grand Prix"})
+    all_ok &= assert_equal(params, {"year": 2024, "grand_prix": "Monaco Grand Prix", "session_type": "R", "driver": None}, "defaults")
+    for bad in ({"grand_prix": "Monaco Grand Prix"}, {"year": 2024, "grand_prix": "Monaco Grand Prix", "session_type": "FP4"}):
+        try:
+            tool.params(bad)
+            all_ok &= assert_equal(True, False, f"invalid arguments rejected: {bad}")
+        except ValidationError:
+            pass
+    try:
+        catalog.tools["driver_laps"].params({"year": 2024, "grand_prix": "Monaco Grand Prix"})
+        all_ok &= assert_equal(True, False, "driver required by driver_laps")
+    except ValidationError:
+        pass
+
+    # 2) parse skips unknown tools and malformed calls, and keeps the first good one
+    parsed = catalog.parse([
+        {"name": "drop_tables", "args": {}},
+        {"name": "season_points", "args": {"year": "last"}},
+        {"name": "season_points", "args": {"year": 2023}},
+        {"name": "pit_stops", "args": {"year": 2023, "grand_prix": "Italian Grand Prix"}},
+    ])
+    all_ok &= assert_equal((parsed[0].name, parsed[1]), ("season_points", {"year": 2023, "driver": None}), "first valid call")
+    all_ok &= assert_equal(catalog.parse([{"name": "season_points", "args": {}}]), None, "no valid call")
+    all_ok &= assert_equal(catalog.parse(None), None, "no tool calls")
+    return all_ok
+
+
+async def run_async_tests():
+    all_ok = True
+    db = FakeDB()
+    version = FakeVersion()
+    catalog = QueryToolCatalog(max_entries=2, ttl=60.0, data_version=version, version_ttl=0.0)
+    tool = catalog.tools["season_points"]
+
+    # 3) Same tool and arguments hit the cache
+    first = await catalog.execute(db, tool, {"year": 2023, "driver": None})
+    again = await catalog.execute(db, tool, {"driver": None, "year": 2023})
+    all_ok &= assert_equal((first.rows, again.rows, db.calls), ([(1,)], [(1,)], 1), "cache hit")
+
+    # 4) A new import (data version) invalidates the cached results
+    version.value = 2
+    fresh = await catalog.execute(db, tool, {"year": 2023, "driver": None})
+    all_ok &= assert_equal((fresh.rows, db.calls), ([(2,)], 2), "new data version")
+    all_ok &= assert_equal(catalog.report()["version"], 2, "version reported")
+
+    # 5) Least recently used results are evicted past max_entries
+    await catalog.execute(db, tool, {"year": 2022, "driver": None})
+    await catalog.execute(db, tool, {"year": 2023, "driver": None})
+    await catalog.execute(db, tool, {"year": 2021, "driver": None})
+    all_ok &= assert_equal(len(catalog.results), 2, "bounded entries")
+    calls = db.calls
+    await catalog.execute(db, tool, {"year": 2022, "driver": None})
+    all_ok &= assert_equal(db.calls, calls + 1, "evicted entry runs again")
+
+    # 6) Results expire after ttl
+    catalog = QueryToolCatalog(ttl=0.0)
+    await catalog.execute(db, tool, {"year": 2023, "driver": None})
+    calls = db.calls
+    await catalog.execute(db, tool, {"year": 2023, "driver": None})
+    all_ok &= assert_equal(db.calls, calls + 1, "expired after ttl")
+    all_ok &= assert_equal(catalog.report()["hits"], 0, "no hits after expiry")
+
+    return all_ok
+
+
+def run_tests():
+    all_ok = run_sync_tests()
+    all_ok &= asyncio.run(run_async_tests())
+    if all_ok:
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from prompts.user_question_to_response import PROMPT_REQUEST_TO_SQL
+from repositories.schema_selector import SchemaSelector, connect, join_graph
+
+# Simple console-based tests for the SQL prompt schema selector without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+VOCABULARY = ["driver", "pit", "stop", "lap", "season", "year", "points", "grid", "stint", "compound", "meeting", "grand", "prix"]
+
+
+def keyword_embed(texts):
+    """Stand-in for the sentence encoder: one dimension per vocabulary word."""
+    return np.array([[float(word in text.lower()) for word in VOCABULARY] for text in texts])
+
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+def run_tests():
+    all_ok = True
+
+    graph = join_graph(["driver", "session_driver", "session", "pit_stop", "season", "meeting"])
+    all_ok &= assert_equal(graph["session_driver"], {"driver", "session", "pit_stop"}, "join graph from foreign keys")
+    all_ok &= assert_equal(
+        connect(["pit_stop", "driver"], graph), {"pit_stop", "session_driver", "driver"}, "shortest join path added"
+    )
+    all_ok &= assert_equal(
+        connect(["driver", "season"], graph), {"driver", "session_driver", "session", "meeting", "season"},
+        "connected through the session chain",
+    )
+
+    calls = []
+
+    def counting_embed(texts):
+        calls.append(len(texts))
+        return keyword_embed(texts)
+
+    selector = SchemaSelector(embed=counting_embed, margin=0.45)
+    all_ok &= assert_equal(calls, [], "nothing embedded at construction")
+    prompt = asyncio.run(selector.prompt_for("pit stop durations for each driver"))
+    system = prompt.messages[0].prompt.template
+    all_ok &= assert_equal("pit_stop:" in system and "driver:" in system, True, "selected tables rendered")
+    all_ok &= assert_equal("stint:" in system or "season:" in system, False, "unrelated tables pruned")
+
+    full = asyncio.run(selector.prompt_for("hello"))
+    all_ok &= assert_equal(full is selector.full_prompt, True, "low score falls back to the full schema")
+    all_ok &= assert_equal(
+        selector.full_prompt.messages[0].prompt.template, PROMPT_REQUEST_TO_SQL.messages[0].prompt.template,
+        "full prompt unchanged",
+    )
+
+    again = asyncio.run(selector.prompt_for("pit stop durations for each driver"))
+    all_ok &= assert_equal(again is prompt, True, "rendered prompt cached per table set")
+    all_ok &= assert_equal(len(calls), 4, "descriptions embedded once, then one call per question")
+    followup = asyncio.run(selector.prompt_for("and for Verstappen?", ["pit stop durations for each driver"]))
+    all_ok &= assert_equal(followup is prompt, True, "follow-up keeps the tables of the previous question")
+    all_ok &= assert_equal(
+        selector.select("and the points?", ["pit stop durations for each driver"]) >= {"pit_stop", "driver"}, True,
+        "context tables added to the question's own",
+    )
+    all_ok &= assert_equal(len(calls), 6, "question and context embedded in one call")
+    stats = selector.stats()
+    all_ok &= assert_equal((stats["requests"], stats["full_schema"], stats["cached_prompts"]), (4, 1, 1), "request counters")
+    all_ok &= assert_equal(stats["tokens_saved"] > 0, True, "tokens saved reported")
+
+    if all_ok:
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
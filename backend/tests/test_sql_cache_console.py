@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from repositories.sql_cache import SQLReuseCache, number_roles, parametrize_numbers
+from schemas.db import MatchData
+
+# Simple console-based tests for the question → SQL reuse cache without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+VOCABULARY = {
+    "meeting_standard_name": ["Monaco Grand Prix", "British Grand Prix", "Italian Grand Prix"],
+}
+ALIASES = {"silverstone": "British Grand Prix", "monza": "Italian Grand Prix", "monaco": "Monaco Grand Prix"}
+
+
+def word_overlap(a: str, b: str) -> float:
+    left, right = set(a.lower().replace("?", "").split()), set(b.lower().replace("?", "").split())
+    return len(left & right) / max(len(left | right), 1)
+
+
+class FakeQdrantRepository:
+    """Stored points in a list; question similarity is word overlap, entities resolve through ALIASES."""
+
+    def __init__(self):
+        self.points = {}
+        self.qdrant_client = self
+
+    def _encode_query(self, text):
+        return [1.0]
+
+    def collection_exists(self, name):
+        return True
+
+    def upsert(self, collection_name, points):
+        for point in points:
+            self.points[point.id] = (point.payload["question"], point.payload)
+
+    def delete(self, collection_name, points_selector):
+        for point_id in points_selector.points:
+            self.points.pop(point_id, None)
+
+    async def similarity_search_async(self, collection_name, search_query, limit=10):
+        if collection_name in VOCABULARY:
+            value = ALIASES.get(search_query.lower())
+            return [SimpleNamespace(score=0.9, payload={"text": value})] if value else []
+        scored = [
+            SimpleNamespace(id=pid, score=word_overlap(question, search_query), payload=payload)
+            for pid, (question, payload) in self.points.items()
+        ]
+        return sorted(scored, key=lambda p: -p.score)[:limit]
+
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+SQL = (
+    "SELECT d.full_name FROM session_result sr JOIN session_driver sd ON sr.session_driver_id = sd.id "
+    "JOIN driver d ON sd.driver_id = d.id JOIN session s ON sd.session_id = s.id JOIN meeting m ON s.meeting_id = m.id "
+    "JOIN season se ON m.seasson_id = se.id WHERE m.meeting_standard_name = :standard_name_1 AND se.year = 2024 "
+    "AND s.session_type = :session_type_1 AND sr.final_position = 1 AND s.session_name = '2024 Race'"
+)
+SLOTS = [
+    MatchData(type="meeting_standard_name", key="standard_name_1", data="Monaco Grand Prix"),
+    MatchData(type="session_type", key="session_type_1", data="R"),
+]
+
+
+async def run_async_tests():
+    all_ok = True
+    repo = FakeQdrantRepository()
+    cache = SQLReuseCache(repo, min_score=0.5)
+
+    cache.remember("Who won the Monaco Grand Prix in 2024?", SQL, SLOTS)
+    await asyncio.gather(*cache._pending)
+    all_ok &= assert_equal(cache.stats["stored"], 1, "entry stored")
+
+    cache.remember("And who won in 2023?", SQL, SLOTS)
+    await asyncio.gather(*cache._pending)
+    all_ok &= assert_equal(cache.stats["stored"], 1, "follow-up without its entities not stored")
+
+    reuse = await cache.lookup("Who won the Monaco Grand Prix in 2023?")
+    all_ok &= assert_equal(reuse is not None, True, "same question with another year reused")
+    all_ok &= assert_equal(reuse.params, {"num_0": 2023}, "year passed as a parameter")
+    all_ok &= assert_equal("se.year = :num_0" in reuse.sql and "'2024 Race'" in reuse.sql, True, "literals left alone")
+
+    reuse = await cache.lookup("Who won the Silverstone Grand Prix in 2024?")
+    all_ok &= assert_equal(
+        [s.data for s in reuse.slots] if reuse else None, ["British Grand Prix", "R"], "swapped entity resolved again"
+    )
+
+    all_ok &= assert_equal(await cache.lookup("Who crashed in the Monaco Grand Prix in 2024?"), None, "different question rejected")
+    all_ok &= assert_equal(await cache.lookup("Who won the Monaco Grand Prix?"), None, "missing year rejected")
+
+    top = "SELECT d.full_name FROM driver_standings d WHERE d.year = 2023 ORDER BY d.position LIMIT 3"
+    numbers_cache = SQLReuseCache(FakeQdrantRepository(), min_score=0.3)
+    numbers_cache.remember("Top 3 drivers in 2023", top, [])
+    await asyncio.gather(*numbers_cache._pending)
+    reuse_top = await numbers_cache.lookup("Top 5 drivers in 2024")
+    all_ok &= assert_equal(reuse_top.params if reuse_top else None, {"num_0": 5, "num_1": 2024}, "numbers in the same order reused")
+    all_ok &= assert_equal(await numbers_cache.lookup("In 2024 the top 5 drivers"), None, "numbers in another order rejected")
+
+    grid = "SELECT d.full_name FROM start_grid sg JOIN driver d ON d.id = sg.driver_id WHERE sg.grid_position = 2"
+    for stored, asked in (
+        ("Who qualified P2 at the 2023 Monaco Grand Prix?", "Who qualified P3 at the 2023 Monaco Grand Prix?"),
+        ("Who finished 2nd at the 2023 Monaco Grand Prix?", "Who finished 22nd at the 2023 Monaco Grand Prix?"),
+    ):
+        grid_cache = SQLReuseCache(FakeQdrantRepository(), min_score=0.5)
+        grid_cache.remember(stored, grid, [])
+        await asyncio.gather(*grid_cache._pending)
+        all_ok &= assert_equal(await grid_cache.lookup(asked), None, f"numbers inside tokens compared: {asked}")
+        all_ok &= assert_equal(await grid_cache.lookup(stored) is not None, True, f"same tokens reused: {stored}")
+
+    await cache.evict(str(reuse.entry_id))
+    all_ok &= assert_equal(await cache.lookup("Who won the Monaco Grand Prix in 2024?"), None, "evicted entry gone")
+    return all_ok
+
+
+def run_tests():
+    all_ok = assert_equal(
+        parametrize_numbers("SELECT 1 FROM t WHERE year = 2024 LIMIT 3 AND x = :driver_1", [3, 2024]),
+        "SELECT 1 FROM t WHERE year = :num_1 LIMIT :num_0 AND x = :driver_1", "numbers from the question parametrized",
+    )
+    all_ok &= assert_equal(number_roles("Top 3 drivers in 2023"), ["top", "year"], "number roles")
+    all_ok &= assert_equal(number_roles("In 2023, the top 3 drivers"), ["year", "top"], "number roles in order")
+    all_ok &= asyncio.run(run_async_tests())
+    if all_ok:
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
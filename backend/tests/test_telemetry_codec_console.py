@@ -0,0 +1,68 @@
+import os
+import sys
+
+# Ensure the backend root (parent of tests) is on sys.path for direct execution
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+import numpy as np
+
+from repositories.telemetry import encode_channel, decode_channel, downsample, lap_delta
+
+# Simple console-based tests for the telemetry codec without external frameworks
+# Prints PASS/FAIL and exits with status code accordingly
+
+def assert_equal(actual, expected, msg):
+    if actual != expected:
+        print(f"FAIL: {msg}\n  expected: {expected}\n  actual:   {actual}")
+        return False
+    return True
+
+
+def run_tests():
+    all_ok = True
+
+    # 1) Round trip keeps values and storage dtype
+    speed = np.linspace(80.0, 320.0, 700)
+    decoded = decode_channel("speed", encode_channel("speed", speed))
+    all_ok &= assert_equal(len(decoded), 700, "speed sample count")
+    all_ok &= assert_equal(bool(np.allclose(decoded, speed, atol=1e-3)), True, "speed values")
+
+    gear = [1, 2, 3, 8, 8, 7]
+    all_ok &= assert_equal(decode_channel("gear", encode_channel("gear", gear)).tolist(), gear, "gear values")
+
+    # 2) Compressed blob is smaller than the raw float64 array
+    all_ok &= assert_equal(len(encode_channel("speed", speed)) < speed.nbytes, True, "speed compression")
+
+    # 3) Downsampling caps the number of points and keeps the endpoints
+    channels = {
+        "time": np.linspace(0.0, 90.0, 700, dtype=np.float32),
+        "distance": np.linspace(0.0, 5000.0, 700, dtype=np.float32),
+        "speed": speed.astype(np.float32),
+        "gear": np.repeat(np.arange(1, 8, dtype=np.uint8), 100),
+    }
+    small = downsample(channels, max_points=50)
+    all_ok &= assert_equal(len(small["speed"]), 50, "downsampled length")
+    all_ok &= assert_equal(round(float(small["distance"][-1])), 5000, "downsampled last distance")
+    all_ok &= assert_equal(small["gear"].dtype == np.uint8, True, "discrete channel dtype")
+
+    # 4) Short laps are returned untouched
+    all_ok &= assert_equal(downsample(channels, max_points=1000) is channels, True, "no-op downsample")
+
+    # 5) A lap one second slower everywhere has a constant one second delta
+    slower = dict(channels, time=channels["time"] + 1.0)
+    delta = lap_delta(channels, slower, max_points=20)
+    all_ok &= assert_equal(bool(np.allclose(delta["delta"], 1.0, atol=1e-4)), True, "lap delta")
+
+    if all_ok:
+        print("ALL TESTS PASSED")
+        return 0
+    else:
+        print("SOME TESTS FAILED")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests())
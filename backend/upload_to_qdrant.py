@@ -1,11 +1,16 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import argparse
 import asyncio
+import hashlib
+import time
+from dataclasses import dataclass, field
 from typing import Dict, List, Tuple
 
 from sqlalchemy import text
 
+from constants.db import QDRANT_URL
 from models.db import async_session
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
@@ -16,6 +21,8 @@ CollectionName = str
 RowId = int
 TextVal = str
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+
 
 async def fetch_values() -> Dict[CollectionName, List[Tuple[RowId | None, TextVal]]]:
 	"""Lee valores desde Postgres que servirán como vocabularios para Qdrant.
@@ -84,74 +91,317 @@ async def fetch_values() -> Dict[CollectionName, List[Tuple[RowId | None, TextVa
 		return results
 
 
-def ensure_collection(client: QdrantClient, name: str, vector_size: int):
-	client.recreate_collection(
-        collection_name=name,
-        vectors_config=qmodels.VectorParams(
-            size=vector_size,
-            distance=qmodels.Distance.COSINE
-        ),
-        hnsw_config=qmodels.HnswConfigDiff(
-            m=32,                 
-            ef_construct=256
-        )
-    )
+def content_hash(text: TextVal) -> str:
+	"""Hash of what gets embedded; any change of text or model forces a new embedding."""
+	return hashlib.sha256(f"{MODEL_NAME}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def point_id(_id: RowId | None, text: TextVal) -> int:
+	"""DB id when there is one, otherwise a stable id derived from the text."""
+	if _id is not None:
+		return _id
+	return int(hashlib.sha256(text.strip().lower().encode("utf-8")).hexdigest()[:15], 16)
+
+
+def resolve_alias(client: QdrantClient, alias: CollectionName) -> CollectionName | None:
+	"""Returns the collection an alias currently points to."""
+	for description in client.get_aliases().aliases:
+		if description.alias_name == alias:
+			return description.collection_name
+	return None
+
+
+def create_collection(client: QdrantClient, name: str, vector_size: int):
+	client.create_collection(
+		collection_name=name,
+		vectors_config=qmodels.VectorParams(
+			size=vector_size,
+			distance=qmodels.Distance.COSINE
+		),
+		hnsw_config=qmodels.HnswConfigDiff(
+			m=32,
+			ef_construct=256
+		)
+	)
+
+
+def stored_points(client: QdrantClient, name: str, with_vectors: bool) -> Dict[int, Tuple[str, list | None]]:
+	"""Reads {point_id: (content_hash, vector)} from an existing collection."""
+	points = {}
+	offset = None
+	while True:
+		records, offset = client.scroll(
+			collection_name=name,
+			limit=1024,
+			offset=offset,
+			with_payload=["text", "hash"],
+			with_vectors=with_vectors,
+		)
+		for record in records:
+			payload = record.payload or {}
+			# Collections written before hashes existed still carry the text
+			stored_hash = payload.get("hash") or content_hash(payload.get("text", ""))
+			points[record.id] = (stored_hash, record.vector if with_vectors else None)
+		if offset is None:
+			return points
+
 
 def chunked(seq, size):
 	for i in range(0, len(seq), size):
 		yield seq[i : i + size]
 
 
-def upsert_collection(
+def make_point(pid: int, text: TextVal, vector) -> qmodels.PointStruct:
+	return qmodels.PointStruct(
+		id=pid,
+		vector=list(vector),
+		payload={"text": text, "source_id": pid, "hash": content_hash(text)},
+	)
+
+
+@dataclass
+class CollectionPlan:
+	"""What a sync has to do for one alias."""
+	alias: CollectionName
+	target: CollectionName
+	current: CollectionName | None
+	legacy: bool
+	rebuild: bool
+	expected_count: int
+	vector_size: int
+	pending: List[Tuple[int, TextVal]] = field(default_factory=list)
+	kept: List[qmodels.PointStruct] = field(default_factory=list)
+	removed: List[int] = field(default_factory=list)
+	reused: int = 0
+
+
+def plan_collection(
 	client: QdrantClient,
-	model: SentenceTransformer,
-	name: str,
+	alias: CollectionName,
 	items: List[Tuple[RowId | None, TextVal]],
 	vector_size: int,
-	batch_size: int = 512,
-):
-	ensure_collection(client, name, vector_size)
-
-	texts = [t for (_id, t) in items]
-	# Generate simple local ids if DB id is None
-	ids: List[int] = [(_id if _id is not None else i + 1) for i, (_id, _t) in enumerate(items)]
-
-	for idxs in chunked(list(range(len(texts))), batch_size):
-		batch_texts = [texts[i] for i in idxs]
-		vectors = model.encode(batch_texts, batch_size=min(64, len(batch_texts)), show_progress_bar=False)
-		points = [
-			qmodels.PointStruct(
-				id=ids[i],
-				vector=vectors[j].tolist(),
-				payload={"text": batch_texts[j], "source_id": ids[i]},
-			)
-			for j, i in enumerate(idxs)
-		]
-		client.upsert(collection_name=name, points=points)
-
-
-async def main():
+	rebuild: bool = False,
+) -> CollectionPlan:
+	"""Diffs `items` against the collection behind `alias`.
+
+	Incremental runs upsert new/changed texts and delete vanished ones in place.
+	A rebuild (forced, first run, or vector size change) fills a new versioned
+	collection, reusing stored vectors whose hash still matches, so the alias
+	can be swapped in one operation and searches never see a partial index.
+	Nothing is written here; `create_targets` creates the new collections.
+	"""
+	desired = {point_id(_id, t): t for (_id, t) in items}
+	current = resolve_alias(client, alias)
+	# Before aliases were used the vocabulary lived in a plain collection named like the alias
+	legacy = current is None and client.collection_exists(alias)
+	source = current or (alias if legacy else None)
+
+	if current and not rebuild:
+		size = client.get_collection(current).config.params.vectors.size
+		rebuild = size != vector_size
+	rebuild = rebuild or current is None
+
+	stored = stored_points(client, source, with_vectors=rebuild) if source else {}
+	unchanged = {pid for pid, t in desired.items() if stored.get(pid, (None,))[0] == content_hash(t)}
+
+	plan = CollectionPlan(
+		alias=alias,
+		target=f"{alias}_v{int(time.time() * 1000)}" if rebuild else current,
+		current=current,
+		legacy=legacy,
+		rebuild=rebuild,
+		expected_count=len(desired) if rebuild else len(set(stored) | set(desired)),
+		vector_size=vector_size,
+		pending=[(pid, t) for pid, t in desired.items() if pid not in unchanged],
+		removed=[pid for pid in stored if pid not in desired],
+		reused=len(unchanged),
+	)
+	if rebuild:
+		plan.kept = [make_point(pid, desired[pid], stored[pid][1]) for pid in unchanged]
+	return plan
+
+
+async def upload_worker(client: QdrantClient, queue: asyncio.Queue, errors: List[BaseException]):
+	"""Sends queued batches without waiting for Qdrant to index them.
+
+	A failed batch is recorded in `errors` and the worker keeps draining the
+	queue (without sending) so the producer never blocks on a full queue.
+	"""
+	while True:
+		name, points = await queue.get()
+		try:
+			if not errors:
+				await asyncio.to_thread(client.upsert, collection_name=name, points=points, wait=False)
+		except Exception as e:
+			print(f"Upload to {name} failed: {e}")
+			errors.append(e)
+		finally:
+			queue.task_done()
+
+
+def raise_upload_error(tasks: List[asyncio.Task], errors: List[BaseException]):
+	"""Re-raises the first upload failure, or the exception of a worker that died."""
+	if errors:
+		raise errors[0]
+	for task in tasks:
+		if task.done() and not task.cancelled() and task.exception() is not None:
+			raise task.exception()
+
+
+async def run_pipeline(
+	client: QdrantClient,
+	model: SentenceTransformer,
+	plans: List[CollectionPlan],
+	encode_batch_size: int = 2048,
+	upsert_batch_size: int = 512,
+	workers: int = 4,
+	queue_size: int = 8,
+) -> int:
+	"""Encodes pending texts of every collection in mixed batches while earlier batches upload.
+
+	The bounded queue applies backpressure: encoding stalls only when
+	`queue_size` batches are already waiting for the upload workers.
+	"""
+	queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+	errors: List[BaseException] = []
+	tasks = [asyncio.create_task(upload_worker(client, queue, errors)) for _ in range(workers)]
+
+	try:
+		# Reused vectors need no encoding and go straight to the workers
+		for plan in plans:
+			for batch in chunked(plan.kept, upsert_batch_size):
+				raise_upload_error(tasks, errors)
+				await queue.put((plan.target, batch))
+
+		pending = [(plan.target, pid, t) for plan in plans for (pid, t) in plan.pending]
+		for mixed in chunked(pending, encode_batch_size):
+			texts = [t for (_name, _pid, t) in mixed]
+			vectors = await asyncio.to_thread(model.encode, texts, batch_size=64, show_progress_bar=False)
+
+			by_collection: Dict[CollectionName, List[qmodels.PointStruct]] = {}
+			for (name, pid, t), vector in zip(mixed, vectors):
+				by_collection.setdefault(name, []).append(make_point(pid, t, vector.tolist()))
+			for name, points in by_collection.items():
+				for batch in chunked(points, upsert_batch_size):
+					raise_upload_error(tasks, errors)
+					await queue.put((name, batch))
+
+		await queue.join()
+		raise_upload_error(tasks, errors)
+	finally:
+		for task in tasks:
+			task.cancel()
+	return len(pending)
+
+
+async def wait_until_applied(client: QdrantClient, plan: CollectionPlan, timeout: float = 120.0):
+	"""Upserts were sent with wait=False; block until Qdrant has applied all of them."""
+	deadline = time.monotonic() + timeout
+	while client.count(collection_name=plan.target, exact=True).count < plan.expected_count:
+		if time.monotonic() > deadline:
+			raise TimeoutError(f"{plan.target} did not reach {plan.expected_count} points")
+		await asyncio.sleep(0.2)
+
+
+def create_targets(client: QdrantClient, plans: List[CollectionPlan]):
+	for plan in plans:
+		if plan.rebuild:
+			create_collection(client, plan.target, plan.vector_size)
+
+
+def discard_targets(client: QdrantClient, plans: List[CollectionPlan]):
+	"""Drops the versioned collections of a failed run; the aliases still point to the old ones."""
+	for plan in plans:
+		if plan.rebuild and resolve_alias(client, plan.alias) != plan.target and client.collection_exists(plan.target):
+			client.delete_collection(plan.target)
+
+
+def finalize_collection(client: QdrantClient, plan: CollectionPlan):
+	"""Deletes vanished points, or swaps the alias onto the rebuilt collection.
+
+	The old collection is only deleted once the alias points to the new one.
+	"""
+	if not plan.rebuild:
+		if plan.removed:
+			client.delete(collection_name=plan.target, points_selector=qmodels.PointIdsList(points=plan.removed))
+		return
+
+	def create_alias(alias: CollectionName):
+		return qmodels.CreateAliasOperation(create_alias=qmodels.CreateAlias(collection_name=plan.target, alias_name=alias))
+
+	def delete_alias(alias: CollectionName):
+		return qmodels.DeleteAliasOperation(delete_alias=qmodels.DeleteAlias(alias_name=alias))
+
+	if not plan.legacy:
+		operations = [create_alias(plan.alias)]
+		if plan.current:
+			operations.insert(0, delete_alias(plan.alias))
+		client.update_collection_aliases(change_aliases_operations=operations)
+		if plan.current:
+			client.delete_collection(plan.current)
+		return
+
+	# One-off migration: the alias name is taken by the old collection itself, and
+	# Qdrant cannot rename it. The new collection first gets a temporary alias,
+	# which fails before anything is deleted if aliases cannot be written; the old
+	# collection is then dropped and the name moved over in a single update.
+	staging = f"{plan.alias}_next"
+	client.update_collection_aliases(change_aliases_operations=[create_alias(staging)])
+	client.delete_collection(plan.alias)
+	for attempt in range(3):
+		try:
+			client.update_collection_aliases(change_aliases_operations=[delete_alias(staging), create_alias(plan.alias)])
+			return
+		except Exception:
+			if attempt == 2:
+				print(f"Alias {plan.alias} could not be created; the vocabulary is available as {staging}")
+				raise
+			time.sleep(1)
+
+
+async def main(rebuild: bool = False):
 	# 1) Fetch values from Postgres
 	data = await fetch_values()
 
 	# 2) Init Qdrant and embedding model
-	client = QdrantClient(url="http://localhost:6333")
-	model = SentenceTransformer("all-MiniLM-L6-v2")
+	client = QdrantClient(url=QDRANT_URL or "http://localhost:6333")
+	model = SentenceTransformer(MODEL_NAME)
 	dim = model.get_sentence_embedding_dimension()
 
-	# 3) Upsert each collection
-	for collection_name, items in data.items():
-		if not items:
-			continue
-		upsert_collection(client, model, collection_name, items, dim)
-
-	print("Qdrant collections populated:")
-	for name, items in data.items():
-		print(f"- {name}: {len(items)} items")
+	# 3) Diff every collection, then embed and upload all of them in one pipeline
+	plans = [
+		plan_collection(client, name, items, dim, rebuild=rebuild)
+		for name, items in data.items() if items
+	]
+	started = time.perf_counter()
+	try:
+		create_targets(client, plans)
+		embedded = await run_pipeline(client, model, plans)
+		for plan in plans:
+			await wait_until_applied(client, plan)
+	except BaseException:
+		discard_targets(client, plans)
+		raise
+	for plan in plans:
+		finalize_collection(client, plan)
+	elapsed = time.perf_counter() - started
+
+	print("Qdrant collections synced:")
+	for plan in plans:
+		print(
+			f"- {plan.alias}: {len(plan.pending)} embedded, {plan.reused} reused, "
+			f"{len(plan.removed)} removed{' (rebuilt)' if plan.rebuild else ''}"
+		)
+	reused = sum(plan.reused for plan in plans)
+	print(f"Embeddings reused: {reused} / {reused + embedded}")
+	print(f"Throughput: {embedded} vectors in {elapsed:.1f}s ({embedded / elapsed if elapsed else 0:.0f} vectors/s)")
 
 
 if __name__ == "__main__":
+	arg_parser = argparse.ArgumentParser()
+	arg_parser.add_argument("--rebuild", action="store_true", help="Rebuild every collection and swap the aliases")
+	args = arg_parser.parse_args()
 	try:
-		asyncio.run(main())
+		asyncio.run(main(rebuild=args.rebuild))
 	except KeyboardInterrupt:
-		pass
\ No newline at end of file
+		pass
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Awaitable, Optional
+
+from utils.logger import logger
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs past its share of the request budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before the response was ready."""
+
+
+class Deadline:
+    """Time budget for one request, shared out between its stages.
+
+    A stage gets `share` of the total budget, never more than what is left, so
+    a slow early stage eats into the later ones instead of extending the request.
+    """
+
+    def __init__(self, budget_seconds: float, clock=time.monotonic):
+        self.budget = budget_seconds
+        self.clock = clock
+        self.expires_at = clock() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage_timeout(self, share: float = 1.0) -> float:
+        return min(self.remaining(), self.budget * share)
+
+    async def run(self, awaitable: Awaitable, stage: str, share: float = 1.0):
+        """Awaits `awaitable`, cancelling it once the stage timeout passes."""
+        timeout = self.stage_timeout(share)
+        if timeout <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(stage)
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage {stage} cancelled after {timeout:.2f}s")
+            raise DeadlineExceeded(stage)
+
+
+async def cancel_on_disconnect(request, awaitable: Awaitable, poll_interval: float = 0.5):
+    """Runs `awaitable` and cancels it as soon as the HTTP client disconnects."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _pending = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()